@@ -0,0 +1,394 @@
+"""
+Benchmark suite for the analog Python pipeline.
+
+Runs against the stub `ngspice`/`xschem` executables in ./stubs so the numbers
+are reproducible without a PDK. Every benchmark reports a throughput (higher
+is better) which is compared against baseline.json to catch regressions.
+
+    python RunBenchmarks.py                    # run and compare to baseline
+    python RunBenchmarks.py --full             # include 10^6 object schematics
+    python RunBenchmarks.py --update-baseline  # store current numbers
+"""
+import argparse
+import contextlib
+import importlib.util
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Any, Optional
+
+BENCH_DIR = Path(__file__).parent.resolve()
+LIBRARY_DIR = BENCH_DIR.parent
+sys.path.insert(0, str(LIBRARY_DIR / "scripts"))
+from Grammar import *
+from XSchemParser import XSchemParser
+from XSchemWriter import XSchemWriter
+from SimulationRunner import SimulationRunner
+from NgspiceSessionPool import PooledSimulationRunner
+from XSchemInterface import create_variant, build_and_simulate_variants
+from MVMArrayGenerator import MVMArrayGenerator
+from HierarchicalNetlister import HierarchicalNetlister
+from ConvergenceRecovery import RecoverySimulationRunner, RecoveryMemory
+
+STUB_DIR = BENCH_DIR / "stubs"
+STUB_METRICS = BENCH_DIR / "stub_metrics.json"
+BASELINE_FILE = BENCH_DIR / "baseline.json"
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+MVM_SIZES = [4, 8, 16, 32, 64]
+FULL_SIZES = DEFAULT_SIZES + [1_000_000]
+
+MOSFET_PROPERTIES = {
+    "L": "0.15", "W": "1", "nf": "1", "mult": "1",
+    "ad": "'int((nf+1)/2) * W/nf * 0.29'",
+    "pd": "'2*int((nf+1)/2) * (W/nf + 0.29)'",
+    "model": "nfet_01v8", "spiceprefix": "X"
+}
+
+
+def load_module(path: Path):
+    """Import a component script (CreateVariant.py, CreateCustom.py) by path"""
+    spec = importlib.util.spec_from_file_location(path.stem, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def best_time(fn: Callable[[], Any], repeat: int) -> float:
+    """Best wall time of `repeat` calls"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def synthetic_schematic(n_objects: int, seed: int = 0) -> List[XSchemObject]:
+    """Build a schematic with a realistic mix of components, wires, lines and text"""
+    rng = random.Random(seed)
+    objects: List[XSchemObject] = [
+        Version(version="3.4.4", fileVersion="1.2",
+                license="xschem version=3.4.4 file_version=1.2"),
+        GlobalProperties(),
+    ]
+    for i in range(max(0, n_objects - len(objects))):
+        x, y = rng.randrange(-5000, 5000, 10), rng.randrange(-5000, 5000, 10)
+        kind = i % 4
+        if kind == 0:
+            objects.append(Component(
+                symbolReference="sky130_fd_pr/nfet_01v8.sym", x=x, y=y,
+                properties={"name": f"M{i}", **MOSFET_PROPERTIES}
+            ))
+        elif kind == 1:
+            objects.append(Wire(x1=x, y1=y, x2=x + 40, y2=y, properties={"lab": f"net{i % 97}"}))
+        elif kind == 2:
+            objects.append(Line(layer=4, x1=x, y1=y, x2=x, y2=y + 20))
+        else:
+            objects.append(Text(text=f"label {i}", x=x, y=y, hSize=0.2, vSize=0.2))
+    return objects
+
+
+@contextlib.contextmanager
+def stub_workspace(latency: float, startup: float = 0.0, nonconvergent: float = 0.0):
+    """Temporary OpAmps library + build dir with the stub tools first on PATH"""
+    saved_env = {key: os.environ.get(key) for key in
+                 ("PATH", "STUB_NGSPICE_LATENCY", "STUB_NGSPICE_STARTUP", "STUB_NGSPICE_METRICS",
+                  "STUB_NGSPICE_NONCONVERGENT")}
+    saved_build_dir = SimulationRunner.BUILD_DIR
+    saved_cwd = os.getcwd()
+
+    with tempfile.TemporaryDirectory(prefix="mvm_bench_") as tmp:
+        workspace = Path(tmp)
+        shutil.copytree(LIBRARY_DIR / "OpAmps" / "template", workspace / "OpAmps" / "template")
+        (workspace / "build").mkdir()
+
+        os.environ["PATH"] = f"{STUB_DIR}{os.pathsep}{os.environ.get('PATH', '')}"
+        os.environ["STUB_NGSPICE_LATENCY"] = str(latency)
+        os.environ["STUB_NGSPICE_STARTUP"] = str(startup)
+        os.environ["STUB_NGSPICE_METRICS"] = str(STUB_METRICS)
+        os.environ["STUB_NGSPICE_NONCONVERGENT"] = str(nonconvergent)
+        SimulationRunner.BUILD_DIR = workspace / "build"
+        os.chdir(workspace / "OpAmps")
+        try:
+            yield workspace
+        finally:
+            os.chdir(saved_cwd)
+            SimulationRunner.BUILD_DIR = saved_build_dir
+            for key, value in saved_env.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+
+
+def bench_parse_write(sizes: List[int], repeat: int) -> Dict[str, float]:
+    """Parser and writer throughput in objects per second"""
+    parser = XSchemParser()
+    results = {}
+    for n in sizes:
+        objects = synthetic_schematic(n)
+        content = XSchemWriter.write_content(objects)
+        runs = repeat if n <= 100_000 else 1
+
+        parse_time = best_time(lambda: parser.parse_content(content), runs)
+        lazy_time = best_time(lambda: parser.parse_content(content, include=[Component], lazy=True), runs)
+        write_time = best_time(lambda: XSchemWriter.write_content(objects), runs)
+
+        results[f"parse_objects_per_s[n={n}]"] = n / parse_time
+        results[f"lazy_parse_objects_per_s[n={n}]"] = n / lazy_time
+        results[f"write_objects_per_s[n={n}]"] = n / write_time
+    return results
+
+
+def bench_create_variant(count: int, repeat: int) -> Dict[str, float]:
+    """create_variant calls per second using the CreateVariant.py tests"""
+    create_variant_script = load_module(LIBRARY_DIR / "OpAmps" / "CreateVariant.py")
+    params = create_variant_script.VARIANTS["Balanced"]["params"]
+    tests = create_variant_script.TESTS
+
+    def build_all():
+        for k in range(count):
+            create_variant("OpAmp", f"bench{k}", {"short": f"B{k}", "params": params},
+                           tests, "template")
+
+    with stub_workspace(latency=0.0):
+        elapsed = best_time(build_all, repeat)
+    return {"create_variant_per_s": count / elapsed}
+
+
+def build_testbenches(n_testbenches: int) -> List[str]:
+    """Create enough CreateVariant.py variants in the stub workspace for n testbenches"""
+    variant_tests = load_module(LIBRARY_DIR / "OpAmps" / "CreateVariant.py").TESTS
+    tb_files = []
+    k = 0
+    while len(tb_files) < n_testbenches:
+        folder, short = create_variant(
+            "OpAmp", f"run{k}", {"short": f"R{k}", "params": {"M1": {"W": str(1 + k)}}},
+            variant_tests, "template")
+        tb_files.extend(f"{folder}/tb/OpAmp_{short}_{test}_tb.sch" for test in variant_tests)
+        k += 1
+    return tb_files[:n_testbenches]
+
+
+def bench_runner(workers: List[int], latency: float, n_testbenches: int) -> Dict[str, float]:
+    """SimulationRunner.run_simulations throughput for each worker count"""
+    results = {}
+
+    with stub_workspace(latency=latency):
+        tb_files = build_testbenches(n_testbenches)
+
+        runner = SimulationRunner()
+        for w in workers:
+            start = time.perf_counter()
+            sims = runner.run_simulations(tb_files, max_workers=w)
+            elapsed = time.perf_counter() - start
+
+            failures = [r for r in sims if "error" in r]
+            if failures:
+                raise RuntimeError(f"{len(failures)} stub simulations failed: {failures[0]['error']}")
+            results[f"runner_sims_per_s[workers={w}]"] = len(sims) / elapsed
+    return results
+
+
+def bench_session_pool(latency: float, startup: float, n_testbenches: int) -> Dict[str, float]:
+    """One `ngspice -b` per run against warm pooled sessions when ngspice start-up dominates"""
+    results = {}
+
+    with stub_workspace(latency=latency, startup=startup):
+        tb_files = build_testbenches(n_testbenches)
+        runners = {"batch": SimulationRunner(), "pooled": PooledSimulationRunner(pool_size=2)}
+
+        for name, runner in runners.items():
+            start = time.perf_counter()
+            sims = runner.run_simulations(tb_files, max_workers=2)
+            elapsed = time.perf_counter() - start
+
+            failures = [r for r in sims if "error" in r]
+            if failures:
+                raise RuntimeError(f"{len(failures)} stub simulations failed: {failures[0]['error']}")
+            results[f"session_sims_per_s[{name}]"] = len(sims) / elapsed
+        runners["pooled"].close()
+    return results
+
+
+def bench_pipeline(n_variants: int, workers: List[int], latency: float) -> Dict[str, float]:
+    """build_and_simulate_variants throughput (variants per second) for each pool size"""
+    variant_script = load_module(LIBRARY_DIR / "OpAmps" / "CreateVariant.py")
+    params = variant_script.VARIANTS["Balanced"]["params"]
+    variants = {f"pipe{k}": {"short": f"P{k}", "params": params} for k in range(n_variants)}
+    results = {}
+
+    with stub_workspace(latency=latency):
+        for w in workers:
+            start = time.perf_counter()
+            build_and_simulate_variants(variants, variant_script.TESTS, "OpAmp", "template",
+                                        variant_script.UNITS_MAP, max_workers=w)
+            elapsed = time.perf_counter() - start
+            results[f"pipeline_variants_per_s[workers={w}]"] = n_variants / elapsed
+    return results
+
+
+def bench_optimizer(evaluations: int, latency: float) -> Dict[str, float]:
+    """End-to-end CircuitOptimizer evaluations per second (DRC, build, simulate, score)"""
+    import numpy as np
+    from XSchemVariantOptimizer import CircuitOptimizer
+
+    custom = load_module(LIBRARY_DIR / "OpAmps" / "CreateCustom.py")
+    rng = np.random.default_rng(0)
+
+    with stub_workspace(latency=latency):
+        optimizer = CircuitOptimizer("OpAmp", custom.TESTS, Path("template"))
+        optimizer.units_map = {t["metric"]: t["UNIT"] for t in custom.TARGETS}
+        for target in custom.TARGETS:
+            optimizer.add_target(**{k: v for k, v in target.items() if k != "UNIT"})
+        for bound in custom.BOUNDS:
+            optimizer.add_bound(**bound)
+
+        lower = np.array([b.min_value for b in optimizer.bounds])
+        upper = np.array([b.max_value for b in optimizer.bounds])
+
+        start = time.perf_counter()
+        scores = []
+        for _ in range(evaluations):
+            x = optimizer._apply_sky130_drc(lower + rng.random(len(lower)) * (upper - lower))
+            optimizer.eval_count += 1
+            params = optimizer._vector_to_params(x, custom.INITIAL_PARAMS)
+            scores.append(optimizer._evaluate_parameters(params))
+        elapsed = time.perf_counter() - start
+
+    if optimizer.failed_evaluations == evaluations:
+        raise RuntimeError("Every optimizer evaluation raised; check the stub environment")
+    return {"optimizer_evals_per_s": evaluations / elapsed}
+
+
+def bench_recovery(latency: float, n_testbenches: int, nonconvergent: float = 0.5) -> Dict[str, float]:
+    """RecoverySimulationRunner throughput when half the circuits fail to converge, first and second pass"""
+    results = {}
+    with stub_workspace(latency=latency, nonconvergent=nonconvergent) as workspace:
+        tb_files = build_testbenches(n_testbenches)
+        runner = RecoverySimulationRunner(memory=RecoveryMemory(workspace / "build" / "convergence_fixes.json"))
+        for name in ("cold", "warm"):
+            start = time.perf_counter()
+            sims = runner.run_simulations(tb_files, max_workers=4)
+            elapsed = time.perf_counter() - start
+
+            failures = [r for r in sims if "error" in r]
+            if failures:
+                raise RuntimeError(f"{len(failures)} stub simulations were not recovered: {failures[0]['error']}")
+            results[f"recovery_sims_per_s[pass={name}]"] = len(sims) / elapsed
+    return results
+
+
+def bench_mvm_array(sizes: List[int], repeat: int) -> Dict[str, float]:
+    """MVMArrayGenerator schematic plus netlist throughput in array instances per second
+
+    The cell .subckt blocks come from the stub xschem and are cached before
+    timing, so this measures the array itself.
+    """
+    results = {}
+    with stub_workspace(latency=0.0) as workspace:
+        netlister = HierarchicalNetlister()
+        for n in sizes:
+            output = workspace / f"n{n}"
+
+            def generate():
+                generator = MVMArrayGenerator(n, output_dir=output)
+                generator.write_schematic()
+                generator.write_netlist(output / "mv_mul.spice", netlister=netlister)
+
+            generate()
+            elapsed = best_time(generate, repeat if n <= 16 else 1)
+            results[f"mvm_instances_per_s[n={n}]"] = (n * n + 3 * n) / elapsed
+    return results
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], tolerance: float) -> List[str]:
+    """Return a message for every metric that fell more than `tolerance` below baseline"""
+    regressions = []
+    print(f"\n{'benchmark':<42} {'current':>14} {'baseline':>14} {'change':>9}")
+    for name, value in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:<42} {value:>14.4g} {'-':>14} {'new':>9}")
+            continue
+        change = value / base - 1.0
+        flag = ""
+        if change < -tolerance:
+            flag = "  REGRESSION"
+            regressions.append(f"{name}: {value:.4g} vs baseline {base:.4g} ({change:+.1%})")
+        print(f"{name:<42} {value:>14.4g} {base:>14.4g} {change:>+9.1%}{flag}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--only", nargs="+", default=["parse", "create_variant", "runner", "sessions", "pipeline", "optimizer", "recovery", "mvm"],
+                        choices=["parse", "create_variant", "runner", "sessions", "pipeline", "optimizer", "recovery", "mvm"])
+    parser.add_argument("--full", action="store_true", help="include 10^6 object schematics")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.05, help="stub ngspice latency in seconds")
+    parser.add_argument("--startup", type=float, default=0.1,
+                        help="stub ngspice start-up cost in seconds for the session pool benchmark")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--testbenches", type=int, default=32)
+    parser.add_argument("--variants", type=int, default=20)
+    parser.add_argument("--evaluations", type=int, default=10)
+    parser.add_argument("--tolerance", type=float, default=0.3,
+                        help="allowed relative slowdown before a benchmark counts as a regression")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_FILE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--output", type=Path, help="write results as JSON")
+    args = parser.parse_args(argv)
+
+    results: Dict[str, float] = {}
+    if "parse" in args.only:
+        results.update(bench_parse_write(FULL_SIZES if args.full else DEFAULT_SIZES, args.repeat))
+    if "create_variant" in args.only:
+        results.update(bench_create_variant(args.variants, args.repeat))
+    if "runner" in args.only:
+        results.update(bench_runner(args.workers, args.latency, args.testbenches))
+    if "sessions" in args.only:
+        results.update(bench_session_pool(args.latency, args.startup, args.testbenches))
+    if "pipeline" in args.only:
+        results.update(bench_pipeline(args.variants // 2, args.workers, args.latency))
+    if "optimizer" in args.only:
+        results.update(bench_optimizer(args.evaluations, args.latency))
+    if "recovery" in args.only:
+        results.update(bench_recovery(args.latency, args.testbenches))
+    if "mvm" in args.only:
+        results.update(bench_mvm_array(MVM_SIZES, args.repeat))
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=4) + "\n")
+
+    if args.update_baseline:
+        baseline = {}
+        if args.baseline.exists():
+            baseline = json.loads(args.baseline.read_text()).get("metrics", {})
+        baseline.update(results)
+        args.baseline.write_text(json.dumps({
+            "machine": f"{platform.system()} {platform.machine()} / Python {platform.python_version()}",
+            "metrics": baseline,
+        }, indent=4) + "\n")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    baseline = json.loads(args.baseline.read_text())["metrics"] if args.baseline.exists() else {}
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print("\nRegressions:")
+        for message in regressions:
+            print(f"  {message}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+import os
+import sys
+import asyncio
+import subprocess
+from pathlib import Path
+from typing import List, Optional, Union, AsyncIterator, Iterable
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, CURRENT_DIR)
+from SimulationRunner import SimulationRunner, kill_process_group
+from SimulationResult import SimulationResult, SimulationStatus, netlist_hash
+
+
+class AsyncSimulationRunner:
+    """asyncio-native counterpart of SimulationRunner for use inside an event loop
+
+    Commands, paths and metric parsing are delegated to a SimulationRunner so
+    both runners always netlist and parse identically.
+    """
+
+    def __init__(self, max_concurrency: Optional[int] = None,
+                 runner: Optional[SimulationRunner] = None):
+        self.max_concurrency = max_concurrency or os.cpu_count() or 1
+        self.runner = runner or SimulationRunner()
+
+    async def run_command(self, cmd: List[str], timeout: Optional[float],
+                          cwd: Union[str, Path]) -> subprocess.CompletedProcess:
+        """Run a command in its own process group, killing the whole group on timeout or cancellation"""
+        process = await asyncio.create_subprocess_exec(
+            *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+            cwd=cwd, start_new_session=True
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+        except asyncio.TimeoutError:
+            kill_process_group(process.pid)
+            await process.wait()
+            raise subprocess.TimeoutExpired(cmd, timeout)
+        except asyncio.CancelledError:
+            kill_process_group(process.pid)
+            await process.wait()
+            raise
+        return subprocess.CompletedProcess(cmd, process.returncode,
+                                           stdout.decode(errors='replace'),
+                                           stderr.decode(errors='replace'))
+
+    async def run_simulation(self, tb_file: Union[str, Path], timeout: int = 30,
+                             metric_keywords: Optional[List[str]] = None) -> SimulationResult:
+        """Netlist and simulate one testbench; same result format as SimulationRunner.run_simulation"""
+        runner = self.runner
+        tb_file = Path(tb_file).resolve()
+
+        try:
+            try:
+                await self.run_command(runner.netlist_command(tb_file), timeout, runner.BUILD_DIR)
+            except subprocess.TimeoutExpired:
+                return SimulationResult.failure(f"Netlist generation timed out after {timeout} seconds",
+                                                SimulationStatus.TIMEOUT)
+
+            netlist_file = runner.netlist_path(tb_file)
+            result = await self.run_command(runner.simulate_command(netlist_file), timeout, runner.BUILD_DIR)
+            parsed = runner.parse_metrics(result.stdout, metric_keywords or [], netlist_file.stem,
+                                         result.stderr)
+            parsed.netlist_hash = netlist_hash(netlist_file.read_text(encoding='utf-8', errors='replace'))
+            return parsed
+
+        except subprocess.TimeoutExpired:
+            return SimulationResult.failure(f"Simulation timed out after {timeout} seconds",
+                                            SimulationStatus.TIMEOUT)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            return SimulationResult.failure(f"Exception: {str(e)}")
+
+    async def run_many(self, tb_files: Iterable[Union[str, Path]], timeout: int = 30,
+                       metric_keywords: Optional[List[str]] = None,
+                       max_concurrency: Optional[int] = None) -> AsyncIterator[SimulationResult]:
+        """Simulate testbenches concurrently, yielding each result as soon as it completes
+
+        At most `max_concurrency` simulations run at once. Leaving the loop early
+        cancels the outstanding simulations and kills their process groups.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency or self.max_concurrency)
+
+        async def guarded(tb_file):
+            async with semaphore:
+                result = await self.run_simulation(tb_file, timeout, metric_keywords)
+            result.tb_file = str(tb_file)
+            return result
+
+        tasks = [asyncio.ensure_future(guarded(tb_file)) for tb_file in tb_files]
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                yield await next_result
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,418 @@
+import os
+import re
+import sys
+from pathlib import Path
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import List, Dict, Optional, Union, Tuple, Iterable, Set, Any
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, CURRENT_DIR)
+from SymbolResolver import SymbolResolver
+from Grammar import *
+
+Point = Tuple[int, int]
+
+# Coordinates are snapped to 1/1000 of an xschem unit before hashing
+SCALE = 1000
+PIN_LAYER = 5
+LABEL_TYPES = {"label", "ipin", "opin", "iopin"}
+
+# Pins of common symbols, used when the symbol itself cannot be resolved (no PDK installed)
+_MOS_PINS = {"nfet": {"D": (20, -30), "G": (-20, 0), "S": (20, 30), "B": (20, 0)},
+             "pfet": {"D": (20, 30), "G": (-20, 0), "S": (20, -30), "B": (20, 0)}}
+FALLBACK_SYMBOLS = {
+    "devices/ipin.sym": ("ipin", {"p": (0, 0)}),
+    "devices/opin.sym": ("opin", {"p": (0, 0)}),
+    "devices/iopin.sym": ("iopin", {"p": (0, 0)}),
+    "devices/lab_pin.sym": ("label", {"p": (0, 0)}),
+    "devices/lab_wire.sym": ("label", {"p": (0, 0)}),
+    "devices/gnd.sym": ("label", {"p": (0, 0)}),
+    "devices/vdd.sym": ("label", {"p": (0, 0)}),
+}
+FALLBACK_PATTERNS = [(re.compile(r"sky130_fd_pr/([np]fet)_"), lambda m: ("primitive", _MOS_PINS[m.group(1)]))]
+
+
+def transform(x: float, y: float, rotation: int, flip: int) -> Tuple[float, float]:
+    """xschem's symbol-to-schematic transform: mirror x, then rotate in 90 degree steps"""
+    if flip:
+        x = -x
+    rotation %= 4
+    if rotation == 1:
+        return -y, x
+    if rotation == 2:
+        return -x, -y
+    if rotation == 3:
+        return y, -x
+    return x, y
+
+
+def snap(x: float, y: float) -> Point:
+    return round(x * SCALE), round(y * SCALE)
+
+
+class UnionFind:
+    """Disjoint sets with path halving and union by size, tracking members and a label per set"""
+
+    def __init__(self):
+        self.parent: Dict[Any, Any] = {}
+        self.members: Dict[Any, List[Any]] = {}
+        self.labels: Dict[Any, str] = {}
+
+    def add(self, item: Any) -> None:
+        if item not in self.parent:
+            self.parent[item] = item
+            self.members[item] = [item]
+
+    def find(self, item: Any) -> Any:
+        parent = self.parent
+        while parent[item] != item:
+            parent[item] = parent[parent[item]]
+            item = parent[item]
+        return item
+
+    def union(self, a: Any, b: Any) -> Any:
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return ra
+        if len(self.members[ra]) < len(self.members[rb]):
+            ra, rb = rb, ra
+        self.parent[rb] = ra
+        self.members[ra].extend(self.members.pop(rb))
+        label = self.labels.pop(rb, None)
+        if label is not None:
+            self.label(ra, label)
+        return ra
+
+    def label(self, item: Any, label: str) -> None:
+        """Name the set of item; the alphabetically first label wins"""
+        root = self.find(item)
+        if root not in self.labels or label < self.labels[root]:
+            self.labels[root] = label
+
+    def roots(self) -> Iterable[Any]:
+        return self.members.keys()
+
+
+class SpatialHash:
+    """Uniform grid over points and axis-aligned bounding boxes of segments"""
+
+    def __init__(self, cell: float = 20.0):
+        self.cell = int(cell * SCALE)
+        self.cells: Dict[Point, Set[Any]] = defaultdict(set)
+
+    def _cells(self, a: Point, b: Point) -> Iterable[Point]:
+        x0, x1 = sorted((a[0] // self.cell, b[0] // self.cell))
+        y0, y1 = sorted((a[1] // self.cell, b[1] // self.cell))
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                yield cx, cy
+
+    def insert(self, key: Any, a: Point, b: Optional[Point] = None) -> None:
+        for cell in self._cells(a, b or a):
+            self.cells[cell].add(key)
+
+    def remove(self, key: Any, a: Point, b: Optional[Point] = None) -> None:
+        for cell in self._cells(a, b or a):
+            bucket = self.cells.get(cell)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self.cells[cell]
+
+    def near(self, p: Point) -> Set[Any]:
+        return self.cells.get((p[0] // self.cell, p[1] // self.cell), set())
+
+
+def on_segment(p: Point, a: Point, b: Point) -> bool:
+    """True if p lies on the segment a-b (endpoints included)"""
+    cross = (b[0] - a[0]) * (p[1] - a[1]) - (b[1] - a[1]) * (p[0] - a[0])
+    if cross != 0:
+        return False
+    return min(a[0], b[0]) <= p[0] <= max(a[0], b[0]) and min(a[1], b[1]) <= p[1] <= max(a[1], b[1])
+
+
+@dataclass
+class Net:
+    """One electrical net of a schematic"""
+    name: str
+    pins: List[Tuple[str, str]] = field(default_factory=list)       # (instance, pin)
+    wires: List[Wire] = field(default_factory=list)
+    labels: List[str] = field(default_factory=list)                 # label instances naming the net
+
+
+class Connectivity:
+    """Nets of one schematic from wire endpoints, symbol pins and labels
+
+    Wires and instance pins are kept in a grid hash, so finding what touches
+    a point (including T-junctions on a wire's interior) looks at one cell.
+    Nets come from a union-find over wires and pins that also tracks each
+    set's members and label: adding objects unions them in place, while
+    removing or moving one marks the sets stale and the next query re-derives
+    them from the index without re-reading symbols. Looking up a pin's or a
+    labelled net's members costs a find plus the size of the answer.
+    """
+
+    def __init__(self, objects: Iterable[XSchemObject] = (), resolver: Optional[SymbolResolver] = None,
+                 base_dir: Optional[Union[str, Path]] = None, cell: float = 20.0):
+        """
+        Args:
+            objects: Schematic objects (e.g. XSchemInterface.components)
+            resolver: Locates symbols to read pin positions (default: xschemrc search paths)
+            base_dir: Directory of the schematic, for symbols referenced relative to it
+            cell: Grid cell size in schematic units
+        """
+        self.resolver = resolver or SymbolResolver()
+        self.base_dir = base_dir
+        self.index = SpatialHash(cell)
+        self.wires: Dict[int, Wire] = {}
+        self.instances: Dict[int, Component] = {}
+        self.by_name: Dict[str, int] = {}
+        self.pins: Dict[Tuple[int, str], Point] = {}
+        self.kinds: Dict[int, str] = {}
+        self.unresolved: Set[str] = set()
+        self._symbols: Dict[str, Tuple[str, Dict[str, Tuple[float, float]]]] = {}
+        self._sets = UnionFind()
+        self._by_label: Dict[str, Any] = {}
+        self._stale = False
+        self._nets: Optional[Dict[str, Net]] = None
+        self._unnamed: Dict[Any, str] = {}
+        for obj in objects:
+            self.add(obj)
+
+    # Symbols -----------------------------------------------------------
+
+    def symbol_pins(self, reference: str) -> Tuple[str, Dict[str, Tuple[float, float]]]:
+        """(symbol type, {pin: (x, y)}) with pin positions at the centre of the layer-5 boxes"""
+        if reference not in self._symbols:
+            kind, pins = "subcircuit", {}
+            try:
+                for obj in self.resolver.load(reference, self.base_dir):
+                    if isinstance(obj, Rectangle) and obj.layer == PIN_LAYER and "name" in obj.properties:
+                        pins[obj.properties["name"]] = ((obj.x1 + obj.x2) / 2, (obj.y1 + obj.y2) / 2)
+                    elif isinstance(obj, GlobalProperties):
+                        kind = obj.properties.get("type", kind)
+            except FileNotFoundError:
+                kind, pins = self._fallback(reference)
+            self._symbols[reference] = (kind, pins)
+        return self._symbols[reference]
+
+    def _fallback(self, reference: str) -> Tuple[str, Dict[str, Tuple[float, float]]]:
+        if reference in FALLBACK_SYMBOLS:
+            return FALLBACK_SYMBOLS[reference]
+        for pattern, build in FALLBACK_PATTERNS:
+            match = pattern.search(reference)
+            if match:
+                return build(match)
+        self.unresolved.add(reference)
+        return "unknown", {}
+
+    # Updates -----------------------------------------------------------
+
+    def add(self, obj: XSchemObject) -> None:
+        """Index a wire or component and union it with whatever it touches"""
+        key = id(obj)
+        if isinstance(obj, Wire):
+            a, b = snap(obj.x1, obj.y1), snap(obj.x2, obj.y2)
+            self.wires[key] = obj
+            self.index.insert(("wire", key), a, b)
+            self._sets.add(("wire", key))
+            if not self._stale:
+                for p in (a, b):
+                    self._connect_point(("wire", key), p)
+                # Pins and wire ends lying on this wire's interior
+                for other in self._touching_segment(a, b):
+                    self._sets.union(("wire", key), other)
+                self._apply_label(("wire", key))
+        elif isinstance(obj, Component):
+            kind, pins = self.symbol_pins(obj.symbolReference)
+            self.instances[key] = obj
+            self.by_name[obj.properties.get("name", "")] = key
+            self.kinds[key] = kind
+            for pin, (px, py) in pins.items():
+                dx, dy = transform(px, py, obj.rotation, obj.flip)
+                p = snap(obj.x + dx, obj.y + dy)
+                self.pins[(key, pin)] = p
+                self.index.insert(("pin", key, pin), p)
+                self._sets.add(("pin", key, pin))
+                if not self._stale:
+                    self._connect_point(("pin", key, pin), p)
+                    self._apply_label(("pin", key, pin))
+        else:
+            return
+        self._nets = None
+
+    def remove(self, obj: XSchemObject) -> None:
+        """Drop a wire or component; nets are re-derived on the next query"""
+        key = id(obj)
+        if key in self.wires:
+            wire = self.wires.pop(key)
+            self.index.remove(("wire", key), snap(wire.x1, wire.y1), snap(wire.x2, wire.y2))
+        elif key in self.instances:
+            comp = self.instances.pop(key)
+            if self.by_name.get(comp.properties.get("name", "")) == key:
+                del self.by_name[comp.properties.get("name", "")]
+            del self.kinds[key]
+            for pin_key in [k for k in self.pins if k[0] == key]:
+                self.index.remove(("pin", *pin_key), self.pins.pop(pin_key))
+        else:
+            return
+        self._stale = True
+        self._nets = None
+
+    def move(self, obj: XSchemObject, **changes: Any) -> None:
+        """Change position fields (x, y, rotation, flip, x1, ...) of an indexed object"""
+        self.remove(obj)
+        for name, value in changes.items():
+            setattr(obj, name, value)
+        self.add(obj)
+
+    def replace(self, old: XSchemObject, new: XSchemObject) -> None:
+        """Swap an indexed object for an equal copy (see XSchemInterface copy-on-write)"""
+        if id(old) in self.wires or id(old) in self.instances:
+            self.remove(old)
+            self.add(new)
+
+    # Net extraction ----------------------------------------------------
+
+    def _at(self, p: Point) -> Iterable[Any]:
+        """Index entries touching a point: pins on it, wires through or ending on it"""
+        for entry in self.index.near(p):
+            if entry[0] == "pin":
+                if self.pins.get((entry[1], entry[2])) == p:
+                    yield entry
+            else:
+                wire = self.wires[entry[1]]
+                if on_segment(p, snap(wire.x1, wire.y1), snap(wire.x2, wire.y2)):
+                    yield entry
+
+    def _touching_segment(self, a: Point, b: Point) -> Iterable[Any]:
+        """Pins and wire endpoints on the segment a-b"""
+        seen = set()
+        for cell in self.index._cells(a, b):
+            for entry in self.index.cells.get(cell, ()):
+                if entry in seen:
+                    continue
+                seen.add(entry)
+                if entry[0] == "pin":
+                    points = [self.pins[(entry[1], entry[2])]]
+                else:
+                    wire = self.wires[entry[1]]
+                    points = [snap(wire.x1, wire.y1), snap(wire.x2, wire.y2)]
+                if any(on_segment(p, a, b) for p in points):
+                    yield entry
+
+    def _connect_point(self, entry: Any, p: Point) -> None:
+        for other in self._at(p):
+            if other != entry:
+                self._sets.union(entry, other)
+
+    def _apply_label(self, entry: Any) -> None:
+        """Same label anywhere in the schematic is the same net"""
+        label = self._label(entry)
+        if label:
+            self._sets.label(entry, label)
+            if label in self._by_label:
+                self._sets.union(entry, self._by_label[label])
+            else:
+                self._by_label[label] = entry
+
+    def _rebuild(self) -> None:
+        self._sets = UnionFind()
+        self._by_label = {}
+        entries = [("wire", key) for key in self.wires] + [("pin", *key) for key in self.pins]
+        for entry in entries:
+            self._sets.add(entry)
+        for key, wire in self.wires.items():
+            for p in (snap(wire.x1, wire.y1), snap(wire.x2, wire.y2)):
+                self._connect_point(("wire", key), p)
+        for (key, pin), p in self.pins.items():
+            self._connect_point(("pin", key, pin), p)
+        for entry in entries:
+            self._apply_label(entry)
+        self._stale = False
+
+    def _label(self, entry: Any) -> Optional[str]:
+        if entry[0] == "wire":
+            return self.wires[entry[1]].properties.get("lab")
+        if self.kinds[entry[1]] in LABEL_TYPES:
+            return self.instances[entry[1]].properties.get("lab")
+        return None
+
+    def _net(self, name: str, members: Iterable[Any]) -> Net:
+        net = Net(name)
+        for entry in members:
+            if entry[0] == "wire":
+                net.wires.append(self.wires[entry[1]])
+            elif self.kinds[entry[1]] in LABEL_TYPES:
+                net.labels.append(self.instances[entry[1]].properties.get("name", ""))
+            else:
+                net.pins.append((self.instances[entry[1]].properties.get("name", ""), entry[2]))
+        return net
+
+    def _current(self) -> UnionFind:
+        if self._stale:
+            self._rebuild()
+        return self._sets
+
+    def nets(self) -> Dict[str, Net]:
+        """Every net by name; unlabelled nets are numbered net1, net2, ..."""
+        if self._nets is not None:
+            return self._nets
+        sets = self._current()
+        nets, self._unnamed, counter = {}, {}, 0
+        for root in sets.roots():
+            name = sets.labels.get(root)
+            if name is None:
+                counter += 1
+                name = self._unnamed[root] = f"net{counter}"
+            nets[name] = self._net(name, sets.members[root])
+        self._nets = nets
+        return nets
+
+    # Queries -----------------------------------------------------------
+
+    def _name(self, entry: Any) -> Optional[str]:
+        sets = self._current()
+        if entry not in sets.parent:
+            return None
+        root = sets.find(entry)
+        if root in sets.labels:
+            return sets.labels[root]
+        self.nets()
+        return self._unnamed.get(root)
+
+    def net(self, name: str) -> Optional[Net]:
+        """Everything attached to a net; labelled nets are read straight from their set"""
+        sets = self._current()
+        if name in self._by_label:
+            root = sets.find(self._by_label[name])
+            return self._net(sets.labels.get(root, name), sets.members[root])
+        return self.nets().get(name)
+
+    def net_of(self, instance: str, pin: str) -> Optional[str]:
+        """Net connected to an instance pin"""
+        key = self.by_name.get(instance)
+        return None if key is None else self._name(("pin", key, pin))
+
+    def connected(self, a: Tuple[str, str], b: Tuple[str, str]) -> bool:
+        """Whether two (instance, pin) pairs are on the same net"""
+        sets = self._current()
+        ka, kb = self.by_name.get(a[0]), self.by_name.get(b[0])
+        ea, eb = ("pin", ka, a[1]), ("pin", kb, b[1])
+        return ea in sets.parent and eb in sets.parent and sets.find(ea) == sets.find(eb)
+
+    def at(self, x: float, y: float) -> List[Tuple[str, Any]]:
+        """Pins ("pin", (instance, pin)) and wires ("wire", Wire) touching a point"""
+        found = []
+        for entry in self._at(snap(x, y)):
+            if entry[0] == "pin":
+                found.append(("pin", (self.instances[entry[1]].properties.get("name", ""), entry[2])))
+            else:
+                found.append(("wire", self.wires[entry[1]]))
+        return found
+
+    def net_at(self, x: float, y: float) -> Optional[str]:
+        for entry in self._at(snap(x, y)):
+            return self._name(entry)
+        return None
@@ -0,0 +1,341 @@
+import os
+import re
+import sys
+import json
+import hashlib
+import argparse
+import threading
+import subprocess
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Dict, Optional, Union, Any, Tuple, FrozenSet
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, CURRENT_DIR)
+from SimulationRunner import SimulationRunner
+from SimulationResult import SimulationResult, SimulationStatus, netlist_hash
+from HierarchicalNetlister import SUBCKT_PATTERN, END_PATTERN
+
+# Failure kinds
+OPERATING_POINT = "operating_point"
+TIMESTEP = "timestep"
+TIMEOUT = "timeout"
+OTHER = "other"
+RECOVERABLE = frozenset({OPERATING_POINT, TIMESTEP, TIMEOUT})
+
+# ngspice messages, checked in order
+FAILURE_PATTERNS = (
+    (TIMESTEP, re.compile(r"time\s*step too small", re.IGNORECASE)),
+    (OPERATING_POINT, re.compile(
+        r"singular matrix|gmin stepping failed|source stepping failed|iteration limit reached"
+        r"|no convergence|dc solution failed|(?:transient )?op(?:erating point)? failed", re.IGNORECASE)),
+)
+NUMBER_PATTERN = re.compile(r"^[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?[a-zA-Z]*$")
+
+
+@dataclass(frozen=True)
+class Fix:
+    """One rung of the recovery ladder: .options added to the deck for the failure kinds it addresses"""
+    name: str
+    options: Tuple[str, ...]
+    kinds: FrozenSet[str]
+    timeout_scale: float = 1.0      # the rung's time budget relative to the original timeout
+
+    @classmethod
+    def combine(cls, fixes: List['Fix']) -> 'Fix':
+        """One rung with the options of several, later rungs overriding earlier ones"""
+        options: Dict[str, str] = {}
+        for fix in fixes:
+            options.update((option.split("=")[0], option) for option in fix.options)
+        return cls("+".join(fix.name for fix in fixes), tuple(options.values()),
+                   frozenset().union(*(fix.kinds for fix in fixes)), max(fix.timeout_scale for fix in fixes))
+
+    def apply(self, netlist: str) -> str:
+        """Netlist with this rung's .options line ahead of the final .end"""
+        lines = netlist.splitlines()
+        option_line = f".options {' '.join(self.options)}"
+        for index in range(len(lines) - 1, -1, -1):
+            if END_PATTERN.match(lines[index]):
+                lines.insert(index, option_line)
+                break
+        else:
+            lines.append(option_line)
+        return "\n".join(lines) + "\n"
+
+
+# Cheapest and least intrusive first; a rung is only tried for the kinds it lists
+DEFAULT_LADDER = (
+    Fix("stepping", ("gminsteps=100", "srcsteps=100", "itl1=500"), frozenset({OPERATING_POINT})),
+    Fix("timestep", ("method=gear", "itl4=100", "trtol=10"), frozenset({TIMESTEP}), 1.5),
+    Fix("relaxed", ("reltol=0.01", "abstol=1e-10", "vntol=1e-4", "chgtol=1e-13", "itl1=1000", "itl4=200"),
+        frozenset({OPERATING_POINT, TIMESTEP, TIMEOUT}), 2.0),
+    Fix("shunt", ("rshunt=1e12", "gminsteps=100", "srcsteps=100", "itl1=1000"), frozenset({OPERATING_POINT})),
+)
+
+
+def classify(result: SimulationResult) -> Optional[str]:
+    """Failure kind of a result from its status and simulator output (None when it succeeded)"""
+    if result.ok or result.status == SimulationStatus.SKIPPED:
+        return None
+    if result.status == SimulationStatus.TIMEOUT:
+        return TIMEOUT
+    output = result.stdout or result.message
+    for kind, pattern in FAILURE_PATTERNS:
+        if pattern.search(output):
+            return kind
+    return OTHER
+
+
+def topology_key(netlist: str) -> str:
+    """Hash of a deck's structure: element types, nodes and models, ignoring values and names
+
+    Variants of one circuit under one testbench share a key, since their
+    subcircuits are renamed to their order of definition and every number
+    and key=value parameter is dropped.
+    """
+    rename = {}
+    for line in netlist.splitlines():
+        match = SUBCKT_PATTERN.match(line)
+        if match:
+            rename.setdefault(match.group(1).lower(), f"subckt{len(rename)}")
+
+    digest = hashlib.sha1()
+    for line in netlist.splitlines():
+        line = line.strip()
+        if not line or line.startswith("*"):
+            continue
+        tokens = []
+        for position, token in enumerate(line.split()):
+            if "=" in token or NUMBER_PATTERN.match(token):
+                continue
+            if position == 0 and not token.startswith("."):
+                token = token[0]            # element type, not instance name
+            tokens.append(rename.get(token.lower(), token.lower()))
+        digest.update(" ".join(tokens).encode(errors='replace'))
+        digest.update(b"\n")
+    return digest.hexdigest()[:16]
+
+
+class RecoveryMemory:
+    """Which ladder rungs rescued or failed each topology, kept in a JSON file"""
+
+    def __init__(self, path: Optional[Union[str, Path]] = None):
+        self.path = Path(path) if path else Path(SimulationRunner.BUILD_DIR) / "convergence_fixes.json"
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+
+    def _entry(self, key: str) -> Dict[str, Any]:
+        return self.entries.setdefault(key, {"wins": {}, "losses": {}, "exhausted": 0, "kind": None})
+
+    def _counts(self, key: str) -> Tuple[Dict[str, int], Dict[str, int]]:
+        with self._lock:
+            entry = self.entries.get(key, {})
+            return dict(entry.get("wins", {})), dict(entry.get("losses", {}))
+
+    def winners(self, key: str) -> List[str]:
+        """Rungs that have rescued this topology more often than not, best net record first"""
+        wins, losses = self._counts(key)
+        net = {name: count - losses.get(name, 0) for name, count in wins.items()}
+        return sorted((name for name in net if net[name] > 0), key=lambda name: -net[name])
+
+    def order(self, key: str, fixes: List[Fix], give_up_after: int = 2) -> List[Fix]:
+        """Rungs to try, best net record first
+
+        A rung that has lost more often than it has won is dropped, except
+        that one that never won gets `give_up_after` tries.
+        """
+        wins, losses = self._counts(key)
+
+        def useful(fix: Fix) -> bool:
+            won, lost = wins.get(fix.name, 0), losses.get(fix.name, 0)
+            return lost <= won or (not won and lost < give_up_after)
+
+        return sorted(filter(useful, fixes), key=lambda fix: losses.get(fix.name, 0) - wins.get(fix.name, 0))
+
+    def hopeless(self, key: str, give_up_after: int = 2) -> bool:
+        """The whole ladder failed this topology repeatedly and no rung is currently a winner"""
+        with self._lock:
+            exhausted = self.entries.get(key, {}).get("exhausted", 0)
+        return exhausted >= give_up_after and not self.winners(key)
+
+    def record(self, key: str, kind: Optional[str], fix: Fix, ok: bool) -> None:
+        with self._lock:
+            entry = self._entry(key)
+            counts = entry["wins" if ok else "losses"]
+            counts[fix.name] = counts.get(fix.name, 0) + 1
+            if kind is not None:
+                entry["kind"] = kind
+            self._dirty = True
+
+    def record_exhausted(self, key: str, kind: str) -> None:
+        with self._lock:
+            entry = self._entry(key)
+            entry["exhausted"] += 1
+            entry["kind"] = kind
+            self._dirty = True
+
+    def save(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, indent=2, sort_keys=True)
+            os.replace(tmp, self.path)
+            self._dirty = False
+
+
+class RecoverySimulationRunner(SimulationRunner):
+    """SimulationRunner that retries non-converging runs up a ladder of simulator options
+
+    A failed run is classified from its output (operating point, timestep,
+    timeout; anything else such as a syntax error is returned as is) and rerun
+    with each applicable rung in turn, at most `max_attempts` times. The rung
+    that worked is remembered per topology and applied up front on later runs
+    of the same topology, and topologies nothing rescues stop paying for the
+    ladder after `give_up_after` exhausted attempts.
+
+    Rungs are credited only when they were needed: every `probe_every`-th
+    run of a topology with winners goes without them first, and a clean run
+    counts against them, so a fix one variant needed does not loosen the
+    tolerances of every later variant for good.
+    """
+
+    def __init__(self, ladder: Tuple[Fix, ...] = DEFAULT_LADDER, memory: Optional[RecoveryMemory] = None,
+                 max_attempts: int = 3, give_up_after: int = 2, probe_every: int = 5, **runner_options):
+        """
+        Args:
+            ladder: Rungs in the order they are tried
+            memory: Per-topology record of rungs (default: BUILD_DIR/convergence_fixes.json)
+            max_attempts: Reruns allowed per simulation beyond the first
+            give_up_after: Failures after which a rung, or the whole ladder, is skipped for a topology
+            probe_every: Runs with winners between probes without them (0: never probe)
+            runner_options: Passed on to SimulationRunner
+        """
+        super().__init__(**runner_options)
+        self.ladder = tuple(ladder)
+        self.fixes = {fix.name: fix for fix in self.ladder}
+        self.memory = memory or RecoveryMemory()
+        self.max_attempts = max_attempts
+        self.give_up_after = give_up_after
+        self.probe_every = probe_every
+        self._preemptive_runs: Counter = Counter()
+        self.stats: Counter = Counter()
+        self._stats_lock = threading.Lock()
+
+    def _count(self, *events: str) -> None:
+        with self._stats_lock:
+            self.stats.update(events)
+
+    def _probe_due(self, key: str) -> bool:
+        with self._stats_lock:
+            self._preemptive_runs[key] += 1
+            return bool(self.probe_every) and self._preemptive_runs[key] % self.probe_every == 0
+
+    def _attempt(self, netlist_file: Path, netlist: str, fix: Optional[Fix], timeout: Optional[float],
+                 metric_keywords: Optional[List[str]]) -> SimulationResult:
+        if fix is not None:
+            netlist_file = netlist_file.with_name(f"{netlist_file.stem}_{fix.name}.spice")
+            netlist_file.write_text(fix.apply(netlist), encoding='utf-8')
+            timeout = timeout * fix.timeout_scale if timeout else timeout
+        try:
+            return self.simulate_netlist(netlist_file, timeout, metric_keywords)
+        except subprocess.TimeoutExpired:
+            return SimulationResult.failure(f"Simulation timed out after {timeout} seconds",
+                                            SimulationStatus.TIMEOUT)
+        except Exception as e:
+            return SimulationResult.failure(f"Exception: {str(e)}")
+
+    def run_simulation(self, tb_file: Union[str, Path], timeout: int = 30,
+                       metric_keywords: Optional[List[str]] = None) -> SimulationResult:
+        tb_file = Path(tb_file).resolve()
+        try:
+            netlist_file = self.netlist(tb_file, timeout)
+            netlist = netlist_file.read_text(encoding='utf-8', errors='replace')
+        except subprocess.TimeoutExpired:
+            return SimulationResult.failure(f"Netlist generation timed out after {timeout} seconds",
+                                            SimulationStatus.TIMEOUT)
+        except Exception as e:
+            return SimulationResult.failure(f"Exception: {str(e)}")
+
+        # Rungs that rescued this topology before are applied up front, together,
+        # except on probe runs that check whether they are still needed
+        key = topology_key(netlist)
+        winners = [self.fixes[name] for name in self.memory.winners(key) if name in self.fixes]
+        probe = bool(winners) and self._probe_due(key)
+        result = self._attempt(netlist_file, netlist, Fix.combine(winners) if winners and not probe else None,
+                               timeout, metric_keywords)
+        kind = classify(result)
+        if probe:
+            self._count("probe")
+            if result.ok:  # converged without them: not needed this time
+                for fix in winners:
+                    self.memory.record(key, None, fix, False)
+        elif winners:
+            # A clean run does not show the rungs were needed, so only failures are recorded
+            self._count("preemptive")
+            if not result.ok:
+                for fix in winners:
+                    self.memory.record(key, kind, fix, False)
+
+        tried = set()  # after a failed combination its rungs are still tried one at a time
+        attempts = 0
+        first_kind = kind
+        while kind in RECOVERABLE and attempts < self.max_attempts and not self.memory.hopeless(key, self.give_up_after):
+            candidates = [fix for fix in self.ladder if kind in fix.kinds and fix.name not in tried]
+            candidates = self.memory.order(key, candidates, self.give_up_after)
+            if not candidates:
+                break
+            fix = candidates[0]
+            tried.add(fix.name)
+            attempts += 1
+            result = self._attempt(netlist_file, netlist, fix, timeout, metric_keywords)
+            self.memory.record(key, kind, fix, result.ok)
+            self._count(f"attempt:{fix.name}")
+            kind = classify(result)
+
+        if first_kind in RECOVERABLE:
+            if result.ok:
+                self._count(f"recovered:{first_kind}")
+            else:
+                self.memory.record_exhausted(key, kind or first_kind)
+                self._count(f"failed:{first_kind}")
+                if tried:
+                    result.message = f"{result.message} (recovery tried: {', '.join(sorted(tried))})"
+        self.memory.save()  # no-op unless something was recorded
+
+        result.netlist_hash = netlist_hash(netlist)
+        return result
+
+    def summary(self) -> str:
+        """One line per counted event, e.g. recovered:timestep"""
+        with self._stats_lock:
+            return "\n".join(f"  {event:<28} {count}" for event, count in sorted(self.stats.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show or clear the per-topology convergence fixes")
+    parser.add_argument("--memory", default=None, help="JSON file (default: BUILD_DIR/convergence_fixes.json)")
+    parser.add_argument("--clear", action="store_true", help="Forget every recorded fix")
+    args = parser.parse_args()
+
+    memory = RecoveryMemory(args.memory)
+    if args.clear:
+        memory.path.unlink(missing_ok=True)
+        print(f"Removed {memory.path}")
+        return
+    if not memory.entries:
+        print(f"No convergence failures recorded in {memory.path}")
+    for key, entry in sorted(memory.entries.items()):
+        print(f"{key}  {entry.get('kind') or '-':<16} preferred={'+'.join(memory.winners(key)) or '-':<18} "
+              f"wins={entry['wins']} losses={entry['losses']} exhausted={entry['exhausted']}")
+
+
+if __name__ == "__main__":
+    main()
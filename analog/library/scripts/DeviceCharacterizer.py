@@ -0,0 +1,252 @@
+import os
+import sys
+import json
+import hashlib
+import argparse
+import tempfile
+import numpy as np
+from pathlib import Path
+from functools import lru_cache
+from typing import List, Dict, Optional, Union, Sequence, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from scipy.interpolate import RegularGridInterpolator
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, CURRENT_DIR)
+from SimulationRunner import SimulationRunner
+from ModelReducer import ModelReducer, PDK_MODEL_PREFIX
+
+# Small-signal quantities saved per device instance during the sweep
+OPERATING_POINT = ("id", "gm", "gds", "cgg", "cgs", "cgd")
+DEFAULT_LENGTHS = (0.15, 0.18, 0.25, 0.35, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 4.0)
+DEVICE_POLARITY = {"nfet_01v8": 1, "nfet_01v8_lvt": 1, "pfet_01v8": -1, "pfet_01v8_lvt": -1, "pfet_01v8_hvt": -1}
+
+
+class DeviceTable:
+    """Characterization table of one device and corner, indexed by (L, VGS, VDS)
+
+    Voltages are magnitudes in V, lengths in um. Currents and capacitances are
+    stored for the reference width and scale linearly with W; the ratios
+    (gm/Id, gm/gds, ft) do not depend on W. Lookups take arrays of any
+    broadcastable shape and interpolate linearly on the grid.
+    """
+
+    def __init__(self, l: np.ndarray, vgs: np.ndarray, vds: np.ndarray, width: float,
+                 data: Dict[str, np.ndarray], meta: Optional[Dict] = None):
+        self.l = np.asarray(l, dtype=float)
+        self.vgs = np.asarray(vgs, dtype=float)
+        self.vds = np.asarray(vds, dtype=float)
+        self.width = float(width)
+        self.data = {name: np.asarray(values, dtype=float) for name, values in data.items()}
+        self.meta = meta or {}
+        self._interpolators: Dict[str, RegularGridInterpolator] = {}
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> 'DeviceTable':
+        with np.load(path) as f:
+            data = {name: f[name] for name in OPERATING_POINT}
+            return cls(f["l"], f["vgs"], f["vds"], float(f["width"]), data, json.loads(str(f["meta"])))
+
+    def save(self, path: Union[str, Path]) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp.npz")
+        np.savez_compressed(tmp, l=self.l, vgs=self.vgs, vds=self.vds, width=self.width,
+                            meta=json.dumps(self.meta), **self.data)
+        os.replace(tmp, path)
+
+    def grid(self, quantity: str) -> np.ndarray:
+        """A stored or derived quantity over the whole grid"""
+        if quantity in self.data:
+            return self.data[quantity]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if quantity == "gm_id":
+                values = self.data["gm"] / self.data["id"]
+            elif quantity == "gm_gds":
+                values = self.data["gm"] / self.data["gds"]
+            elif quantity == "ft":
+                values = self.data["gm"] / (2 * np.pi * self.data["cgg"])
+            elif quantity == "id_w":
+                values = self.data["id"] / self.width
+            else:
+                raise KeyError(f"Unknown quantity {quantity!r}")
+        return np.nan_to_num(values, nan=0.0, posinf=0.0, neginf=0.0)
+
+    def _interpolator(self, quantity: str) -> RegularGridInterpolator:
+        if quantity not in self._interpolators:
+            self._interpolators[quantity] = RegularGridInterpolator(
+                (self.l, self.vgs, self.vds), self.grid(quantity), bounds_error=False, fill_value=None)
+        return self._interpolators[quantity]
+
+    def lookup(self, quantity: str, l, vgs, vds, w=None) -> np.ndarray:
+        """Interpolate a quantity at (L, VGS, VDS); extensive quantities are scaled to W if given"""
+        l, vgs, vds = np.broadcast_arrays(np.asarray(l, float), np.asarray(vgs, float), np.asarray(vds, float))
+        points = np.stack([np.clip(l, self.l[0], self.l[-1]), vgs, vds], axis=-1)
+        values = self._interpolator(quantity)(points)
+        if w is not None and quantity in OPERATING_POINT:
+            values = values * (np.asarray(w, float) / self.width)
+        return values
+
+    def vgs_for(self, quantity: str, target, l, vds) -> np.ndarray:
+        """Invert a quantity that is monotonic in VGS (e.g. gm_id) at given L and VDS"""
+        target, l, vds = np.broadcast_arrays(np.asarray(target, float), np.asarray(l, float),
+                                             np.asarray(vds, float))
+        # Sample the quantity along the VGS axis for every requested point
+        shape = target.shape + (len(self.vgs),)
+        curves = self.lookup(quantity, l[..., None], np.broadcast_to(self.vgs, shape), vds[..., None])
+        if curves.shape[-1] > 1 and curves[..., 0].mean() > curves[..., -1].mean():
+            curves, vgs = curves[..., ::-1], self.vgs[::-1]
+        else:
+            vgs = self.vgs
+        # First grid segment that brackets the target, then linear interpolation within it
+        above = curves >= target[..., None]
+        index = np.clip(np.argmax(above, axis=-1), 1, len(vgs) - 1)
+        lo = np.take_along_axis(curves, (index - 1)[..., None], -1)[..., 0]
+        hi = np.take_along_axis(curves, index[..., None], -1)[..., 0]
+        fraction = np.clip(np.divide(target - lo, hi - lo, out=np.zeros_like(lo), where=hi != lo), 0, 1)
+        return vgs[index - 1] + fraction * (vgs[index] - vgs[index - 1])
+
+    def size(self, gm_id, l, vds, current) -> Tuple[np.ndarray, np.ndarray]:
+        """gm/Id sizing: the (VGS, W) that give `current` at the requested gm/Id"""
+        vgs = self.vgs_for("gm_id", gm_id, l, vds)
+        width = np.asarray(current, float) / self.lookup("id_w", l, vgs, vds)
+        return vgs, width
+
+
+class DeviceCharacterizer:
+    """Sweeps PDK devices in batched ngspice runs and caches the tables as compressed NumPy files
+
+    One ngspice run covers every length of a device at one corner: each length
+    is its own instance on shared gate/drain sources, swept over VDS and VGS
+    with a nested .dc. Tables are keyed by PDK version and sweep settings, so
+    they are only regenerated when either changes.
+    """
+
+    def __init__(self, reducer: Optional[ModelReducer] = None,
+                 table_dir: Optional[Union[str, Path]] = None,
+                 lengths: Sequence[float] = DEFAULT_LENGTHS, width: float = 1.0,
+                 vgs_step: float = 0.025, vds_step: float = 0.05, vmax: float = 1.8):
+        """
+        Args:
+            reducer: Provides the model library and per-device reduced decks
+            table_dir: Where tables are kept (default: BUILD_DIR/characterization)
+            lengths: Channel lengths to characterize in um
+            width: Reference width in um
+            vgs_step, vds_step, vmax: Sweep resolution and range in V
+        """
+        self.reducer = reducer or ModelReducer()
+        self.table_dir = Path(table_dir) if table_dir else Path(SimulationRunner.BUILD_DIR) / "characterization"
+        self.lengths = tuple(sorted(lengths))
+        self.width = width
+        self.vgs_step = vgs_step
+        self.vds_step = vds_step
+        self.vmax = vmax
+
+    def _axis(self, step: float) -> np.ndarray:
+        return np.round(np.arange(0.0, self.vmax + step / 2, step), 6)
+
+    def sweep_key(self) -> str:
+        key = [self.reducer.pdk_version(), self.lengths, self.width, self.vgs_step, self.vds_step, self.vmax]
+        return hashlib.sha1(json.dumps(key).encode()).hexdigest()[:10]
+
+    def table_path(self, device: str, corner: str) -> Path:
+        return self.table_dir / f"{device}_{corner}_{self.sweep_key()}.npz"
+
+    def sweep_netlist(self, device: str, corner: str, data_file: Path) -> str:
+        """ngspice deck sweeping every length of a device at one corner"""
+        sign = DEVICE_POLARITY.get(device, 1)
+        model = PDK_MODEL_PREFIX + device
+        deck = self.reducer.deck(corner, [model])
+        probes = [f"@m.xm{i}.m{model}[{quantity}]"
+                  for i in range(len(self.lengths)) for quantity in OPERATING_POINT]
+        stop_gs, stop_ds = sign * self.vmax, sign * self.vmax
+
+        lines = [f"* {device} characterization, corner {corner}", f".include {deck}",
+                 "Vg g 0 0", "Vd d 0 0"]
+        lines += [f"XM{i} d g 0 0 {model} L={l} W={self.width} nf=1 mult=1" for i, l in enumerate(self.lengths)]
+        lines += [
+            f".save {' '.join(probes)}",
+            f".dc Vd 0 {stop_ds} {sign * self.vds_step} Vg 0 {stop_gs} {sign * self.vgs_step}",
+            ".control",
+            "run",
+            "set wr_singlescale",
+            "set wr_vecnames",
+            f"wrdata {data_file} {' '.join(probes)}",
+            ".endc",
+            ".end",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def _parse(self, data_file: Path) -> Dict[str, np.ndarray]:
+        vgs, vds = self._axis(self.vgs_step), self._axis(self.vds_step)
+        rows = np.loadtxt(data_file, skiprows=1, ndmin=2)
+        expected = len(vgs) * len(vds)
+        if rows.shape[0] != expected:
+            raise RuntimeError(f"Sweep produced {rows.shape[0]} points, expected {expected}")
+        # Column 0 is the inner sweep (VDS); VGS is the outer loop
+        columns = rows[:, 1:].reshape(expected, len(self.lengths), len(OPERATING_POINT))
+        columns = np.abs(columns).reshape(len(vgs), len(vds), len(self.lengths), len(OPERATING_POINT))
+        return {quantity: np.ascontiguousarray(columns[:, :, :, k].transpose(2, 0, 1))
+                for k, quantity in enumerate(OPERATING_POINT)}
+
+    def characterize(self, device: str, corner: str = "tt", timeout: float = 600,
+                     force: bool = False) -> Path:
+        """Table for one device and corner, running the sweep only if it is not cached"""
+        path = self.table_path(device, corner)
+        if path.exists() and not force:
+            return path
+
+        with tempfile.TemporaryDirectory(prefix="mvm_char_") as tmp:
+            netlist, data_file = Path(tmp) / f"{device}_{corner}.spice", Path(tmp) / "sweep.dat"
+            netlist.write_text(self.sweep_netlist(device, corner, data_file), encoding='utf-8')
+            result = SimulationRunner.run_command(['ngspice', '-b', str(netlist)], timeout, tmp)
+            if not data_file.exists():
+                raise RuntimeError(f"ngspice sweep of {device} ({corner}) failed:\n{result.stdout[-2000:]}")
+            data = self._parse(data_file)
+
+        meta = {"device": device, "corner": corner, "pdk_version": self.reducer.pdk_version()}
+        DeviceTable(self.lengths, self._axis(self.vgs_step), self._axis(self.vds_step),
+                    self.width, data, meta).save(path)
+        return path
+
+    def characterize_all(self, devices: Sequence[str] = ("nfet_01v8", "pfet_01v8"),
+                         corners: Sequence[str] = ("tt", "ff", "ss", "sf", "fs"),
+                         max_workers: Optional[int] = None) -> Dict[Tuple[str, str], Path]:
+        """Characterize every device/corner pair, one ngspice run each in parallel"""
+        jobs = [(device, corner) for device in devices for corner in corners]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            paths = list(executor.map(lambda job: self.characterize(*job), jobs))
+        return dict(zip(jobs, paths))
+
+    def table(self, device: str, corner: str = "tt") -> DeviceTable:
+        """Loaded table for a device and corner, characterizing it first if needed"""
+        path = self.characterize(device, corner)
+        return _load_table(path, path.stat().st_mtime_ns)
+
+
+@lru_cache(maxsize=32)
+def _load_table(path: Path, mtime_ns: int) -> DeviceTable:
+    """Keyed on the modification time too, so a table rewritten by force=True is reloaded"""
+    return DeviceTable.load(path)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Characterize sky130 devices into gm/Id tables")
+    parser.add_argument("--devices", nargs="+", default=["nfet_01v8", "pfet_01v8"])
+    parser.add_argument("--corners", nargs="+", default=["tt"])
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--force", action="store_true", help="re-run sweeps even if cached")
+    args = parser.parse_args(argv)
+
+    characterizer = DeviceCharacterizer()
+    if args.force:
+        for device in args.devices:
+            for corner in args.corners:
+                characterizer.characterize(device, corner, force=True)
+    for (device, corner), path in characterizer.characterize_all(args.devices, args.corners, args.workers).items():
+        print(f"{device} {corner}: {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,4 @@
+from collections.abc import Mapping
 from typing import Dict, Any, Optional
 
 class DocumentationGenerator:
@@ -23,7 +24,7 @@ class DocumentationGenerator:
             for test, res in results.items():
                 f.write(f"### {test.replace('_', ' ').title()}\n")
                 
-                if isinstance(res, dict) and "error" not in res:
+                if isinstance(res, Mapping) and "error" not in res:
                     # Extract metrics from the result
                     for metric, value in res.items():
                         # Skip non-metric fields
@@ -47,6 +48,8 @@ class DocumentationGenerator:
                         except (ValueError, TypeError):
                             # If value can't be converted to float, write as-is
                             f.write(f"- {metric}: {value}\n")
+                elif isinstance(res, Mapping):
+                    f.write(f"- Result: {res['error']}\n")
                 else:
                     f.write(f"- Result: {res}\n")
                 f.write("\n")
@@ -0,0 +1,356 @@
+import os
+import re
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import threading
+import numpy as np
+from pathlib import Path
+from typing import List, Dict, Optional, Union, Any, Tuple, Iterable
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, CURRENT_DIR)
+from SimulationRunner import SimulationRunner
+from SimulationResult import SimulationStatus
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    circuit_type TEXT NOT NULL,
+    started REAL NOT NULL,
+    note TEXT
+);
+CREATE TABLE IF NOT EXISTS variants (
+    id INTEGER PRIMARY KEY,
+    run INTEGER NOT NULL REFERENCES runs(id),
+    name TEXT NOT NULL,
+    corner TEXT NOT NULL,
+    params TEXT NOT NULL,
+    UNIQUE (run, name, corner)
+);
+CREATE TABLE IF NOT EXISTS parameters (
+    variant INTEGER NOT NULL REFERENCES variants(id),
+    name TEXT NOT NULL,
+    value REAL
+);
+CREATE TABLE IF NOT EXISTS evaluations (
+    id INTEGER PRIMARY KEY,
+    variant INTEGER NOT NULL REFERENCES variants(id),
+    test TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    message TEXT,
+    runtime REAL,
+    netlist_hash TEXT
+);
+CREATE TABLE IF NOT EXISTS metrics (
+    variant INTEGER NOT NULL REFERENCES variants(id),
+    evaluation INTEGER NOT NULL REFERENCES evaluations(id),
+    name TEXT NOT NULL,
+    value REAL
+);
+CREATE INDEX IF NOT EXISTS metrics_by_value ON metrics (name, value, variant);
+CREATE INDEX IF NOT EXISTS metrics_by_variant ON metrics (variant);
+CREATE INDEX IF NOT EXISTS parameters_by_value ON parameters (name, value, variant);
+CREATE INDEX IF NOT EXISTS evaluations_by_variant ON evaluations (variant);
+CREATE INDEX IF NOT EXISTS evaluations_by_netlist ON evaluations (netlist_hash);
+"""
+
+OPERATORS = ("<=", ">=", "!=", "=", "<", ">")
+SI_PREFIXES = {"T": 1e12, "G": 1e9, "M": 1e6, "k": 1e3, "K": 1e3, "m": 1e-3, "u": 1e-6, "µ": 1e-6, "μ": 1e-6,
+               "n": 1e-9, "p": 1e-12, "f": 1e-15}
+# Units, each optionally after a prefix; a lone "K" is kelvin, not kilo
+BASE_UNITS = ("V", "A", "W", "Hz", "F", "s", "dB", "dBc", "dBm", "deg", "Ohm", "ohm", "Ω", "%", "K")
+CONDITION_PATTERN = re.compile(
+    r"^\s*([\w.]+)\s*(<=|>=|!=|=|<|>)\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)\s*([^\s\d]*)\s*$")
+
+Condition = Tuple[str, str, float]
+
+
+def unit_scale(unit: str) -> float:
+    """Factor of a unit such as "MHz", "meg", "kOhm", "V/us" or a bare prefix ("m"), ValueError if unknown"""
+    numerator, _, denominator = unit.partition("/")
+    if denominator:
+        return unit_scale(numerator) / unit_scale(denominator)
+    if not unit or unit in BASE_UNITS:
+        return 1.0
+    # SPICE "meg" before the single letters, where it would read as milli
+    if unit[:3].lower() == "meg":
+        scale, rest = 1e6, unit[3:]
+    elif unit[0] in SI_PREFIXES:
+        scale, rest = SI_PREFIXES[unit[0]], unit[1:]
+    else:
+        raise ValueError(f"Unknown unit {unit!r}")
+    if rest and (rest not in BASE_UNITS or rest == "K"):
+        raise ValueError(f"Unknown unit {unit!r}")
+    return scale
+
+
+def parse_condition(text: str) -> Condition:
+    """Parse "GBW > 50 MHz" or "M1.W <= 10" (parameters as written, in um) into (name, operator, value)
+
+    >>> parse_condition("GBW > 50 MHz")
+    ('GBW', '>', 50000000.0)
+    >>> parse_condition("GBW > 50 KHz"), parse_condition("GBW > 50 meg")
+    (('GBW', '>', 50000.0), ('GBW', '>', 50000000.0))
+    >>> parse_condition("R > 10 KOhm"), parse_condition("T < 300 K")
+    (('R', '>', 10000.0), ('T', '<', 300.0))
+    >>> parse_condition("SLEW_RATE_POS > 10 V/us")
+    ('SLEW_RATE_POS', '>', 10000000.0)
+    >>> parse_condition("CL = 1.5 pF"), parse_condition("DC_GAIN >= 60 dB")
+    (('CL', '=', 1.5e-12), ('DC_GAIN', '>=', 60.0))
+    >>> parse_condition("POWER < 10 μW")[2] == parse_condition("POWER < 10 µW")[2] == parse_condition("POWER < 10 uW")[2]
+    True
+    >>> parse_condition("POWER < 10 xW")
+    Traceback (most recent call last):
+    ...
+    ValueError: Unknown unit 'xW' in condition: 'POWER < 10 xW'
+    >>> parse_condition("SLEW_RATE_POS > 10 V/um")
+    Traceback (most recent call last):
+    ...
+    ValueError: Unknown unit 'V/um' in condition: 'SLEW_RATE_POS > 10 V/um'
+    """
+    match = CONDITION_PATTERN.match(text)
+    if match is None:
+        raise ValueError(f"Cannot parse condition: {text!r}")
+    name, op, number, unit = match.groups()
+    try:
+        scale = unit_scale(unit)
+    except ValueError:
+        raise ValueError(f"Unknown unit {unit!r} in condition: {text!r}") from None
+    return name, op, float(number) * scale
+
+
+def parse_query(text: str) -> List[Condition]:
+    """Conditions joined by "and", e.g. "GBW > 50 MHz and POWER < 10 µW" """
+    return [parse_condition(part) for part in re.split(r"\s+and\s+", text.strip(), flags=re.IGNORECASE) if part]
+
+
+def _flatten(params: Dict[str, Dict[str, Any]]) -> Dict[str, Optional[float]]:
+    flat = {}
+    for comp, values in params.items():
+        for key, value in values.items():
+            try:
+                flat[f"{comp}.{key}"] = float(value)
+            except (TypeError, ValueError):
+                flat[f"{comp}.{key}"] = None
+    return flat
+
+
+class EvaluationStore:
+    """SQLite database of every simulation, queryable across runs and variants
+
+    Each store session opens a run; every simulated variant records its
+    parameters and corner, and every test its status, runtime, netlist hash
+    and metrics. Rows are buffered and written in one transaction per batch,
+    with the database in WAL mode so readers never block the optimizer.
+    Metric and parameter values are indexed by name and value, so threshold
+    queries touch only the matching rows.
+    """
+
+    def __init__(self, path: Optional[Union[str, Path]] = None, batch_size: int = 500):
+        """
+        Args:
+            path: Database file (default: BUILD_DIR/evaluations.db)
+            batch_size: Buffered variants written per transaction
+        """
+        self.path = Path(path or Path(SimulationRunner.BUILD_DIR) / "evaluations.db")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.batch_size = batch_size
+        self.run_id: Optional[int] = None
+        self._pending: List[Tuple[str, str, Dict[str, Dict[str, Any]], Dict[str, Any]]] = []
+        self._lock = threading.Lock()
+
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def start_run(self, circuit_type: str, note: str = "") -> int:
+        """Open a new run; later records belong to it"""
+        with self._lock:
+            self._flush()
+            cursor = self.conn.execute("INSERT INTO runs (circuit_type, started, note) VALUES (?, ?, ?)",
+                                       (circuit_type, time.time(), note))
+            self.conn.commit()
+            self.run_id = cursor.lastrowid
+        return self.run_id
+
+    def record_variant(self, circuit_type: str, variant: str, params: Dict[str, Dict[str, Any]],
+                       results: Dict[str, Any], corner: str = "tt") -> None:
+        """Buffer one variant's parameters and test results (as from build_and_simulate_variants)"""
+        if self.run_id is None:
+            self.start_run(circuit_type)
+        with self._lock:
+            self._pending.append((variant, corner, params, results))
+            if len(self._pending) >= self.batch_size:
+                self._flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._pending:
+            return
+        with self.conn:
+            for variant, corner, params, results in self._pending:
+                # Re-evaluating a variant in the same run replaces its rows
+                row = self.conn.execute("SELECT id FROM variants WHERE run = ? AND name = ? AND corner = ?",
+                                        (self.run_id, variant, corner)).fetchone()
+                if row is not None:
+                    for table in ("metrics", "evaluations", "parameters"):
+                        self.conn.execute(f"DELETE FROM {table} WHERE variant = ?", row)
+                    self.conn.execute("DELETE FROM variants WHERE id = ?", row)
+
+                variant_id = self.conn.execute(
+                    "INSERT INTO variants (run, name, corner, params) VALUES (?, ?, ?, ?)",
+                    (self.run_id, variant, corner, json.dumps(params))).lastrowid
+                self.conn.executemany("INSERT INTO parameters (variant, name, value) VALUES (?, ?, ?)",
+                                      [(variant_id, name, value) for name, value in _flatten(params).items()])
+
+                for test, result in results.items():
+                    # Plain dicts from older callers carry failures under "error"
+                    status = getattr(result, "status",
+                                     SimulationStatus.ERROR if "error" in result else SimulationStatus.OK)
+                    evaluation_id = self.conn.execute(
+                        "INSERT INTO evaluations (variant, test, status, message, runtime, netlist_hash) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (variant_id, test, int(status), result.get("error"),
+                         getattr(result, "runtime", None), getattr(result, "netlist_hash", None))).lastrowid
+                    self.conn.executemany(
+                        "INSERT INTO metrics (variant, evaluation, name, value) VALUES (?, ?, ?, ?)",
+                        [(variant_id, evaluation_id, name, float(value)) for name, value in result.items()
+                         if isinstance(value, (int, float))])
+        self._pending.clear()
+
+    # Queries -----------------------------------------------------------
+
+    def _where(self, conditions: Union[str, Iterable[Condition]], circuit_type: Optional[str],
+               run: Optional[int], corner: Optional[str]) -> Tuple[str, List[Any]]:
+        if isinstance(conditions, str):
+            conditions = parse_query(conditions)
+        clauses, args = [], []
+        for name, op, value in conditions:
+            if op not in OPERATORS:
+                raise ValueError(f"Unknown operator {op!r}")
+            # Dotted names are parameters (M1.W), everything else is a metric
+            table = "parameters" if "." in name else "metrics"
+            clauses.append(f"v.id IN (SELECT variant FROM {table} WHERE name = ? AND value {op} ?)")
+            args.extend([name, value])
+        if circuit_type is not None:
+            clauses.append("r.circuit_type = ?")
+            args.append(circuit_type)
+        if run is not None:
+            clauses.append("v.run = ?")
+            args.append(run)
+        if corner is not None:
+            clauses.append("v.corner = ?")
+            args.append(corner)
+        return " AND ".join(clauses) or "1", args
+
+    def query(self, conditions: Union[str, Iterable[Condition]] = (), circuit_type: Optional[str] = None,
+              run: Optional[int] = None, corner: Optional[str] = None,
+              limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Variants meeting every condition, e.g. query("GBW > 50 MHz and POWER < 10 µW")
+
+        Returns run, variant name, corner, parameters and metrics of each match.
+        """
+        self.flush()
+        where, args = self._where(conditions, circuit_type, run, corner)
+        sql = (f"SELECT v.id, v.run, v.name, v.corner, v.params FROM variants v "
+               f"JOIN runs r ON r.id = v.run WHERE {where} ORDER BY v.id")
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        rows = self.conn.execute(sql, args).fetchall()
+
+        matches = {row[0]: {"run": row[1], "variant": row[2], "corner": row[3],
+                            "params": json.loads(row[4]), "metrics": {}} for row in rows}
+        ids = list(matches)
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            for variant, name, value in self.conn.execute(
+                    f"SELECT variant, name, value FROM metrics WHERE variant IN ({placeholders})", chunk):
+                matches[variant]["metrics"][name] = value
+        return list(matches.values())
+
+    def count(self, conditions: Union[str, Iterable[Condition]] = (), circuit_type: Optional[str] = None,
+              run: Optional[int] = None, corner: Optional[str] = None) -> int:
+        self.flush()
+        where, args = self._where(conditions, circuit_type, run, corner)
+        return self.conn.execute(f"SELECT COUNT(*) FROM variants v JOIN runs r ON r.id = v.run WHERE {where}",
+                                 args).fetchone()[0]
+
+    def runs(self) -> List[Dict[str, Any]]:
+        rows = self.conn.execute("SELECT r.id, r.circuit_type, r.started, r.note, COUNT(v.id) FROM runs r "
+                                 "LEFT JOIN variants v ON v.run = r.id GROUP BY r.id ORDER BY r.id").fetchall()
+        return [{"run": r[0], "circuit_type": r[1], "started": r[2], "note": r[3], "variants": r[4]} for r in rows]
+
+    def export(self, path: Union[str, Path], conditions: Union[str, Iterable[Condition]] = (),
+               circuit_type: Optional[str] = None, run: Optional[int] = None) -> Path:
+        """Write matching variants column by column to an NPZ file
+
+        Columns are "run", "variant", "corner", "p.<comp>.<param>" and
+        "m.<metric>", one row per variant, NaN where a value is missing.
+        """
+        rows = self.query(conditions, circuit_type, run)
+        parameters = sorted({name for row in rows for name in _flatten(row["params"])})
+        metrics = sorted({name for row in rows for name in row["metrics"]})
+
+        columns = {
+            "run": np.array([row["run"] for row in rows], dtype=np.int64),
+            "variant": np.array([row["variant"] for row in rows], dtype=str),
+            "corner": np.array([row["corner"] for row in rows], dtype=str),
+        }
+        flat = [_flatten(row["params"]) for row in rows]
+        for name in parameters:
+            columns[f"p.{name}"] = np.array([np.nan if p.get(name) is None else p[name] for p in flat])
+        for name in metrics:
+            columns[f"m.{name}"] = np.array([row["metrics"].get(name, np.nan) for row in rows], dtype=float)
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(path, **columns)
+        return path
+
+    def close(self) -> None:
+        self.flush()
+        self.conn.close()
+
+    def __enter__(self) -> 'EvaluationStore':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the evaluation database")
+    parser.add_argument("query", nargs="?", default="", help='e.g. "GBW > 50 MHz and POWER < 10 uW"')
+    parser.add_argument("--db", type=Path, default=None, help="Database file (default: build/schematic/evaluations.db)")
+    parser.add_argument("--circuit", default=None, help="Only this circuit type")
+    parser.add_argument("--run", type=int, default=None, help="Only this run")
+    parser.add_argument("--export", type=Path, default=None, help="Write the matches to an NPZ file")
+    parser.add_argument("--limit", type=int, default=20, help="Rows to print")
+    args = parser.parse_args()
+
+    with EvaluationStore(args.db) as store:
+        if not args.query and args.export is None:
+            for run in store.runs():
+                print(f"run {run['run']:>4}  {run['circuit_type']:<10} {run['variants']:>7} variants  "
+                      f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(run['started']))}  {run['note'] or ''}")
+            return
+        if args.export is not None:
+            print(f"Exported to {store.export(args.export, args.query, args.circuit, args.run)}")
+            return
+        total = store.count(args.query, args.circuit, args.run)
+        for row in store.query(args.query, args.circuit, args.run, limit=args.limit):
+            shown = ", ".join(f"{name}={value:.4g}" for name, value in sorted(row["metrics"].items()))
+            print(f"run {row['run']:>4}  {row['variant']:<16} {row['corner']:<4} {shown}")
+        print(f"{total} matching variants")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+import os
+import re
+import sys
+import numpy as np
+from typing import List, Dict, Optional, Sequence, Any, Iterable
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, CURRENT_DIR)
+from Grammar import *
+
+# sky130 layout constants in um, matching the ad/as/pd/ps expressions of the PDK symbols
+DIFF_LENGTH = 0.29          # source/drain diffusion length between gates
+POLY_ENDCAP = 0.13          # poly extension past diffusion
+DEVICE_SPACING = 0.27       # diffusion-to-diffusion spacing between devices
+
+MOS_SYMBOLS = ("nfet", "pfet")
+GEOMETRY_METRICS = ("TOTAL_AREA", "DIFFUSION_AREA", "DIFFUSION_PERIMETER", "FOOTPRINT")
+AREA_DEVICE_PATTERN = re.compile(r"@(\w+)\[W\]", re.IGNORECASE)
+
+
+def _number(value: Any, default: float) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def device_sizes(components: Iterable[XSchemObject]) -> Dict[str, Dict[str, float]]:
+    """W, L, nf and mult (MF for capacitors) of every sized PDK device in a schematic"""
+    sizes = {}
+    for comp in components:
+        if not isinstance(comp, Component) or not comp.symbolReference.startswith("sky130_fd_pr/"):
+            continue
+        props = comp.properties
+        if "W" not in props or "L" not in props:
+            continue
+        sizes[props["name"]] = {
+            "W": _number(props["W"], 0.0), "L": _number(props["L"], 0.0),
+            "nf": _number(props.get("nf"), 1.0),
+            "mult": _number(props.get("mult", props.get("MF")), 1.0),
+            "mos": any(kind in comp.symbolReference for kind in MOS_SYMBOLS),
+        }
+    return sizes
+
+
+def area_devices(test_config: Dict[str, Any]) -> List[str]:
+    """Devices whose W*L an area test sums, read from its @Mx[W] references"""
+    return list(dict.fromkeys(name.upper() for name in AREA_DEVICE_PATTERN.findall(test_config.get("spice", ""))))
+
+
+def diffusion(w, nf):
+    """Drain and source area/perimeter with the PDK symbols' finger-aware formulas"""
+    w, nf = np.asarray(w, float), np.maximum(np.asarray(nf, float), 1)
+    finger = w / nf
+    drains, sources = np.floor((nf + 1) / 2), np.floor((nf + 2) / 2)
+    return {
+        "ad": drains * finger * DIFF_LENGTH, "pd": 2 * drains * (finger + DIFF_LENGTH),
+        "as": sources * finger * DIFF_LENGTH, "ps": 2 * sources * (finger + DIFF_LENGTH),
+    }
+
+
+def footprint(w, l, nf, mult):
+    """Estimated layout area of a multi-finger device: fingers side by side plus spacing"""
+    w, l = np.asarray(w, float), np.asarray(l, float)
+    nf, mult = np.maximum(np.asarray(nf, float), 1), np.asarray(mult, float)
+    width = nf * l + (nf + 1) * DIFF_LENGTH + DEVICE_SPACING
+    height = w / nf + 2 * POLY_ENDCAP + DEVICE_SPACING
+    return mult * width * height
+
+
+def batch_geometry_metrics(sizes: Dict[str, Dict[str, Any]],
+                           area_names: Optional[Sequence[str]] = None) -> Dict[str, np.ndarray]:
+    """Geometry metrics in um/um^2 for arrays (or scalars) of device sizes
+
+    TOTAL_AREA is the gate area W*L summed over `area_names` (default: every
+    MOS device), as the area_calculation testbenches compute it. Diffusion and
+    footprint cover every MOS device; capacitors add their plate area to the
+    footprint.
+    """
+    mos = [name for name, size in sizes.items() if size.get("mos", True)]
+    area_names = list(area_names) if area_names else mos
+    metrics = {name: 0.0 for name in GEOMETRY_METRICS}
+
+    for name, size in sizes.items():
+        w, l = np.asarray(size["W"], float), np.asarray(size["L"], float)
+        nf, mult = size.get("nf", 1.0), np.asarray(size.get("mult", 1.0), float)
+        if name in area_names:
+            metrics["TOTAL_AREA"] = metrics["TOTAL_AREA"] + w * l
+        if name in mos:
+            d = diffusion(w, nf)
+            metrics["DIFFUSION_AREA"] = metrics["DIFFUSION_AREA"] + mult * (d["ad"] + d["as"])
+            metrics["DIFFUSION_PERIMETER"] = metrics["DIFFUSION_PERIMETER"] + mult * (d["pd"] + d["ps"])
+            metrics["FOOTPRINT"] = metrics["FOOTPRINT"] + footprint(w, l, nf, mult)
+        else:
+            metrics["FOOTPRINT"] = metrics["FOOTPRINT"] + mult * w * l
+    return {name: np.asarray(value, float) for name, value in metrics.items()}
+
+
+def geometry_metrics(components: Iterable[XSchemObject],
+                     params: Optional[Dict[str, Dict[str, Any]]] = None,
+                     area_names: Optional[Sequence[str]] = None) -> Dict[str, float]:
+    """Geometry metrics of a schematic, with optional create_variant-style parameter overrides"""
+    sizes = device_sizes(components)
+    for name, overrides in (params or {}).items():
+        if name in sizes:
+            sizes[name].update({key: _number(value, sizes[name].get(key, 0.0))
+                                for key, value in overrides.items() if key in ("W", "L", "nf", "mult")})
+    return {name: float(value) for name, value in batch_geometry_metrics(sizes, area_names).items()}
+
+
+def geometry_from_vectors(population: np.ndarray, bounds: Sequence[Any],
+                          defaults: Dict[str, Dict[str, float]],
+                          area_names: Optional[Sequence[str]] = None) -> Dict[str, np.ndarray]:
+    """Geometry metrics for a population of optimizer vectors (one row per candidate)
+
+    `bounds` are ParameterBound-like objects naming the component and
+    parameter of each column; everything else keeps its `defaults` value.
+    """
+    population = np.atleast_2d(np.asarray(population, float))
+    sizes = {name: dict(size) for name, size in defaults.items()}
+    for column, bound in enumerate(bounds):
+        if bound.component in sizes:
+            sizes[bound.component][bound.parameter] = population[:, column]
+    return batch_geometry_metrics(sizes, area_names)
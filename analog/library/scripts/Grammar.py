@@ -17,6 +17,7 @@ class ObjectType(Enum):
     TEDAX = 'TEDAx'
     GLOBAL_PROPERTIES = 'GlobalProperties'
     EMBEDDED_SYMBOL = 'EmbeddedSymbol'
+    UNPARSED = 'Unparsed'
 
 @dataclass
 class CoordinatePair:
@@ -156,8 +157,15 @@ class EmbeddedSymbol(XSchemObject):
     symbol: List[XSchemObject] = field(default_factory=list)
     type: str = field(default="EmbeddedSymbol", init=False)
 
+@dataclass
+class Unparsed(XSchemObject):
+    """Object kept as its source text by a selective parse: command letter plus raw block"""
+    command: str = ""
+    raw: str = ""
+    type: str = field(default="Unparsed", init=False)
+
 # Type alias for any XSchem object
 XSchemObjectType = Union[
     Version, Line, Rectangle, Arc, Polygon, Text, Wire, 
-    Component, Spice, Verilog, VHDL, TEDAx, GlobalProperties, EmbeddedSymbol
+    Component, Spice, Verilog, VHDL, TEDAx, GlobalProperties, EmbeddedSymbol, Unparsed
 ]
@@ -0,0 +1,193 @@
+import os
+import re
+import sys
+import hashlib
+import tempfile
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Union, Tuple, Iterable
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, CURRENT_DIR)
+from SimulationRunner import SimulationRunner
+from SymbolResolver import SymbolResolver
+from Grammar import *
+
+SUBCKT_PATTERN = re.compile(r"^\s*\.subckt\s+(\S+)", re.IGNORECASE)
+ENDS_PATTERN = re.compile(r"^\s*\.ends\b", re.IGNORECASE)
+END_PATTERN = re.compile(r"^\s*\.end\s*$", re.IGNORECASE)
+
+
+def split_netlist(text: str) -> Tuple[List[str], Dict[str, str]]:
+    """Top-level lines (without .end) and the .subckt blocks of a netlist, by lowercase name"""
+    body, blocks = [], {}
+    current, name = None, None
+    for line in text.splitlines():
+        if current is None:
+            match = SUBCKT_PATTERN.match(line)
+            if match:
+                current, name = [line], match.group(1).lower()
+            elif not END_PATTERN.match(line):
+                body.append(line)
+        else:
+            current.append(line)
+            if ENDS_PATTERN.match(line):
+                blocks.setdefault(name, "\n".join(current) + "\n")
+                current = None
+    return body, blocks
+
+
+class HierarchicalNetlister:
+    """Builds SPICE decks one subcircuit at a time, reusing unchanged .subckt blocks
+
+    Every distinct subcircuit schematic/symbol pair in a hierarchy is netlisted
+    on its own with xschem's top_subckt mode and its block is cached under a
+    hash of its sources: the schematic, its symbol and the symbols it
+    instantiates (their pin order and format shape the block, their contents
+    do not). A testbench deck is its own top-level lines plus the cached
+    blocks, so changing one leaf re-netlists that leaf and relinks the deck.
+    """
+
+    def __init__(self, resolver: Optional[SymbolResolver] = None, runner: Optional[SimulationRunner] = None,
+                 cache_dir: Optional[Union[str, Path]] = None, max_workers: Optional[int] = None,
+                 timeout: Optional[float] = 30):
+        """
+        Args:
+            resolver: Finds the symbols and schematics of the hierarchy (default: xschemrc search paths)
+            runner: Supplies the xschem command and BUILD_DIR (default: SimulationRunner)
+            cache_dir: Where .subckt blocks are kept (default: BUILD_DIR/subckt)
+            max_workers: Concurrent xschem processes for changed cells
+            timeout: Seconds allowed per xschem call
+        """
+        self.resolver = resolver or SymbolResolver()
+        self.runner = runner or SimulationRunner()
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.built = 0
+        self.reused = 0
+        self._lock = threading.Lock()
+
+    @property
+    def cache(self) -> Path:
+        return self.cache_dir or Path(self.runner.BUILD_DIR) / "subckt"
+
+    def cells(self, top: Union[str, Path]) -> Dict[Path, Path]:
+        """Subcircuit schematic -> symbol for every distinct cell below a top schematic"""
+        cells = {}
+        for _, _, symbol in self.resolver.walk(top):
+            if symbol is None or symbol.suffix != ".sym" or not symbol.with_suffix(".sch").is_file():
+                continue
+            schematic = symbol.with_suffix(".sch")
+            if schematic not in cells and self._is_subcircuit(symbol):
+                cells[schematic] = symbol
+        return cells
+
+    def _is_subcircuit(self, symbol: Path) -> bool:
+        for obj in self.resolver.cache.objects(symbol):
+            if isinstance(obj, GlobalProperties):
+                return obj.properties.get("type", "subcircuit") == "subcircuit"
+        return True
+
+    def cell_key(self, schematic: Path) -> str:
+        """Hash of everything that shapes the netlist of one schematic, excluding its children's contents"""
+        digest = hashlib.sha1(" ".join(self.runner.netlist_command(Path("cell"))).encode())
+        digest.update(schematic.read_bytes())
+        symbol = schematic.with_suffix(".sym")
+        if symbol.is_file():
+            digest.update(symbol.read_bytes())
+        for obj in self.resolver.cache.objects(schematic):
+            if isinstance(obj, Component):
+                child = self.resolver.resolve(obj.symbolReference, schematic.parent)
+                digest.update(obj.symbolReference.encode())
+                if child is not None:
+                    digest.update(child.read_bytes())
+        return digest.hexdigest()[:16]
+
+    def _xschem(self, schematic: Path, top_subckt: bool) -> str:
+        """Netlist one schematic into a scratch directory and return the text"""
+        Path(self.runner.BUILD_DIR).mkdir(parents=True, exist_ok=True)
+        with tempfile.TemporaryDirectory(prefix="cell_", dir=self.runner.BUILD_DIR) as scratch:
+            cmd = self.runner.netlist_command(schematic.resolve())
+            cmd[-1:-1] = ["-o", scratch] + (["--tcl", "set top_subckt 1"] if top_subckt else [])
+            result = self.runner.run_command(cmd, self.timeout, self.runner.BUILD_DIR)
+            output = Path(scratch) / f"{schematic.stem}.spice"
+            if not output.exists():
+                raise RuntimeError(f"xschem produced no netlist for {schematic}: {result.stderr.strip()}")
+            return output.read_text(encoding='utf-8', errors='replace')
+
+    def _cached(self, schematic: Path, kind: str) -> Tuple[Path, bool]:
+        path = self.cache / f"{schematic.stem}-{kind}-{self.cell_key(schematic)}.spice"
+        return path, path.exists()
+
+    def _build_subckt(self, schematic: Path, path: Path) -> None:
+        _, blocks = split_netlist(self._xschem(schematic, top_subckt=True))
+        block = blocks.get(schematic.stem.lower())
+        if block is None:
+            raise RuntimeError(f"No .subckt {schematic.stem} in the netlist of {schematic}")
+        self._write(path, block)
+
+    def _build_top(self, schematic: Path, path: Path) -> None:
+        body, _ = split_netlist(self._xschem(schematic, top_subckt=False))
+        self._write(path, "\n".join(body) + "\n")
+
+    def _write(self, path: Path, text: str) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        tmp.write_text(text, encoding='utf-8')
+        os.replace(tmp, path)
+
+    def _blocks(self, cells: Iterable[Path], top: Optional[Tuple[Path, Path]] = None) -> List[Path]:
+        """Cached .subckt paths of some cells, building the missing ones (and an uncached top level) in parallel"""
+        builds = [(self._build_top, *top)] if top and not top[1].exists() else []
+        parts = []
+        for schematic in cells:
+            path, cached = self._cached(schematic, "subckt")
+            parts.append(path)
+            if not cached:
+                builds.append((self._build_subckt, schematic, path))
+
+        if builds:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for future in [executor.submit(build, schematic, path) for build, schematic, path in builds]:
+                    future.result()
+        with self._lock:
+            self.built += len(builds)
+            self.reused += len(parts) + (top is not None) - len(builds)
+        return parts
+
+    def subckts(self, schematics: Iterable[Union[str, Path]]) -> List[str]:
+        """.subckt blocks of some cell schematics and of every subcircuit below them, each once"""
+        cells: Dict[Path, None] = {}
+        for schematic in schematics:
+            schematic = Path(schematic).resolve()
+            cells.setdefault(schematic, None)
+            cells.update(dict.fromkeys(self.cells(schematic)))
+        return [part.read_text(encoding='utf-8') for part in self._blocks(cells)]
+
+    def netlist(self, tb_file: Union[str, Path], output: Optional[Union[str, Path]] = None) -> Path:
+        """Write the deck of a testbench (default: where xschem would) and return its path"""
+        tb_file = Path(tb_file).resolve()
+        top, _ = self._cached(tb_file, "top")
+        parts = self._blocks(self.cells(tb_file), (tb_file, top))
+
+        deck = [top.read_text(encoding='utf-8')] + [part.read_text(encoding='utf-8') for part in parts]
+        output = Path(output) if output else self.runner.netlist_path(tb_file)
+        self._write(output, "".join(deck) + ".end\n")
+        return output
+
+
+class HierarchicalSimulationRunner(SimulationRunner):
+    """SimulationRunner that netlists through a HierarchicalNetlister"""
+
+    def __init__(self, netlister: Optional[HierarchicalNetlister] = None, **runner_options):
+        super().__init__(**runner_options)
+        self.netlister = netlister or HierarchicalNetlister(runner=self)
+
+    def netlist(self, tb_file: Union[str, Path], timeout: Optional[float] = 30) -> Path:
+        try:
+            return self.netlister.netlist(tb_file)
+        except RuntimeError:
+            # Fall back to a flat xschem run, e.g. for hierarchies xschem resolves differently
+            return super().netlist(tb_file, timeout)
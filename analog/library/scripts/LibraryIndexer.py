@@ -0,0 +1,211 @@
+import os
+import sys
+import json
+import hashlib
+import argparse
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Optional, Union, Any, Iterator, Tuple
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, CURRENT_DIR)
+from XSchemParser import XSchemParser
+from SimulationRunner import SimulationRunner
+from Grammar import *
+
+LIBRARY_ROOT = Path(CURRENT_DIR).parent
+EXTENSIONS = (".sch", ".sym")
+SKIP_DIRS = {"build", "__pycache__", "scripts", "benchmarks"}
+PIN_SYMBOLS = {"devices/ipin.sym": "in", "devices/opin.sym": "out", "devices/iopin.sym": "inout"}
+PIN_LAYER = 5
+# Only these are read by extract(); wires, lines and texts are skipped unparsed
+INDEXED_OBJECTS = (Component, Rectangle, GlobalProperties)
+
+
+def extract(objects: List[XSchemObject]) -> Dict[str, Any]:
+    """Components, referenced symbols, pins and global properties of a parsed file"""
+    components, pins = [], []
+    properties: Dict[str, str] = {}
+    for obj in objects:
+        if isinstance(obj, Component):
+            components.append({"name": obj.properties.get("name", ""), "symbol": obj.symbolReference,
+                               "properties": obj.properties})
+            # Schematic ports are ipin/opin/iopin instances labelled with the net
+            if obj.symbolReference in PIN_SYMBOLS:
+                pins.append({"name": obj.properties.get("lab", ""), "dir": PIN_SYMBOLS[obj.symbolReference]})
+        elif isinstance(obj, Rectangle) and obj.layer == PIN_LAYER and "name" in obj.properties:
+            # Symbol pins are layer-5 boxes with name= and dir=
+            pins.append({"name": obj.properties["name"], "dir": obj.properties.get("dir", "inout")})
+        elif isinstance(obj, GlobalProperties):
+            properties.update(obj.properties)
+    return {
+        "components": components,
+        "symbols": sorted({comp["symbol"] for comp in components}),
+        "pins": pins,
+        "properties": properties,
+    }
+
+
+def index_file(path: str, known_hash: Optional[str] = None) -> Tuple[str, str, Optional[Dict[str, Any]]]:
+    """Hash a file and parse it unless the hash is unchanged; runs in worker processes"""
+    data = Path(path).read_bytes()
+    digest = hashlib.sha1(data).hexdigest()
+    if digest == known_hash:
+        return path, digest, None
+    objects = XSchemParser().parse_content(data.decode('utf-8', errors='replace'), include=INDEXED_OBJECTS)
+    return path, digest, extract(objects)
+
+
+class LibraryIndex:
+    """Persistent index of every schematic and symbol in the library tree
+
+    Files are keyed by relative path with their mtime, size and content
+    hash. A refresh stats every file, rehashes only those whose mtime or size
+    changed and reparses only those whose hash changed, spreading the work
+    over a process pool when there is enough of it.
+    """
+
+    VERSION = 1
+
+    def __init__(self, root: Union[str, Path] = LIBRARY_ROOT, index_path: Optional[Union[str, Path]] = None,
+                 max_workers: Optional[int] = None, parallel_threshold: int = 32):
+        """
+        Args:
+            root: Library directory to scan
+            index_path: Index file (default: BUILD_DIR/library_index.json)
+            max_workers: Parser processes (default: CPU count)
+            parallel_threshold: Fewer files than this are parsed in-process
+        """
+        self.root = Path(root).resolve()
+        self.index_path = Path(index_path or Path(SimulationRunner.BUILD_DIR) / "library_index.json")
+        self.max_workers = max_workers
+        self.parallel_threshold = parallel_threshold
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.load()
+
+    def load(self) -> None:
+        if not self.index_path.exists():
+            return
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                payload = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return
+        if payload.get("version") == self.VERSION and payload.get("root") == str(self.root):
+            self.entries = payload["files"]
+
+    def save(self) -> None:
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.index_path.with_suffix(".tmp")
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({"version": self.VERSION, "root": str(self.root), "files": self.entries}, f)
+        os.replace(tmp, self.index_path)
+
+    def scan(self) -> Iterator[Path]:
+        """Schematic and symbol files under the root, skipping build output and tooling"""
+        for directory, subdirs, files in os.walk(self.root):
+            subdirs[:] = sorted(d for d in subdirs if d not in SKIP_DIRS and not d.startswith("."))
+            for name in sorted(files):
+                if name.endswith(EXTENSIONS):
+                    yield Path(directory) / name
+
+    def refresh(self) -> Dict[str, int]:
+        """Bring the index up to date and save it; returns file counts per outcome"""
+        stats = {"files": 0, "unchanged": 0, "rehashed": 0, "parsed": 0, "removed": 0}
+        seen, todo = set(), []
+        for path in self.scan():
+            key = path.relative_to(self.root).as_posix()
+            seen.add(key)
+            stat = path.stat()
+            entry = self.entries.get(key)
+            if entry is not None and entry["mtime"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+                stats["unchanged"] += 1
+                continue
+            todo.append((key, path, stat, entry["hash"] if entry else None))
+        stats["files"] = len(seen)
+
+        for key in set(self.entries) - seen:
+            del self.entries[key]
+            stats["removed"] += 1
+
+        paths = [str(path) for _, path, _, _ in todo]
+        hashes = [known for _, _, _, known in todo]
+        workers = self.max_workers or os.cpu_count() or 1
+        if len(todo) >= self.parallel_threshold and workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                outcomes = list(executor.map(index_file, paths, hashes, chunksize=max(1, len(todo) // (4 * workers))))
+        else:
+            outcomes = [index_file(path, known) for path, known in zip(paths, hashes)]
+
+        for (key, path, stat, _), (_, digest, content) in zip(todo, outcomes):
+            if content is None:
+                # Touched but identical: only the mtime moves
+                self.entries[key].update(mtime=stat.st_mtime_ns, size=stat.st_size)
+                stats["rehashed"] += 1
+                continue
+            self.entries[key] = {"kind": "symbol" if path.suffix == ".sym" else "schematic",
+                                 "mtime": stat.st_mtime_ns, "size": stat.st_size, "hash": digest, **content}
+            stats["parsed"] += 1
+
+        if todo or stats["removed"]:
+            self.save()
+        return stats
+
+    # Queries -----------------------------------------------------------
+
+    def files(self, kind: Optional[str] = None) -> List[str]:
+        return sorted(key for key, entry in self.entries.items() if kind is None or entry["kind"] == kind)
+
+    def entry(self, path: Union[str, Path]) -> Optional[Dict[str, Any]]:
+        path = Path(path)
+        key = (path.resolve().relative_to(self.root) if path.is_absolute() else path).as_posix()
+        return self.entries.get(key)
+
+    def users_of(self, symbol: str) -> List[str]:
+        """Files instantiating a symbol, matched on the reference or its trailing path"""
+        return sorted(key for key, entry in self.entries.items()
+                      if any(ref == symbol or ref.endswith("/" + symbol) for ref in entry["symbols"]))
+
+    def find_components(self, symbol: Optional[str] = None, name: Optional[str] = None,
+                        **properties: str) -> List[Tuple[str, Dict[str, Any]]]:
+        """(file, component) pairs matching a symbol substring, instance name and property values"""
+        matches = []
+        for key in sorted(self.entries):
+            for comp in self.entries[key]["components"]:
+                if symbol is not None and symbol not in comp["symbol"]:
+                    continue
+                if name is not None and comp["name"] != name:
+                    continue
+                if any(comp["properties"].get(prop) != value for prop, value in properties.items()):
+                    continue
+                matches.append((key, comp))
+        return matches
+
+    def pins(self, path: Union[str, Path]) -> List[Dict[str, str]]:
+        entry = self.entry(path)
+        return entry["pins"] if entry else []
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index the schematics and symbols of the analog library")
+    parser.add_argument("--root", type=Path, default=LIBRARY_ROOT, help="Library directory to scan")
+    parser.add_argument("--index", type=Path, default=None, help="Index file (default: build/schematic/library_index.json)")
+    parser.add_argument("--workers", type=int, default=None, help="Parser processes (default: CPU count)")
+    parser.add_argument("--users-of", default=None, help="List files that instantiate this symbol")
+    parser.add_argument("--symbol", default=None, help="List components whose symbol contains this text")
+    args = parser.parse_args()
+
+    index = LibraryIndex(args.root, args.index, args.workers)
+    stats = index.refresh()
+    print(", ".join(f"{count} {label}" for label, count in stats.items()))
+
+    if args.users_of:
+        for key in index.users_of(args.users_of):
+            print(key)
+    if args.symbol:
+        for key, comp in index.find_components(symbol=args.symbol):
+            print(f"{key}: {comp['name']} ({comp['symbol']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,357 @@
+import os
+import re
+import sys
+import argparse
+from pathlib import Path
+from dataclasses import dataclass, field
+from typing import List, Dict, Optional, Union, Tuple, Iterator, Iterable
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, CURRENT_DIR)
+from XSchemInterface import XSchemInterface
+from XSchemWriter import XSchemWriter
+from SimulationRunner import SimulationRunner
+from HierarchicalNetlister import HierarchicalNetlister, split_netlist
+from SymbolResolver import PARSE_CACHE
+from LibraryIndexer import extract
+from Connectivity import PIN_LAYER
+from Grammar import *
+
+LIBRARY_DIR = Path(CURRENT_DIR).parent
+REPO_ROOT = LIBRARY_DIR.parent.parent
+SCHEMATIC_DIR = REPO_ROOT / "analog" / "schematics"
+ROUTER_SOURCE = REPO_ROOT / "digital" / "DAC_MUX" / "src" / "Analog_MUX.sv"
+
+# Supply and bias nets shared by every cell; they become ports of the array
+GLOBAL_NETS = ("VDD", "VSS", "GND", "Vbias")
+HEADER = "xschem version=3.4.4 file_version=1.2"
+PIN_PITCH = 20
+MARGIN = 80
+PORT_SYMBOLS = {"in": "devices/ipin.sym", "out": "devices/opin.sym", "inout": "devices/iopin.sym"}
+LABEL_SYMBOL = "devices/lab_pin.sym"
+
+Pin = Tuple[str, str, float, float]   # name, dir, x, y in symbol coordinates
+
+# Behavioural weight: a conductance from IN to OUT of GMAX * CODE / (2^BITS - 1)
+WEIGHT_SUBCKT = """\
+.subckt MVMWeight IN OUT CODE=255 BITS=8 GMAX=10u
+G1 IN OUT IN OUT {GMAX*CODE/(pow(2,BITS)-1)}
+.ends MVMWeight"""
+
+
+def router_vector_size(source: Union[str, Path] = ROUTER_SOURCE, default: int = 4) -> int:
+    """VECTOR_SIZE default of the digital DAC_Router, so the array matches its routing"""
+    try:
+        match = re.search(r"parameter\s+VECTOR_SIZE\s*=\s*(\d+)", Path(source).read_text(encoding='utf-8'))
+    except OSError:
+        return default
+    return int(match.group(1)) if match else default
+
+
+def router_options(size: int) -> Tuple[int, int]:
+    """DAC_Router TOTAL_OPTIONS and ADDR_WIDTH for a VECTOR_SIZE"""
+    total = 2 * size + size * size
+    return total, max(1, (total - 1).bit_length())
+
+
+def box_symbol(pins: List[Tuple[str, str]]) -> List[XSchemObject]:
+    """Subcircuit symbol with inputs on the left and outputs/inouts on the right, in pin order"""
+    left = [pin for pin in pins if pin[1] == "in"]
+    right = [pin for pin in pins if pin[1] != "in"]
+    rows = max(len(left), len(right), 1)
+    top = -PIN_PITCH * ((rows + 1) // 2) - 10
+    bottom = top + PIN_PITCH * (rows + 1)
+    objects: List[XSchemObject] = [
+        Version(version="3.4.4", fileVersion="1.2", license=HEADER),
+        VHDL(),
+        GlobalProperties(properties={"type": "subcircuit", "format": "@name @pinlist @symname",
+                                     "template": "name=x1"}),
+        Verilog(), Spice(), TEDAx(),
+        Rectangle(layer=4, x1=-70, y1=top, x2=70, y2=bottom),
+        Text(text="@symname", x=-40, y=top - 30, hSize=0.3, vSize=0.3),
+        Text(text="@name", x=75, y=top - 20, hSize=0.2, vSize=0.2),
+    ]
+    # Keep declaration order: xschem's @pinlist, and so the .subckt port order, follows the B 5 boxes
+    placed = {-1: 0, 1: 0}
+    for name, direction in pins:
+        side = -1 if direction == "in" else 1
+        placed[side] += 1
+        x, y = 90 * side, top + PIN_PITCH * placed[side]
+        objects.append(Line(layer=4, x1=70 * side, y1=y, x2=x, y2=y))
+        objects.append(Rectangle(layer=PIN_LAYER, x1=x - 2.5, y1=y - 2.5, x2=x + 2.5, y2=y + 2.5,
+                                 properties={"name": name, "dir": direction}))
+        objects.append(Text(text=name, x=65 * side, y=y - 4, mirror=int(side > 0), hSize=0.2, vSize=0.2))
+    return objects
+
+
+@dataclass
+class Cell:
+    """One cell type of the array and how its pins join the array nets
+
+    nets maps pin names to net templates formatted with {row} and {col}.
+    Supply pins (GLOBAL_NETS) keep their name; any other pin becomes a
+    top-level port named after the instance, e.g. DAC3_D7.
+    """
+    name: str                                   # subcircuit name, also names a generated symbol
+    prefix: str                                 # instance name prefix
+    schematic: Optional[Path] = None            # where the pins come from when the symbol is generated
+    symbol: Optional[Path] = None               # existing symbol (default: <schematic>.sym, generated if missing)
+    pins: List[Tuple[str, str]] = field(default_factory=list)   # (name, dir) for cells whose schematic has none
+    nets: Dict[str, str] = field(default_factory=dict)
+    spice: Optional[str] = None                 # .subckt written with the array, for cells without a schematic
+
+    def source(self) -> Optional[Path]:
+        """Schematic the cell's .subckt is netlisted from, if there is one"""
+        path = self.schematic or (self.symbol.with_suffix(".sch") if self.symbol else None)
+        return path if path and path.is_file() else None
+
+
+def default_cells(bits: int = 8) -> Dict[str, Cell]:
+    """DAC per vector entry, programmable weight per matrix entry, TIA and ADC per output row"""
+    codes = [f"D{b}" for b in reversed(range(bits))]
+    return {
+        "dac": Cell("DAC", "DAC", SCHEMATIC_DIR / "DAC.sch",
+                    pins=[(code, "in") for code in codes] + [("Iout", "out")], nets={"Iout": "X{col}"}),
+        "weight": Cell("MVMWeight", "W", pins=[("IN", "in"), ("OUT", "out")],
+                       nets={"IN": "X{col}", "OUT": "ROW{row}"}, spice=WEIGHT_SUBCKT),
+        "tia": Cell("TIA", "TIA", symbol=LIBRARY_DIR / "TIAs" / "template" / "TIA.sym",
+                    nets={"Iin": "ROW{row}", "Vout": "Y{row}"}),
+        "adc": Cell("FlashADC", "ADC", LIBRARY_DIR / "FlashADC" / "template" / "FlashADC.sch",
+                    pins=[("Vin", "in")] + [(code, "out") for code in codes] + [("VDD", "inout"), ("VSS", "inout")],
+                    nets={"Vin": "Y{row}"}),
+    }
+
+
+class MVMArrayGenerator:
+    """Generates the VECTOR_SIZE x VECTOR_SIZE analog matrix-vector multiplier
+
+    Column j is driven by a vector DAC onto net X<j>; weight (i, j) joins X<j>
+    to the current-summing row net ROW<i>, which a TIA converts to Y<i> for
+    that row's ADC. Each cell type is one subcircuit instantiated N, N^2 or N
+    times, connected by net labels on its pins, so the schematic and the
+    netlist are written in one pass whatever N is. Routed instances carry the
+    DAC_Router address they are enabled by as addr= (vector DACs first, then
+    the weights row by row, then the ADCs).
+    """
+
+    def __init__(self, size: Optional[int] = None, cells: Optional[Dict[str, Cell]] = None,
+                 output_dir: Union[str, Path] = SCHEMATIC_DIR, name: str = "mv_mul"):
+        """
+        Args:
+            size: VECTOR_SIZE (default: the DAC_Router parameter in digital/DAC_MUX)
+            cells: dac/weight/tia/adc cells (default: default_cells())
+            output_dir: Where the array schematic, its symbol and the top level go
+            name: Array schematic and subcircuit name
+        """
+        self.size = size or router_vector_size()
+        self.cells = cells or default_cells()
+        self.output_dir = Path(output_dir)
+        self.name = name
+        self._symbols: Dict[str, Tuple[Path, List[Pin]]] = {}
+        self._ports: Dict[str, str] = {}
+
+    # Cells -------------------------------------------------------------
+
+    def symbol(self, role: str) -> Tuple[Path, List[Pin]]:
+        """Symbol path and pins of a cell, writing a box symbol first if the cell has none"""
+        if role not in self._symbols:
+            cell = self.cells[role]
+            path = Path(cell.symbol or (cell.schematic.with_suffix(".sym") if cell.schematic
+                                        else self.output_dir / f"{cell.name}.sym"))
+            if not path.is_file():
+                pins = [(pin["name"], pin["dir"]) for pin in extract(PARSE_CACHE.objects(cell.schematic))["pins"]] \
+                    if cell.schematic and cell.schematic.is_file() else []
+                self._write(path, box_symbol(pins or cell.pins))
+            self._symbols[role] = (path.resolve(), self.symbol_pins(path))
+        return self._symbols[role]
+
+    @staticmethod
+    def symbol_pins(symbol: Path) -> List[Pin]:
+        """Pins of a symbol in declaration order, at the centre of their layer-5 boxes"""
+        return [(obj.properties["name"], obj.properties.get("dir", "inout"), (obj.x1 + obj.x2) / 2, (obj.y1 + obj.y2) / 2)
+                for obj in PARSE_CACHE.objects(symbol)
+                if isinstance(obj, Rectangle) and obj.layer == PIN_LAYER and "name" in obj.properties]
+
+    def _extent(self, role: str) -> Tuple[float, float]:
+        _, pins = self.symbol(role)
+        xs = [pin[2] for pin in pins] or [0]
+        ys = [pin[3] for pin in pins] or [0]
+        return max(xs) - min(xs), max(ys) - min(ys)
+
+    def _reference(self, path: Path) -> str:
+        return os.path.relpath(path, self.output_dir.resolve())
+
+    # Array -------------------------------------------------------------
+
+    def instances(self) -> Iterator[Tuple[str, str, int, int, float, float, Optional[int]]]:
+        """(role, instance name, row, col, x, y, router address) for every cell of the array"""
+        n = self.size
+        width = max(self._extent("dac")[0], self._extent("weight")[0])
+        dx = PIN_PITCH * -(-(width + MARGIN) // PIN_PITCH)
+        dy = PIN_PITCH * -(-(max(self._extent(role)[1] for role in ("weight", "tia", "adc")) + MARGIN) // PIN_PITCH)
+        tia_x = n * dx + self._extent("tia")[0] / 2 + MARGIN
+        adc_x = tia_x + (self._extent("tia")[0] + self._extent("adc")[0]) / 2 + 2 * MARGIN
+        prefix = {role: cell.prefix for role, cell in self.cells.items()}
+
+        for col in range(n):
+            yield "dac", f"X{prefix['dac']}{col}", -1, col, col * dx, 0, col
+        for row in range(n):
+            y = (row + 1) * dy
+            for col in range(n):
+                yield "weight", f"X{prefix['weight']}{row}_{col}", row, col, col * dx, y, n + row * n + col
+            yield "tia", f"X{prefix['tia']}{row}", row, -1, tia_x, y, None
+            yield "adc", f"X{prefix['adc']}{row}", row, -1, adc_x, y, n + n * n + row
+
+    def connections(self, role: str, instance: str, row: int, col: int) -> List[Tuple[str, str, str]]:
+        """(pin, dir, net) of one instance in symbol pin order, registering the ports it creates"""
+        nets = self.cells[role].nets
+        connections = []
+        for pin, direction, _, _ in self.symbol(role)[1]:
+            if pin in nets:
+                net = nets[pin].format(row=row, col=col)
+            elif pin in GLOBAL_NETS:
+                net = pin
+                self._ports.setdefault(net, "inout")
+            else:
+                net = f"{instance[1:]}_{pin}"
+                self._ports.setdefault(net, direction)
+            connections.append((pin, direction, net))
+        return connections
+
+    def ports(self) -> List[Tuple[str, str]]:
+        """(net, dir) of the array's ports: per-instance codes in instance order, then supplies"""
+        if not self._ports:
+            for role, instance, row, col, *_ in self.instances():
+                self.connections(role, instance, row, col)
+        return sorted(self._ports.items(), key=lambda port: port[0] in GLOBAL_NETS)
+
+    def schematic(self) -> XSchemInterface:
+        """The array as a schematic: cell instances with a net label on every pin and a port column"""
+        schematic = XSchemInterface([Version(version="3.4.4", fileVersion="1.2",
+                                             license=HEADER),
+                                     VHDL(), GlobalProperties(), Verilog(), Spice(), TEDAx()])
+        references = {role: self._reference(self.symbol(role)[0]) for role in self.cells}
+        self._ports.clear()
+        for role, instance, row, col, x, y, address in self.instances():
+            properties = {} if address is None else {"addr": str(address)}
+            schematic.add_component(instance, references[role], x, y, properties)
+            pins = self.symbol(role)[1]
+            for (_, _, px, py), (pin, _, net) in zip(pins, self.connections(role, instance, row, col)):
+                schematic.add_component(f"l_{instance}_{pin}", LABEL_SYMBOL, x + px, y + py, {"lab": net})
+
+        # Ports stand apart and join their nets by label
+        for k, (net, direction) in enumerate(self.ports()):
+            schematic.add_component(f"p{k + 1}", PORT_SYMBOLS[direction], -2 * MARGIN - 4 * PIN_PITCH,
+                                    k * PIN_PITCH, {"lab": net})
+        return schematic
+
+    def netlist_lines(self) -> Iterator[str]:
+        """The array as a .subckt in SPICE, one line per instance"""
+        total, width = router_options(self.size)
+        lines = []
+        for role, instance, row, col, *_ in self.instances():
+            nets = " ".join(net for _, _, net in self.connections(role, instance, row, col))
+            lines.append(f"{instance} {nets} {self.cells[role].name}")
+        yield f"** {self.name}: {self.size}x{self.size} array, DAC_Router TOTAL_OPTIONS={total} ADDR_WIDTH={width}"
+        yield f".subckt {self.name} {' '.join(net for net, _ in self.ports())}"
+        yield from lines
+        yield f".ends {self.name}"
+
+    # Output ------------------------------------------------------------
+
+    def _write(self, path: Path, objects: List[XSchemObject]) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(XSchemWriter.write_content(objects), encoding='utf-8')
+        os.replace(tmp, path)
+
+    def write_schematic(self) -> Path:
+        path = self.output_dir / f"{self.name}.sch"
+        self._write(path, self.schematic().components)
+        return path
+
+    def write_symbol(self) -> Path:
+        path = self.output_dir / f"{self.name}.sym"
+        self._write(path, box_symbol(self.ports()))
+        return path
+
+    def write_top(self, top: str = "Top") -> Path:
+        """Top level: one array instance with each of its pins brought out as a port"""
+        symbol = self.output_dir / f"{self.name}.sym"
+        objects = [Version(version="3.4.4", fileVersion="1.2", license=HEADER),
+                   VHDL(), GlobalProperties(), Verilog(), Spice(), TEDAx(),
+                   Component(symbolReference=symbol.name, properties={"name": "x1"})]
+        for k, (net, direction, x, y) in enumerate(self.symbol_pins(symbol)):
+            objects.append(Component(symbolReference=PORT_SYMBOLS[direction], x=x, y=y,
+                                     properties={"name": f"p{k + 1}", "lab": net}))
+        path = self.output_dir / f"{top}.sch"
+        self._write(path, objects)
+        return path
+
+    def write_netlist(self, path: Optional[Union[str, Path]] = None,
+                      include: Iterable[Union[str, Path]] = (),
+                      netlister: Optional[HierarchicalNetlister] = None) -> Path:
+        """Write a self-contained deck of the array .subckt and its cells (default: BUILD_DIR/<name>.spice)
+
+        Cells with a behavioural `spice` block (the weight by default) are
+        written as is. Cells defined in an include deck are left to it; the
+        rest are netlisted from their schematics through HierarchicalNetlister,
+        which caches each block once. A cell with no definition anywhere is a
+        ValueError rather than an undefined subcircuit in the deck.
+        """
+        include = [Path(deck).resolve() for deck in include]
+        covered = set()
+        for deck in include:
+            covered.update(split_netlist(deck.read_text(encoding='utf-8', errors='replace'))[1])
+        cells = [cell for cell in self.cells.values() if not cell.spice and cell.name.lower() not in covered]
+        undefined = [cell.name for cell in cells if not cell.source()]
+        if undefined:
+            raise ValueError(f"No .subckt for {', '.join(undefined)}: give the cell a schematic or a spice "
+                             f"block, or pass a deck defining it in include")
+
+        blocks = [cell.spice for cell in self.cells.values() if cell.spice]
+        if cells:
+            blocks.extend((netlister or HierarchicalNetlister()).subckts(cell.source() for cell in cells))
+        defined = covered | set(split_netlist("\n".join(blocks))[1])
+        missing = [cell.name for cell in self.cells.values() if cell.name.lower() not in defined]
+        if missing:
+            raise ValueError(f"Netlisting the cells did not define {', '.join(missing)}")
+
+        path = Path(path or Path(SimulationRunner.BUILD_DIR) / f"{self.name}.spice")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        lines = [f".include {deck}" for deck in include]
+        lines.extend(block.rstrip("\n") for block in blocks)
+        lines.extend(self.netlist_lines())
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text("\n".join(lines) + "\n", encoding='utf-8')
+        os.replace(tmp, path)
+        return path
+
+    def generate(self, top: bool = True, netlist: bool = True) -> Dict[str, Path]:
+        """Write the array schematic and symbol, and optionally the top level and the netlist"""
+        written = {"schematic": self.write_schematic(), "symbol": self.write_symbol()}
+        if top:
+            written["top"] = self.write_top()
+        if netlist:
+            written["netlist"] = self.write_netlist()
+        return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the analog matrix-vector multiplier array")
+    parser.add_argument("--size", type=int, default=None, help="VECTOR_SIZE (default: the DAC_Router parameter)")
+    parser.add_argument("--output", type=Path, default=SCHEMATIC_DIR, help="Output directory (default: analog/schematics)")
+    parser.add_argument("--name", default="mv_mul", help="Array schematic and subcircuit name")
+    parser.add_argument("--no-top", action="store_true", help="Do not write Top.sch")
+    parser.add_argument("--no-netlist", action="store_true", help="Do not write the SPICE netlist")
+    args = parser.parse_args()
+
+    generator = MVMArrayGenerator(args.size, output_dir=args.output, name=args.name)
+    total, width = router_options(generator.size)
+    print(f"VECTOR_SIZE={generator.size}: DAC_Router TOTAL_OPTIONS={total}, ADDR_WIDTH={width}")
+    for kind, path in generator.generate(top=not args.no_top, netlist=not args.no_netlist).items():
+        print(f"{kind}: {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+import os
+import sys
+import json
+import argparse
+from pathlib import Path
+from dataclasses import dataclass, replace
+from typing import Dict, Optional, Tuple, Mapping, Any
+
+import numpy as np
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, CURRENT_DIR)
+from MVMArrayGenerator import router_vector_size
+
+# Metric names of each block's characterization and the ChainSpec field they set
+METRIC_FIELDS = {
+    "tia": {"DC_GAIN": "dc_gain_db", "UNITY_FREQ": "gbw", "INPUT_OFFSET": "offset",
+            "VOLTAGE_NOISE_1KHZ": "noise_density"},
+    "dac": {"GAIN_ERROR": "dac_gain_error", "OFFSET": "dac_offset", "INL": "dac_inl", "MISMATCH": "dac_mismatch"},
+    "adc": {"INL": "adc_inl", "THRESHOLD_SIGMA": "adc_threshold_sigma"},
+}
+
+# |error| histogram for percentiles, in ADC LSB
+HIST_STEP = 1 / 16
+HIST_BINS = 4096
+
+
+@dataclass(frozen=True)
+class ChainSpec:
+    """Behavioural parameters of the DAC -> weights -> TIA -> ADC chain
+
+    Ratios and LSB figures are dimensionless; the op amp figures are in SI
+    units as the OpAmp testbenches report them. Defaults describe an ideal
+    chain apart from quantization.
+    """
+    dac_bits: int = 8
+    dac_gain_error: float = 0.0         # relative
+    dac_offset: float = 0.0             # fraction of full scale
+    dac_inl: float = 0.0                # peak INL in LSB (bow-shaped)
+    dac_mismatch: float = 0.0           # relative sigma of gain between DACs
+    weight_bits: int = 8
+    weight_mismatch: float = 0.0        # relative sigma of each programmed conductance
+    dc_gain_db: float = np.inf          # TIA op amp open-loop gain
+    gbw: float = np.inf                 # Hz
+    slew_rate: float = np.inf           # V/s
+    offset: float = 0.0                 # input-referred, V
+    noise_density: float = 0.0          # input-referred, V/sqrt(Hz)
+    feedback_factor: float = 0.5        # TIA loop beta, sets noise gain and closed-loop bandwidth
+    adc_bits: int = 8
+    adc_inl: float = 0.0                # peak INL in LSB (bow-shaped)
+    adc_threshold_sigma: float = 0.0    # comparator offset sigma in LSB
+    full_scale: float = 1.8             # V, DAC output and ADC input range
+    sample_time: float = 100e-9         # s per matrix-vector product
+
+    @classmethod
+    def from_metrics(cls, tia: Optional[Mapping[str, float]] = None, dac: Optional[Mapping[str, float]] = None,
+                     adc: Optional[Mapping[str, float]] = None, **overrides: Any) -> 'ChainSpec':
+        """Spec from extracted metrics of each block (see METRIC_FIELDS), then explicit overrides"""
+        values: Dict[str, Any] = {}
+        for role, metrics in (("tia", tia), ("dac", dac), ("adc", adc)):
+            for metric, name in METRIC_FIELDS[role].items():
+                if metrics and metric in metrics:
+                    values[name] = float(metrics[metric])
+        if tia:
+            slew = [abs(float(tia[key])) for key in ("SLEW_RATE_POS", "SLEW_RATE_NEG") if key in tia]
+            if slew:
+                values["slew_rate"] = min(slew)
+            # The testbench's GBW is the open-loop -3 dB frequency; times the DC gain it bounds the unity crossing
+            if "gbw" not in values and "GBW" in tia and "DC_GAIN" in tia:
+                values["gbw"] = float(tia["GBW"]) * 10 ** (float(tia["DC_GAIN"]) / 20)
+        values.update(overrides)
+        return cls(**values)
+
+
+def merge_metrics(results: Mapping[str, Any]) -> Dict[str, float]:
+    """Metrics of every successful test of one variant, as build_and_simulate_variants returns them"""
+    metrics: Dict[str, float] = {}
+    for result in results.values():
+        if isinstance(result, (int, float)):
+            # Already a flat metrics dict
+            return {key: float(value) for key, value in results.items() if isinstance(value, (int, float))}
+        if getattr(result, "ok", True):
+            values = getattr(result, "metrics", result)
+            metrics.update({key: float(value) for key, value in values.items() if isinstance(value, (int, float))})
+    return metrics
+
+
+class ErrorStats:
+    """Streaming statistics of output errors, accumulated batch by batch"""
+
+    def __init__(self, lsb: float):
+        self.lsb = lsb
+        self.count = 0
+        self.total = 0.0
+        self.squares = 0.0
+        self.max_abs = 0.0
+        self.histogram = np.zeros(HIST_BINS + 1, dtype=np.int64)
+
+    def add(self, errors: np.ndarray) -> None:
+        errors = errors.ravel()
+        self.count += errors.size
+        self.total += float(errors.sum())
+        self.squares += float(np.dot(errors, errors))
+        magnitude = np.abs(errors) / self.lsb
+        self.max_abs = max(self.max_abs, float(magnitude.max(initial=0.0)))
+        bins = np.minimum((magnitude / HIST_STEP).astype(np.int64), HIST_BINS)
+        self.histogram += np.bincount(bins, minlength=HIST_BINS + 1)
+
+    def percentile(self, q: float) -> float:
+        """|error| in LSB below which a fraction q of the outputs fall (1/16 LSB resolution)"""
+        cumulative = np.cumsum(self.histogram)
+        index = int(np.searchsorted(cumulative, q * self.count))
+        return (index + 1) * HIST_STEP if index < HIST_BINS else self.max_abs
+
+    def summary(self) -> Dict[str, float]:
+        mean = self.total / self.count
+        rms = float(np.sqrt(self.squares / self.count))
+        return {
+            "outputs": self.count,
+            "mean_lsb": mean / self.lsb,
+            "rms_lsb": rms / self.lsb,
+            "max_lsb": self.max_abs,
+            "p50_lsb": self.percentile(0.5),
+            "p99_lsb": self.percentile(0.99),
+            "within_half_lsb": float(self.histogram[:int(0.5 / HIST_STEP)].sum()) / self.count,
+            "rms_error": rms,
+            # Bits a uniform quantizer would need for the same RMS error over the unit output range
+            "effective_bits": float(np.log2(1 / (rms * np.sqrt(12)))) if rms > 0 else np.inf,
+        }
+
+
+class MVMSystemModel:
+    """Batched behavioural model of the analog matrix-vector multiplier
+
+    Vectors and matrices are in [0, 1]: vector entries are DAC codes over
+    full scale and weights are conductances over their maximum. Row i of the
+    ideal output is sum_j W[i, j] * x[j] / N, which the TIA maps onto the ADC
+    range. Every stage works on whole (batch, N) arrays: DAC quantization,
+    INL and gain/offset, weight quantization and mismatch, the TIA's finite
+    gain, offset, noise, bandwidth and slew (settling from the previous
+    product in the batch), and a flash ADC with per-comparator thresholds.
+    Static mismatch is drawn once per model, like one die. ADC_DEMUX only
+    reorders the digital codes, so outputs are returned in row order.
+    """
+
+    def __init__(self, size: Optional[int] = None, spec: Optional[ChainSpec] = None, seed: Optional[int] = 0):
+        """
+        Args:
+            size: VECTOR_SIZE (default: the DAC_Router parameter)
+            spec: Behavioural parameters (default: ideal apart from quantization)
+            seed: Seed for mismatch, noise and random inputs
+        """
+        self.size = size or router_vector_size()
+        self.spec = spec or ChainSpec()
+        self.rng = np.random.default_rng(seed)
+        self.draw_mismatch()
+
+    @classmethod
+    def from_results(cls, tia: Optional[Mapping[str, Any]] = None, dac: Optional[Mapping[str, Any]] = None,
+                     adc: Optional[Mapping[str, Any]] = None, size: Optional[int] = None,
+                     seed: Optional[int] = 0, **overrides: Any) -> 'MVMSystemModel':
+        """Model from one variant's results per block, e.g. results["Balanced"] of build_and_simulate_variants"""
+        spec = ChainSpec.from_metrics(*(merge_metrics(r) if r else None for r in (tia, dac, adc)), **overrides)
+        return cls(size, spec, seed)
+
+    def with_spec(self, **changes: Any) -> 'MVMSystemModel':
+        """Copy with some parameters changed, e.g. with_spec(adc_bits=10)"""
+        return MVMSystemModel(self.size, replace(self.spec, **changes), int(self.rng.integers(2 ** 31)))
+
+    def draw_mismatch(self) -> None:
+        """Draw the static per-instance errors of a new die"""
+        n, spec = self.size, self.spec
+        self.dac_gain = 1 + spec.dac_gain_error + spec.dac_mismatch * self.rng.standard_normal(n)
+        self.weight_gain = 1 + spec.weight_mismatch * self.rng.standard_normal((n, n))
+        levels = 2 ** spec.adc_bits - 1
+        ideal = np.arange(1, levels + 1) - 0.5
+        sigma = spec.adc_threshold_sigma * self.rng.standard_normal((n, levels))
+        thresholds = (ideal + bow(ideal / levels, spec.adc_inl) + sigma) / levels
+        # A comparator that trips out of order leaves a bubble a thermometer decoder ignores
+        self.adc_thresholds = np.sort(thresholds, axis=1)
+        self._previous = np.zeros(n)
+
+    # Stages ------------------------------------------------------------
+
+    def dac(self, vectors: np.ndarray) -> np.ndarray:
+        spec = self.spec
+        levels = 2 ** spec.dac_bits - 1
+        codes = np.rint(np.clip(vectors, 0, 1) * levels)
+        return ((codes + bow(codes / levels, spec.dac_inl)) / levels * self.dac_gain + spec.dac_offset)
+
+    def mac(self, matrices: np.ndarray, voltages: np.ndarray) -> np.ndarray:
+        levels = 2 ** self.spec.weight_bits - 1
+        weights = np.rint(np.clip(matrices, 0, 1) * levels) / levels * self.weight_gain
+        return np.matmul(weights, voltages[..., None])[..., 0] / self.size
+
+    def tia(self, currents: np.ndarray) -> np.ndarray:
+        spec = self.spec
+        beta = spec.feedback_factor
+        loop_gain = 10 ** (spec.dc_gain_db / 20) * beta
+        out = currents / (1 + 1 / loop_gain) + spec.offset / beta / spec.full_scale
+
+        # Settle from the previous product's output for one sample period
+        bandwidth = spec.gbw * beta
+        previous = np.vstack([self._previous, out[:-1]])
+        step = (out - previous) * -np.expm1(-2 * np.pi * bandwidth * spec.sample_time)
+        limit = spec.slew_rate * spec.sample_time / spec.full_scale
+        out = previous + np.clip(step, -limit, limit)
+        self._previous = out[-1].copy()
+
+        if spec.noise_density > 0 and np.isfinite(bandwidth):
+            rms = spec.noise_density * np.sqrt(np.pi / 2 * bandwidth) / beta / spec.full_scale
+            out = out + rms * self.rng.standard_normal(out.shape)
+        return out
+
+    def adc(self, voltages: np.ndarray) -> np.ndarray:
+        codes = np.empty(voltages.shape, dtype=np.int64)
+        for row in range(self.size):
+            codes[:, row] = np.searchsorted(self.adc_thresholds[row], voltages[:, row])
+        return codes
+
+    # Batches -----------------------------------------------------------
+
+    def run(self, matrices: np.ndarray, vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """ADC codes and the outputs they decode to for (batch, N, N) matrices and (batch, N) vectors"""
+        codes = self.adc(self.tia(self.mac(matrices, self.dac(vectors))))
+        return codes, codes / (2 ** self.spec.adc_bits - 1)
+
+    def errors(self, matrices: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+        """Decoded output minus the exact product, as a fraction of the output range"""
+        ideal = np.matmul(matrices, vectors[..., None])[..., 0] / self.size
+        return self.run(matrices, vectors)[1] - ideal
+
+    def random_batch(self, batch: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Uniformly random matrices and vectors"""
+        return self.rng.random((batch, self.size, self.size)), self.rng.random((batch, self.size))
+
+    def simulate(self, pairs: int, batch: int = 65536) -> Dict[str, float]:
+        """Error statistics over random matrix/vector pairs, streamed in batches"""
+        stats = ErrorStats(1 / (2 ** self.spec.adc_bits - 1))
+        done = 0
+        while done < pairs:
+            count = min(batch, pairs - done)
+            stats.add(self.errors(*self.random_batch(count)))
+            done += count
+        return stats.summary()
+
+
+def bow(position: np.ndarray, peak: float) -> np.ndarray:
+    """Bow-shaped INL in LSB: zero at both ends of the range, peak in the middle"""
+    return peak * 4 * position * (1 - position)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Error statistics of the analog MVM signal chain")
+    parser.add_argument("--size", type=int, default=None, help="VECTOR_SIZE (default: the DAC_Router parameter)")
+    parser.add_argument("--pairs", type=int, default=1_000_000, help="Random matrix/vector pairs")
+    parser.add_argument("--adc-bits", type=int, nargs="+", default=[8], help="ADC resolutions to compare")
+    parser.add_argument("--dac-bits", type=int, default=8)
+    parser.add_argument("--tia-metrics", type=Path, default=None, help="JSON metrics of the TIA op amp")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    tia = json.loads(args.tia_metrics.read_text()) if args.tia_metrics else None
+    for bits in args.adc_bits:
+        spec = ChainSpec.from_metrics(tia, adc_bits=bits, dac_bits=args.dac_bits)
+        stats = MVMSystemModel(args.size, spec, args.seed).simulate(args.pairs)
+        print(f"ADC {bits} bits: " + ", ".join(f"{key}={value:.4g}" for key, value in stats.items()))
+
+
+if __name__ == "__main__":
+    main()
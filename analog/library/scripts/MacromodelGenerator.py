@@ -0,0 +1,302 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+from pathlib import Path
+from dataclasses import dataclass, asdict, field
+from typing import List, Dict, Optional, Union, Tuple, Mapping, Any
+
+import numpy as np
+from scipy.optimize import least_squares
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, CURRENT_DIR)
+from SimulationRunner import SimulationRunner
+from SimulationResult import SimulationResult
+from HierarchicalNetlister import split_netlist, SUBCKT_PATTERN
+from MVMArrayGenerator import MVMArrayGenerator, LIBRARY_DIR
+from MVMSystemModel import merge_metrics
+
+OPAMP_SYMBOL = LIBRARY_DIR / "OpAmps" / "template" / "OpAmp.sym"
+SUPPLY_PINS = ("VDD", "VSS")
+INPUT_PINS = ("Vplus", "Vminus")
+OUTPUT_PIN = "Vout"
+
+# Internal node scaling of the rendered subcircuit
+STAGE_CAP = 1e-12
+STAGE_RES = 1e3
+MODEL_VERSION = 1
+
+
+@dataclass
+class OpAmpMacromodel:
+    """Behavioural op amp: gm stage with slew-limited current into a dominant pole, optional
+    second pole, clamped output swing and the measured input offset, bias and capacitance"""
+    dc_gain: float                          # V/V
+    poles: List[float]                      # Hz, dominant first
+    slew_pos: float = np.inf                # V/s
+    slew_neg: float = np.inf                # V/s
+    offset: float = 0.0                     # V, in series with Vplus
+    bias_current: float = 0.0               # A into each input
+    input_cap: float = 0.0                  # F, differential
+    supply_current: float = 0.0             # A from VDD to VSS
+    headroom: Tuple[float, float] = (0.1, 0.1)   # V the output stays from VSS and VDD
+    output_resistance: float = 100.0        # ohm
+    source: Dict[str, Any] = field(default_factory=dict)
+
+    @classmethod
+    def from_metrics(cls, metrics: Mapping[str, float], ac: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+                     supply: float = 1.8, **overrides: Any) -> 'OpAmpMacromodel':
+        """Macromodel from OpAmp testbench metrics, with poles fitted to an AC response when one is given
+
+        The dc_characteristics test reports GBW as the open-loop -3 dB
+        frequency, i.e. the dominant pole, and UNITY_FREQ as the 0 dB
+        crossing; a crossing below DC_GAIN x GBW places a second pole.
+
+        Args:
+            metrics: Metrics of one variant (DC_GAIN, GBW, UNITY_FREQ, SLEW_RATE_*, INPUT_*, CURRENT,
+                and optionally VOUT_MIN/VOUT_MAX for the swing)
+            ac: (frequency, open-loop response) from the dc_characteristics waveform, complex or
+                magnitude; fitted instead of using the gain and pole metrics
+            supply: VDD - VSS the swing metrics are measured against
+        """
+        if ac is not None:
+            dc_gain, poles = fit_poles(*ac)
+        else:
+            dc_gain = 10 ** (metrics.get("DC_GAIN", 100.0) / 20)
+            poles = [metrics.get("GBW", 1e9 / dc_gain)]
+            unity = metrics.get("UNITY_FREQ", 0.0)
+            second = second_pole(dc_gain, poles[0], unity) if unity else None
+            if second and second > poles[0]:
+                poles.append(float(second))
+        values = {
+            "dc_gain": dc_gain,
+            "poles": poles,
+            "slew_pos": abs(metrics.get("SLEW_RATE_POS", np.inf)),
+            "slew_neg": abs(metrics.get("SLEW_RATE_NEG", np.inf)),
+            "offset": metrics.get("INPUT_OFFSET", 0.0),
+            "bias_current": metrics.get("INPUT_BIAS_CURRENT", 0.0),
+            "input_cap": metrics.get("INPUT_CAP", 0.0),
+            "supply_current": metrics.get("CURRENT", 0.0),
+            "headroom": (metrics.get("VOUT_MIN", 0.1), supply - metrics.get("VOUT_MAX", supply - 0.1)),
+            "source": dict(metrics),
+        }
+        values.update(overrides)
+        return cls(**values)
+
+    def key(self) -> str:
+        payload = {name: value for name, value in asdict(self).items() if name != "source"}
+        return hashlib.sha1(json.dumps([MODEL_VERSION, payload], default=float).encode()).hexdigest()[:12]
+
+    def render(self, name: str, ports: List[str]) -> str:
+        """The macromodel as a .subckt with the given port order (the symbol's pin names)"""
+        missing = [pin for pin in INPUT_PINS + SUPPLY_PINS + (OUTPUT_PIN,) if pin not in ports]
+        if missing:
+            raise ValueError(f"Ports {ports} lack {missing}")
+
+        # Dominant pole: gm into R1 || C1 sets the gain and pole; the current limit sets the slew rate
+        r1 = 1 / (2 * np.pi * self.poles[0] * STAGE_CAP)
+        gm = self.dc_gain / r1
+        limit_pos = _number(self.slew_pos * STAGE_CAP)
+        limit_neg = _number(self.slew_neg * STAGE_CAP)
+        stage = "n1"
+        lines = [
+            f"** {name}: behavioural macromodel {self.key()}",
+            f".subckt {name} {' '.join(ports)}",
+            f"Vos Vplus inp DC {self.offset:.6g}",
+            f"Cin inp Vminus {self.input_cap:.6g}",
+            f"Ibp inp VSS DC {self.bias_current:.6g}",
+            f"Ibn Vminus VSS DC {self.bias_current:.6g}",
+            f"Bgm 0 n1 I = max(min({gm:.6g} * V(inp, Vminus), {limit_pos}), -{limit_neg})",
+            f"R1 n1 0 {r1:.6g}",
+            f"C1 n1 0 {STAGE_CAP:g}",
+        ]
+        for k, pole in enumerate(self.poles[1:], start=2):
+            # Unity-gain buffered RC section per extra pole
+            lines += [f"G{k} 0 n{k} n{k - 1} 0 {1 / STAGE_RES:g}",
+                      f"R{k} n{k} 0 {STAGE_RES:g}",
+                      f"C{k} n{k} 0 {1 / (2 * np.pi * pole * STAGE_RES):.6g}"]
+            stage = f"n{k}"
+        low, high = self.headroom
+        lines += [
+            f"Bout nout 0 V = max(min(V({stage}) + (V(VDD) + V(VSS)) / 2, V(VDD) - {high:.6g}), V(VSS) + {low:.6g})",
+            f"Rout nout {OUTPUT_PIN} {self.output_resistance:.6g}",
+            f"Isup VDD VSS DC {self.supply_current:.6g}",
+        ]
+        # Keep pins the model does not use (e.g. Vbias) from floating
+        lines += [f"Rnc_{pin} {pin} VSS 1G" for pin in ports if pin not in INPUT_PINS + SUPPLY_PINS + (OUTPUT_PIN,)]
+        lines.append(f".ends {name}")
+        return "\n".join(lines) + "\n"
+
+
+def _number(value: float) -> str:
+    # B-source expressions need a finite number; an unlimited slew rate is just a very large current
+    return f"{value:.6g}" if np.isfinite(value) else "1e3"
+
+
+def second_pole(dc_gain: float, dominant: float, unity: float) -> Optional[float]:
+    """Second pole that puts the 0 dB crossing of a two-pole response at `unity`, if one is needed"""
+    remaining = dc_gain ** 2 / (1 + (unity / dominant) ** 2)
+    if remaining <= 1 + 1e-9:
+        return None
+    return unity / np.sqrt(remaining - 1)
+
+
+def fit_poles(frequency: np.ndarray, response: np.ndarray, max_poles: int = 2) -> Tuple[float, List[float]]:
+    """DC gain and poles (Hz) of an all-pole response fitted to a measured open-loop AC sweep"""
+    frequency = np.asarray(frequency, dtype=float)
+    magnitude = np.abs(np.asarray(response))
+    log_mag = np.log10(np.maximum(magnitude, 1e-30))
+
+    def model(params: np.ndarray, count: int) -> np.ndarray:
+        gain, poles = params[0], 10 ** params[1:1 + count]
+        return gain - 0.5 * np.sum(np.log10(1 + (frequency[:, None] / poles) ** 2), axis=1)
+
+    best = None
+    for count in range(1, max_poles + 1):
+        start = np.concatenate([[log_mag[0]], np.log10(np.geomspace(frequency[-1] / 1e3, frequency[-1], count))])
+        fit = least_squares(lambda p: model(p, count) - log_mag, start)
+        # A further pole has to earn its place by clearly improving the fit
+        if best is None or fit.cost < 0.25 * best.cost:
+            best = fit
+    count = len(best.x) - 1
+    return float(10 ** best.x[0]), sorted(float(10 ** p) for p in best.x[1:1 + count])
+
+
+def replace_subckt(deck: str, name: str, model: str) -> str:
+    """A netlist with the .subckt block `name` swapped for a macromodel of the same pins"""
+    body, blocks = split_netlist(deck)
+    key = name.lower()
+    if key not in blocks:
+        raise KeyError(f"No .subckt {name} in the netlist")
+    ports = blocks[key].split("\n", 1)[0].split()[2:]
+    header = next(line for line in model.splitlines() if SUBCKT_PATTERN.match(line))
+    model_ports = header.split()[2:]
+    if sorted(ports) != sorted(model_ports):
+        raise ValueError(f"Macromodel pins {model_ports} do not match {name} pins {ports}")
+    # Same pin names, so only the header order has to follow the transistor-level block
+    model = model.replace(header, f".subckt {blocks[key].split()[1]} {' '.join(ports)}", 1)
+    blocks[key] = model
+    return "\n".join(body) + "\n" + "".join(blocks.values()) + ".end\n"
+
+
+class MacromodelLibrary:
+    """Per-variant behavioural models, rendered once and cached under their parameters' hash"""
+
+    def __init__(self, cache_dir: Optional[Union[str, Path]] = None, symbol: Union[str, Path] = OPAMP_SYMBOL):
+        """
+        Args:
+            cache_dir: Where the models are kept (default: BUILD_DIR/macromodels)
+            symbol: Symbol whose pin order the models follow
+        """
+        self.cache_dir = Path(cache_dir or Path(SimulationRunner.BUILD_DIR) / "macromodels")
+        self.ports = [pin[0] for pin in MVMArrayGenerator.symbol_pins(Path(symbol))]
+        self.subckt = Path(symbol).stem
+
+    def path(self, variant: str, model: OpAmpMacromodel) -> Path:
+        return self.cache_dir / f"{self.subckt}_{variant}-{model.key()}.spice"
+
+    def build(self, variant: str, results: Mapping[str, Any],
+              ac: Optional[Tuple[np.ndarray, np.ndarray]] = None, **overrides: Any) -> Path:
+        """Cached macromodel file of one variant from its results (or a metrics dict)"""
+        model = OpAmpMacromodel.from_metrics(merge_metrics(results), ac, **overrides)
+        path = self.path(variant, model)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(path.name + ".tmp")
+            tmp.write_text(model.render(self.subckt, self.ports), encoding='utf-8')
+            os.replace(tmp, path)
+            path.with_suffix(".json").write_text(json.dumps(asdict(model), default=float, indent=2) + "\n")
+        return path
+
+    def build_all(self, variants: Mapping[str, Mapping[str, Any]], **overrides: Any) -> Dict[str, Path]:
+        """Macromodels of every variant of build_and_simulate_variants"""
+        return {name: self.build(name, results, **overrides) for name, results in variants.items()}
+
+    def models(self) -> List[Path]:
+        return sorted(self.cache_dir.glob(f"{self.subckt}_*.spice"))
+
+
+class MacromodelSimulationRunner(SimulationRunner):
+    """SimulationRunner that swaps transistor-level subcircuits for macromodels after netlisting"""
+
+    def __init__(self, models: Mapping[str, Union[str, Path]], runner: Optional[SimulationRunner] = None,
+                 **runner_options):
+        """
+        Args:
+            models: Subcircuit name -> macromodel file, e.g. {"OpAmp": ...} for the op amp
+                inside the TIAs or {"OpAmp_<short>": ...} for a variant's own testbenches
+            runner: Netlists the testbench (default: a SimulationRunner with runner_options),
+                e.g. a HierarchicalSimulationRunner
+        """
+        super().__init__(**runner_options)
+        self.models = {name: Path(path).read_text(encoding='utf-8') for name, path in models.items()}
+        self.runner = runner or SimulationRunner(**runner_options)
+
+    def netlist(self, tb_file: Union[str, Path], timeout: Optional[float] = 30) -> Path:
+        netlist_file = self.runner.netlist(tb_file, timeout)
+        deck = netlist_file.read_text(encoding='utf-8', errors='replace')
+        replaced = 0
+        for name, model in self.models.items():
+            try:
+                deck = replace_subckt(deck, name, model)
+                replaced += 1
+            except KeyError:
+                continue
+        if not replaced:
+            # Never report transistor-level numbers as macromodel ones
+            raise RuntimeError(f"None of {sorted(self.models)} is instantiated by {tb_file}")
+        output = netlist_file.with_name(f"{netlist_file.stem}_macro.spice")
+        output.write_text(deck, encoding='utf-8')
+        return output
+
+
+def verify(tb_files: List[Union[str, Path]], models: Mapping[str, Union[str, Path]],
+           runner: Optional[SimulationRunner] = None, timeout: int = 60,
+           tolerance: float = 0.1) -> Dict[str, Dict[str, Any]]:
+    """Run testbenches at transistor level and with macromodels; per-metric relative errors and speed-up
+
+    A testbench passes when both runs succeed and every shared metric agrees within `tolerance`.
+    """
+    runner = runner or SimulationRunner()
+    macro = MacromodelSimulationRunner(models, runner)
+    report = {}
+    for tb_file in tb_files:
+        runs: List[Tuple[SimulationResult, float]] = []
+        for backend in (runner, macro):
+            start = time.perf_counter()
+            runs.append((backend.run_simulation(tb_file, timeout), time.perf_counter() - start))
+        (reference, slow), (result, fast) = runs
+        errors = {name: abs(result.metrics[name] - value) / max(abs(value), 1e-30)
+                  for name, value in reference.metrics.items() if name in result.metrics}
+        report[Path(tb_file).stem] = {
+            "ok": reference.ok and result.ok,
+            "errors": errors,
+            "max_error": max(errors.values(), default=0.0),
+            "passed": reference.ok and result.ok and all(error <= tolerance for error in errors.values()),
+            "speedup": slow / fast if fast > 0 else np.inf,
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Behavioural SPICE macromodel of an op amp variant")
+    parser.add_argument("metrics", type=Path, help="JSON metrics of the variant (e.g. from EvaluationStore or a run)")
+    parser.add_argument("--variant", default=None, help="Variant name (default: the file name)")
+    parser.add_argument("--ac", type=Path, default=None,
+                        help="Open-loop AC sweep to fit poles to: columns frequency, magnitude or frequency, re, im")
+    parser.add_argument("--cache", type=Path, default=None, help="Model directory (default: build/schematic/macromodels)")
+    args = parser.parse_args()
+
+    ac = None
+    if args.ac:
+        data = np.loadtxt(args.ac)
+        ac = (data[:, 0], data[:, 1] + 1j * data[:, 2] if data.shape[1] > 2 else data[:, 1])
+    metrics = json.loads(args.metrics.read_text())
+    print(MacromodelLibrary(args.cache).build(args.variant or args.metrics.stem, metrics, ac))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+import os
+import re
+import sys
+import json
+import hashlib
+import argparse
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Dict, Optional, Union, Iterable, Iterator, Set, Tuple
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, CURRENT_DIR)
+from XSchemParser import XSchemParser
+from SimulationRunner import SimulationRunner
+from Grammar import *
+
+PDK_SYMBOL_PREFIX = "sky130_fd_pr/"
+PDK_MODEL_PREFIX = "sky130_fd_pr__"
+IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+PARAM_NAME = re.compile(r"([A-Za-z_][A-Za-z0-9_]*)\s*=(?!=)")
+BIN_SUFFIX = re.compile(r"\.\d+$")
+BIN_LIMIT = re.compile(r"\b(lmin|lmax|wmin|wmax)\s*=\s*([-+0-9.eE]+)", re.IGNORECASE)
+
+# Geometry of one device instance: (L, W per finger) in metres
+Geometry = Tuple[float, float]
+
+
+@dataclass
+class Block:
+    """One logical statement of a model library (a .subckt spans several)"""
+    kind: str                           # "subckt", "model", "param" or "other"
+    text: str
+    names: List[str] = field(default_factory=list)
+    refs: Set[str] = field(default_factory=set)
+
+    @property
+    def base_name(self) -> str:
+        """Model name without its bin suffix (".0", ".1", ...)"""
+        return BIN_SUFFIX.sub("", self.names[0]) if self.names else ""
+
+
+def logical_lines(path: Path) -> Iterator[str]:
+    """Lines of a SPICE file with '+' continuations joined back on"""
+    current = None
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if line.startswith("+") and current is not None:
+                current += "\n" + line
+                continue
+            if current is not None:
+                yield current
+            current = line
+    if current is not None:
+        yield current
+
+
+def _unquote(token: str) -> str:
+    return token.strip().strip('"\'')
+
+
+def _refs(text: str, exclude: Iterable[str] = ()) -> Set[str]:
+    body = "\n".join(line.split("$")[0] for line in text.splitlines() if not line.startswith("*"))
+    return {token.lower() for token in IDENTIFIER.findall(body)} - set(exclude)
+
+
+def read_library(path: Path, section: Optional[str] = None,
+                 visiting: Optional[Set[Tuple[Path, Optional[str]]]] = None) -> List[Block]:
+    """Flatten a model library, following .include and .lib, into blocks in file order"""
+    path = Path(path).resolve()
+    visiting = visiting if visiting is not None else set()
+    if (path, section) in visiting:
+        return []
+    visiting.add((path, section))
+
+    blocks: List[Block] = []
+    in_section = section is None
+    subckt: Optional[List[str]] = None
+    depth = 0
+
+    for line in logical_lines(path):
+        words = line.split()
+        keyword = words[0].lower() if words else ""
+
+        if section is not None:
+            if keyword == ".lib" and len(words) == 2:
+                in_section = words[1].lower() == section.lower()
+                continue
+            if keyword == ".endl":
+                in_section = False
+                continue
+            if not in_section:
+                continue
+
+        if subckt is not None:
+            subckt.append(line)
+            if keyword == ".subckt":
+                depth += 1
+            elif keyword == ".ends":
+                depth -= 1
+                if depth == 0:
+                    text = "\n".join(subckt)
+                    name = subckt[0].split()[1].lower()
+                    blocks.append(Block("subckt", text, [name], _refs(text, [name])))
+                    subckt = None
+            continue
+
+        if keyword in (".include", ".inc") and len(words) > 1:
+            blocks.extend(read_library(path.parent / _unquote(line.split(None, 1)[1]), None, visiting))
+        elif keyword == ".lib" and len(words) > 2:
+            blocks.extend(read_library(path.parent / _unquote(words[1]), words[2], visiting))
+        elif keyword == ".subckt" and len(words) > 1:
+            subckt, depth = [line], 1
+        elif keyword == ".model" and len(words) > 1:
+            name = words[1].lower()
+            blocks.append(Block("model", line, [name], _refs(line, [name])))
+        elif keyword == ".param":
+            names = [name.lower() for name in PARAM_NAME.findall(line)]
+            blocks.append(Block("param", line, names, _refs(line[len(words[0]):], names)))
+        elif keyword.startswith(".") and keyword not in (".end", ".endl"):
+            blocks.append(Block("other", line))
+
+    visiting.discard((path, section))
+    return blocks
+
+
+def _bin_accepts(block: Block, geometries: List[Geometry], tolerance: float = 1e-3) -> bool:
+    limits = {key.lower(): float(value) for key, value in BIN_LIMIT.findall(block.text)}
+    for length, width in geometries:
+        if "lmin" in limits and length < limits["lmin"] * (1 - tolerance):
+            continue
+        if "lmax" in limits and length >= limits["lmax"] * (1 + tolerance):
+            continue
+        if "wmin" in limits and width < limits["wmin"] * (1 - tolerance):
+            continue
+        if "wmax" in limits and width >= limits["wmax"] * (1 + tolerance):
+            continue
+        return True
+    return False
+
+
+def reduce_blocks(blocks: List[Block], devices: Iterable[str],
+                  geometries: Optional[Dict[str, List[Geometry]]] = None) -> List[Block]:
+    """Keep only what the given devices need: their subcircuits, model bins and parameters
+
+    Everything reachable from the device names through subcircuit instances,
+    model references and parameter expressions is kept, in library order.
+    When geometries are given, model bins whose L/W range covers none of that
+    device's instances are dropped too (unless that would drop every bin).
+    """
+    devices = list(devices)
+    definitions: Dict[str, List[int]] = {}
+    for index, block in enumerate(blocks):
+        if block.kind in ("subckt", "model"):
+            definitions.setdefault(block.base_name, []).append(index)
+        elif block.kind == "param":
+            for name in block.names:
+                definitions.setdefault(name, []).append(index)
+
+    geometries = {device.lower(): sizes for device, sizes in (geometries or {}).items() if sizes}
+
+    def bins_for(name: str) -> List[int]:
+        indices = definitions.get(name, [])
+        owner = next((device for device in geometries if name.startswith(device + "__")), None)
+        if owner is None:
+            return indices
+        binned = [i for i in indices if blocks[i].kind == "model" and blocks[i].names[0] != name]
+        accepted = [i for i in binned if _bin_accepts(blocks[i], geometries[owner])]
+        if not binned or not accepted:
+            return indices
+        return [i for i in indices if i not in binned or i in accepted]
+
+    keep: Set[int] = set()
+    seen: Set[str] = set()
+    pending = [device.lower() for device in devices]
+    while pending:
+        name = pending.pop()
+        if name in seen:
+            continue
+        seen.add(name)
+        for index in bins_for(name):
+            if index not in keep:
+                keep.add(index)
+                pending.extend(ref for ref in blocks[index].refs if ref in definitions)
+
+    missing = sorted(device for device in devices if device.lower() not in definitions)
+    if missing:
+        raise KeyError(f"Devices not found in the model library: {', '.join(missing)}")
+
+    return [block for index, block in enumerate(blocks) if index in keep or block.kind == "other"]
+
+
+def _number(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def collect_devices(schematic: Union[str, Path], search_paths: Optional[List[Path]] = None,
+                    visited: Optional[Set[Path]] = None) -> Dict[str, List[Geometry]]:
+    """PDK devices used by a schematic and its subcircuits, with their numeric L/W per finger
+
+    Subcircuit symbols are resolved to the .sch next to them, looked up
+    relative to the schematic's own directory and its parents, which is how
+    the library references symbols ("OpAmps/OpAmp_x/OpAmp_B.sym").
+    """
+    schematic = Path(schematic).resolve()
+    visited = visited if visited is not None else set()
+    if schematic in visited:
+        return {}
+    visited.add(schematic)
+    search_paths = search_paths or [schematic.parent, *schematic.parents]
+
+    devices: Dict[str, List[Geometry]] = {}
+    for comp in XSchemParser().parse_file(schematic):
+        if not isinstance(comp, Component):
+            continue
+        ref = comp.symbolReference
+        if ref.startswith(PDK_SYMBOL_PREFIX):
+            model = comp.properties.get("model") or Path(ref).stem
+            if model == "corner":
+                continue
+            sizes = devices.setdefault(PDK_MODEL_PREFIX + model, [])
+            length, width = _number(comp.properties.get("L")), _number(comp.properties.get("W"))
+            fingers = _number(comp.properties.get("nf")) or 1
+            if length is not None and width is not None:
+                sizes.append((length * 1e-6, width / fingers * 1e-6))
+        elif ref.endswith(".sym"):
+            for root in search_paths:
+                child = (root / ref).with_suffix(".sch")
+                if child.exists():
+                    for name, sizes in collect_devices(child, search_paths, visited).items():
+                        devices.setdefault(name, []).extend(sizes)
+                    break
+    return devices
+
+
+class ModelReducer:
+    """Builds compact per-corner model decks containing only the devices a circuit uses
+
+    The full sky130 library pulled in by corner.sym defines every device and
+    every size bin; parsing it dominates the start-up of short simulations.
+    Reduced decks are cached under BUILD_DIR/models keyed by PDK version,
+    corner and device set, and are written atomically so parallel builds can
+    share them.
+    """
+
+    LIBRARY_CANDIDATES = ("libs.tech/ngspice/sky130.lib.spice", "libs.tech/combined/sky130.lib.spice")
+
+    def __init__(self, pdk_root: Optional[Union[str, Path]] = None, pdk: Optional[str] = None,
+                 library: Optional[Union[str, Path]] = None,
+                 cache_dir: Optional[Union[str, Path]] = None):
+        """
+        Args:
+            pdk_root: PDK installation root (default: $PDK_ROOT)
+            pdk: PDK variant (default: $PDK or sky130A)
+            library: Explicit model library, overriding the PDK lookup
+            cache_dir: Where reduced decks are kept (default: BUILD_DIR/models)
+        """
+        self.pdk_root = Path(pdk_root or os.environ.get("PDK_ROOT", "/usr/local/share/pdk"))
+        self.pdk = pdk or os.environ.get("PDK", "sky130A")
+        self._library = Path(library) if library else None
+        self.cache_dir = Path(cache_dir) if cache_dir else Path(SimulationRunner.BUILD_DIR) / "models"
+        self._blocks: Dict[str, List[Block]] = {}
+
+    @property
+    def library(self) -> Path:
+        if self._library:
+            return self._library
+        for candidate in self.LIBRARY_CANDIDATES:
+            path = self.pdk_root / self.pdk / candidate
+            if path.exists():
+                return path
+        raise FileNotFoundError(f"No sky130 model library under {self.pdk_root / self.pdk}")
+
+    def pdk_version(self) -> str:
+        """open_pdks SOURCES stamp if present, otherwise the library file's size and mtime"""
+        sources = self.pdk_root / self.pdk / "SOURCES"
+        if sources.exists():
+            return hashlib.sha1(sources.read_bytes()).hexdigest()
+        stat = self.library.stat()
+        return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+    def blocks(self, corner: str) -> List[Block]:
+        if corner not in self._blocks:
+            self._blocks[corner] = read_library(self.library, corner)
+        return self._blocks[corner]
+
+    def reduce(self, corner: str, devices: Iterable[str],
+               geometries: Optional[Dict[str, List[Geometry]]] = None) -> str:
+        """Text of the reduced deck for a corner and device set"""
+        devices = sorted(set(devices))
+        kept = reduce_blocks(self.blocks(corner), devices, geometries)
+        header = [
+            f"* Reduced sky130 models, corner {corner}",
+            f"* source: {self.library}",
+            f"* devices: {' '.join(devices)}",
+        ]
+        return "\n".join(header + [block.text for block in kept]) + "\n"
+
+    def cache_key(self, corner: str, devices: Iterable[str],
+                  geometries: Optional[Dict[str, List[Geometry]]] = None) -> str:
+        key = [self.pdk_version(), str(self.library), corner, sorted(set(devices)),
+               sorted((name, sorted(sizes)) for name, sizes in (geometries or {}).items())]
+        return hashlib.sha1(json.dumps(key).encode()).hexdigest()[:12]
+
+    def deck(self, corner: str, devices: Iterable[str],
+             geometries: Optional[Dict[str, List[Geometry]]] = None) -> Path:
+        """Path of the cached reduced deck, building it on first use"""
+        devices = sorted(set(devices))
+        path = self.cache_dir / f"sky130_{corner}_{self.cache_key(corner, devices, geometries)}.spice"
+        if not path.exists():
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_text(self.reduce(corner, devices, geometries), encoding='utf-8')
+            os.replace(tmp, path)
+        return path
+
+    def deck_for(self, schematics: Iterable[Union[str, Path]], corner: str = "tt",
+                 bin_by_geometry: bool = False) -> Path:
+        """Reduced deck covering every device used by the given schematics"""
+        devices: Dict[str, List[Geometry]] = {}
+        for schematic in schematics:
+            for name, sizes in collect_devices(schematic).items():
+                devices.setdefault(name, []).extend(sizes)
+        return self.deck(corner, devices, devices if bin_by_geometry else None)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Build a reduced sky130 model deck")
+    parser.add_argument("schematics", nargs="*", type=Path, help="schematics whose devices to keep")
+    parser.add_argument("--devices", nargs="+", default=[], help="extra device names, e.g. sky130_fd_pr__nfet_01v8")
+    parser.add_argument("--corner", default="tt")
+    parser.add_argument("--library", type=Path, help="model library (default: from $PDK_ROOT/$PDK)")
+    parser.add_argument("--bin-by-geometry", action="store_true", help="also drop size bins no instance falls in")
+    args = parser.parse_args(argv)
+
+    reducer = ModelReducer(library=args.library)
+    devices: Dict[str, List[Geometry]] = {name: [] for name in args.devices}
+    for schematic in args.schematics:
+        for name, sizes in collect_devices(schematic).items():
+            devices.setdefault(name, []).extend(sizes)
+    if not devices:
+        parser.error("no devices given")
+
+    print(reducer.deck(args.corner, devices, devices if args.bin_by_geometry else None))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
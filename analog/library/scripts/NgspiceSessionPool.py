@@ -0,0 +1,260 @@
+import os
+import sys
+import time
+import queue
+import itertools
+import threading
+import subprocess
+import contextlib
+from pathlib import Path
+from typing import List, Optional, Union, Iterator
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, CURRENT_DIR)
+from SimulationRunner import SimulationRunner, kill_process_group
+from SimulationResult import SimulationResult
+
+
+class SessionError(RuntimeError):
+    """An ngspice session died or stopped answering"""
+
+
+class NgspiceSession:
+    """One long-lived ngspice process driven through its pipe mode
+
+    Each circuit is loaded with `source`, which runs its .control block, and
+    followed by an `echo` of a unique sentinel so the end of its output can be
+    found on stdout. The circuit and its plots are freed before the sentinel so
+    the next one starts clean.
+    """
+
+    SENTINEL = "MVM_SESSION_DONE"
+
+    def __init__(self, command: List[str], cwd: Union[str, Path]):
+        self.command = command
+        self.jobs = 0
+        self.started = time.monotonic()
+        self.last_used = self.started
+        self._tokens = itertools.count()
+        self._lines: "queue.Queue[Optional[str]]" = queue.Queue()
+
+        self.process = subprocess.Popen(
+            command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+            text=True, bufsize=1, cwd=cwd, start_new_session=True
+        )
+        # Reading happens on a thread so that waits can time out
+        self._reader = threading.Thread(target=self._read_output, daemon=True)
+        self._reader.start()
+
+    def _read_output(self) -> None:
+        for line in self.process.stdout:
+            self._lines.put(line)
+        self._lines.put(None)
+
+    @property
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def _send(self, *commands: str) -> None:
+        try:
+            self.process.stdin.write("".join(f"{command}\n" for command in commands))
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            raise SessionError(f"ngspice session is gone: {e}") from None
+
+    def _collect(self, token: str, timeout: Optional[float]) -> str:
+        """Gather output up to the line carrying `token`"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        output = []
+        while True:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                line = self._lines.get(timeout=remaining)
+            except queue.Empty:
+                raise subprocess.TimeoutExpired(self.command, timeout) from None
+            if line is None:
+                raise SessionError(f"ngspice session exited with code {self.process.wait()}")
+            # Interactive mode may echo the command itself back
+            if token in line and "echo" not in line:
+                return "".join(output)
+            output.append(line)
+
+    def _token(self) -> str:
+        return f"{self.SENTINEL}_{next(self._tokens)}"
+
+    def ping(self, timeout: float = 5) -> bool:
+        """Health check: the session answers an echo within `timeout`"""
+        if not self.alive:
+            return False
+        token = self._token()
+        try:
+            self._send(f"echo {token}")
+            self._collect(token, timeout)
+        except (SessionError, subprocess.TimeoutExpired):
+            return False
+        return True
+
+    def run(self, netlist_file: Union[str, Path], timeout: Optional[float] = 30) -> str:
+        """Simulate one netlist and return everything ngspice printed for it"""
+        token = self._token()
+        self._send(f"source {Path(netlist_file).resolve()}", "destroy all", "remcirc",
+                   f"echo {token}")
+        try:
+            return self._collect(token, timeout)
+        finally:
+            self.jobs += 1
+            self.last_used = time.monotonic()
+
+    def close(self, graceful: bool = True) -> None:
+        """Stop the session; a non-graceful close kills it without asking it to quit"""
+        if graceful and self.alive:
+            with contextlib.suppress(SessionError):
+                self._send("quit")
+            try:
+                self.process.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                pass
+        kill_process_group(self.process.pid)
+        self.process.wait()
+        self.process.stdin.close()
+        self._reader.join(timeout=2)
+
+
+class NgspiceSessionPool:
+    """Fixed-size pool of warm ngspice sessions
+
+    Sessions are started lazily and handed out one caller at a time. A session
+    is recycled (killed and replaced on next use) when it times out, dies,
+    fails its health check or has served `max_jobs` circuits, which bounds
+    whatever state ngspice accumulates between runs.
+    """
+
+    def __init__(self, size: Optional[int] = None, command: Optional[List[str]] = None,
+                 cwd: Optional[Union[str, Path]] = None, max_jobs: int = 200,
+                 idle_check: float = 30, health_timeout: float = 5):
+        """
+        Args:
+            size: Number of sessions (default: CPU count)
+            command: ngspice invocation (default: ngspice -p)
+            cwd: Working directory of the sessions (default: SimulationRunner.BUILD_DIR)
+            max_jobs: Circuits a session serves before it is replaced
+            idle_check: Ping sessions that have been idle longer than this many seconds
+            health_timeout: Seconds a health check may take
+        """
+        self.size = size or os.cpu_count() or 1
+        self.command = command or ['ngspice', '-p']
+        self.cwd = cwd
+        self.max_jobs = max_jobs
+        self.idle_check = idle_check
+        self.health_timeout = health_timeout
+
+        self.started = 0
+        self.recycled = 0
+        self._idle: "queue.LifoQueue[Optional[NgspiceSession]]" = queue.LifoQueue()
+        self._sessions: List[NgspiceSession] = []
+        self._lock = threading.Lock()
+        self._closed = False
+        # Empty slots are None; a slot is filled the first time it is used
+        for _ in range(self.size):
+            self._idle.put(None)
+
+    def _start(self) -> NgspiceSession:
+        session = NgspiceSession(self.command, self.cwd or SimulationRunner.BUILD_DIR)
+        if not session.ping(self.health_timeout):
+            session.close()
+            raise SessionError(f"ngspice session did not start: {' '.join(self.command)}")
+        with self._lock:
+            self._sessions.append(session)
+            self.started += 1
+        return session
+
+    def _retire(self, session: NgspiceSession, graceful: bool = True) -> None:
+        session.close(graceful)
+        with self._lock:
+            if session in self._sessions:
+                self._sessions.remove(session)
+            self.recycled += 1
+
+    def _healthy(self, session: NgspiceSession) -> bool:
+        if not session.alive or session.jobs >= self.max_jobs:
+            return False
+        if time.monotonic() - session.last_used > self.idle_check:
+            return session.ping(self.health_timeout)
+        return True
+
+    @contextlib.contextmanager
+    def session(self) -> Iterator[NgspiceSession]:
+        """Borrow a healthy session; it is recycled if the caller's run fails"""
+        if self._closed:
+            raise SessionError("Session pool is closed")
+        session = self._idle.get()
+        try:
+            if session is not None and not self._healthy(session):
+                self._retire(session)
+                session = None
+            if session is None:
+                session = self._start()
+            yield session
+        except BaseException:
+            # A timed out or broken session may still be mid-circuit
+            if session is not None:
+                self._retire(session, graceful=False)
+                session = None
+            raise
+        finally:
+            self._idle.put(session)
+
+    def run(self, netlist_file: Union[str, Path], timeout: Optional[float] = 30) -> str:
+        with self.session() as session:
+            return session.run(netlist_file, timeout)
+
+    def close(self) -> None:
+        self._closed = True
+        with self._lock:
+            sessions = list(self._sessions)
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
+
+    def __enter__(self) -> 'NgspiceSessionPool':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class PooledSimulationRunner(SimulationRunner):
+    """SimulationRunner that simulates on warm ngspice sessions instead of one `ngspice -b` per run
+
+    Netlisting, parsing and the result format are unchanged, so it can be
+    passed anywhere a SimulationRunner is accepted. Close it (or use it as a
+    context manager) to stop the sessions.
+    """
+
+    def __init__(self, pool_size: Optional[int] = None, max_jobs_per_session: int = 200,
+                 command: Optional[List[str]] = None, **runner_options):
+        super().__init__(**runner_options)
+        self.pool = NgspiceSessionPool(pool_size, command, max_jobs=max_jobs_per_session)
+
+    def simulate_netlist(self, netlist_file: Union[str, Path], timeout: Optional[float] = 30,
+                         metric_keywords: Optional[List[str]] = None) -> SimulationResult:
+        """Run an existing netlist on a pooled session and return parsed metrics"""
+        # A session that died mid-run is replaced, so one retry is enough to
+        # tell a crashed session from a circuit that crashes ngspice
+        for attempt in range(2):
+            try:
+                stdout = self.pool.run(netlist_file, timeout)
+                break
+            except SessionError as e:
+                if attempt:
+                    return SimulationResult.failure(f"ngspice session failed: {e}")
+        return self.parse_metrics(stdout, metric_keywords or [], Path(netlist_file).stem)
+
+    def close(self) -> None:
+        self.pool.close()
+
+    def __enter__(self) -> 'PooledSimulationRunner':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,248 @@
+import os
+import sys
+import numpy as np
+from pathlib import Path
+from dataclasses import dataclass
+from typing import List, Dict, Optional, Sequence, Tuple, Any
+from scipy.stats import pearsonr, spearmanr
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, CURRENT_DIR)
+from XSchemInterface import XSchemInterface
+from GeometryMetrics import batch_geometry_metrics
+from Grammar import *
+
+TEMPLATE = Path(CURRENT_DIR).parent / "OpAmps" / "template" / "OpAmp.sch"
+BOLTZMANN = 1.380649e-23
+
+# Devices of the two-stage Miller OpAmp template and their type
+OPAMP_DEVICES = {"M1": "nfet", "M2": "nfet", "M3": "pfet", "M4": "pfet",
+                 "M5": "nfet", "M6": "pfet", "M7": "nfet"}
+# Devices counted by the area_calculation test
+AREA_DEVICES = ("M1", "M2", "M3", "M4", "M5", "M6")
+
+
+@dataclass
+class OperatingConditions:
+    """Testbench conditions of OpAmp_tb.sch"""
+    vdd: float = 1.8
+    vbias: float = 0.7
+    vcm: float = 0.9
+    load_cap: float = 5e-12
+    temperature: float = 300.0
+
+
+@dataclass
+class SquareLawDevice:
+    """Long-channel model of one device type; lengths in um, currents in A"""
+    k_prime: float                  # mu*Cox in A/V^2
+    vth: float                      # threshold magnitude in V
+    lambda_l: float                 # channel-length modulation times L, in um/V
+    cox: float = 8.8e-15            # gate capacitance per um^2
+
+    def current(self, w, l, vgs, vds):
+        vov = np.maximum(vgs - self.vth, 0.0)
+        return 0.5 * self.k_prime * (w / l) * vov ** 2 * (1 + self.lambda_l / l * vds)
+
+    def small_signal(self, w, l, current, vds) -> Tuple[np.ndarray, np.ndarray]:
+        gm = np.sqrt(2 * self.k_prime * (w / l) * current)
+        gds = self.lambda_l / l * current
+        return gm, gds
+
+
+class TableDevice:
+    """gm/Id-table model of one device type backed by a DeviceCharacterizer table"""
+
+    def __init__(self, table, cox: float = 8.8e-15):
+        self.table = table
+        self.cox = cox
+
+    def current(self, w, l, vgs, vds):
+        return self.table.lookup("id", l, vgs, vds, w=w)
+
+    def small_signal(self, w, l, current, vds) -> Tuple[np.ndarray, np.ndarray]:
+        vgs = self.table.vgs_for("id_w", current / w, l, vds)
+        return self.table.lookup("gm", l, vgs, vds, w=w), self.table.lookup("gds", l, vgs, vds, w=w)
+
+
+# First-order sky130 1.8V device constants
+SKY130_SQUARE_LAW = {
+    "nfet": SquareLawDevice(k_prime=270e-6, vth=0.45, lambda_l=0.08),
+    "pfet": SquareLawDevice(k_prime=60e-6, vth=0.65, lambda_l=0.12),
+}
+
+
+def score_metrics(metrics: Dict[str, np.ndarray], targets: Sequence[Any]) -> np.ndarray:
+    """Vectorized CircuitOptimizer._calculate_score over the metrics that were predicted"""
+    total_score, total_weight = 0.0, 0.0
+    for target in targets:
+        if target.metric not in metrics:
+            continue
+        value = np.asarray(metrics[target.metric], dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if target.constraint_type == "min":
+                score = np.minimum(1.0, value / target.target_value) if target.target_value > 0 else 0.0 * value
+            elif target.constraint_type == "max":
+                score = np.where(value > 0, np.minimum(1.0, target.target_value / value), 0.0)
+            else:
+                score = np.maximum(0.0, 1.0 - np.abs(value - target.target_value) / target.target_value)
+        total_score = total_score + np.nan_to_num(score) * target.weight
+        total_weight += target.weight
+    if total_weight == 0:
+        return np.zeros(len(next(iter(metrics.values()))))
+    return total_score / total_weight
+
+
+class OpAmpPrescreen:
+    """First-order evaluator of the OpAmp template for whole populations at once
+
+    Predicts DC_GAIN, GBW (the open-loop -3 dB frequency, i.e. the dominant
+    pole, as the dc_characteristics test measures it), UNITY_FREQ (0 dB
+    crossing of the two-pole response), SLEW_RATE_POS/NEG, POWER, TOTAL_AREA,
+    INPUT_CAP and the thermal part of VOLTAGE_NOISE_1KHZ from hand-analysis
+    equations. Devices follow the square
+    law by default, or gm/Id tables when DeviceCharacterizer tables are given.
+    Predictions are meant for rejecting and ranking candidates, not as results.
+    """
+
+    def __init__(self, defaults: Optional[Dict[str, Dict[str, float]]] = None,
+                 devices: Optional[Dict[str, Any]] = None,
+                 conditions: Optional[OperatingConditions] = None,
+                 mim_cap_density: float = 2e-15):
+        """
+        Args:
+            defaults: W/L (um) of every device and the Miller cap, as in the template
+            devices: Model per device type ("nfet"/"pfet"): SquareLawDevice or TableDevice
+            conditions: Supply, bias and load of the testbench
+            mim_cap_density: cap_mim_m3_1 capacitance per um^2
+        """
+        self.defaults = defaults or self.template_defaults()
+        self.devices = devices or SKY130_SQUARE_LAW
+        self.conditions = conditions or OperatingConditions()
+        self.mim_cap_density = mim_cap_density
+
+    @classmethod
+    def with_tables(cls, characterizer, corner: str = "tt", **kwargs) -> 'OpAmpPrescreen':
+        devices = {"nfet": TableDevice(characterizer.table("nfet_01v8", corner)),
+                   "pfet": TableDevice(characterizer.table("pfet_01v8", corner))}
+        return cls(devices=devices, **kwargs)
+
+    @staticmethod
+    def template_defaults(template: Path = TEMPLATE) -> Dict[str, Dict[str, float]]:
+        """Device sizes of the template schematic"""
+        defaults = {}
+        schematic = XSchemInterface.load(template, cached=True)
+        for name in [*OPAMP_DEVICES, "C1"]:
+            comp = schematic.find_component_by_name(name)
+            if comp is not None:
+                defaults[name] = {key: float(comp.properties[key]) for key in ("W", "L") if key in comp.properties}
+        return defaults
+
+    def _sizes(self, params_list: Sequence[Dict[str, Dict[str, Any]]]) -> Dict[str, Dict[str, np.ndarray]]:
+        sizes = {}
+        for name, default in self.defaults.items():
+            sizes[name] = {key: np.array([float(params.get(name, {}).get(key, value)) for params in params_list])
+                           for key, value in default.items()}
+        return sizes
+
+    def evaluate(self, params_list: Sequence[Dict[str, Dict[str, Any]]]) -> Dict[str, np.ndarray]:
+        """Predicted metrics for a population of parameter sets (as passed to create_variant)"""
+        return self.evaluate_sizes(self._sizes(params_list))
+
+    def evaluate_sizes(self, sizes: Dict[str, Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+        """Predicted metrics from arrays of W and L (um) per device"""
+        c = self.conditions
+        nfet, pfet = self.devices["nfet"], self.devices["pfet"]
+        w = {name: sizes[name]["W"] for name in OPAMP_DEVICES}
+        l = {name: sizes[name]["L"] for name in OPAMP_DEVICES}
+
+        # Bias: the tail (M5) and second-stage sink (M7) are mirrors of Vbias
+        vds_tail = np.full_like(w["M5"], 0.3)
+        i_tail = nfet.current(w["M5"], l["M5"], c.vbias, vds_tail)
+        i_out = nfet.current(w["M7"], l["M7"], c.vbias, c.vdd / 2)
+        i_half = i_tail / 2
+
+        # First stage: input pair into the M3/M4 mirror load
+        gm1, gds2 = nfet.small_signal(w["M2"], l["M2"], i_half, c.vdd / 2)
+        gm3, gds4 = pfet.small_signal(w["M4"], l["M4"], i_half, c.vdd / 2)
+        # Second stage: common-source M6 against M7
+        gm6, gds6 = pfet.small_signal(w["M6"], l["M6"], i_out, c.vdd / 2)
+        _, gds7 = nfet.small_signal(w["M7"], l["M7"], i_out, c.vdd / 2)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            gain = (gm1 / (gds2 + gds4)) * (gm6 / (gds6 + gds7))
+
+            cc = self.mim_cap_density * sizes["C1"]["W"] * sizes["C1"]["L"]
+            # Two-pole response: dominant pole from Miller compensation, second at the output
+            p1 = gm1 / (cc * gain)
+            p2 = gm6 / (c.load_cap + cc)
+            # Unity gain where (1 + w^2/p1^2)(1 + w^2/p2^2) = A0^2
+            a, b = 1 / (p1 * p2) ** 2, 1 / p1 ** 2 + 1 / p2 ** 2
+            w_unity = np.sqrt((-b + np.sqrt(b ** 2 + 4 * a * (gain ** 2 - 1))) / (2 * a))
+
+            slew_pos = i_tail / cc
+            slew_neg = np.minimum(i_tail / cc, i_out / (c.load_cap + cc))
+
+            cox = getattr(nfet, "cox", 8.8e-15)
+            input_cap = (2 / 3) * cox * w["M1"] * l["M1"]
+            noise = np.sqrt(16 * BOLTZMANN * c.temperature / (3 * gm1) * (1 + gm3 / gm1))
+
+        metrics = {
+            "DC_GAIN": 20 * np.log10(np.maximum(gain, 1e-12)),
+            "GBW": p1 / (2 * np.pi),
+            "UNITY_FREQ": w_unity / (2 * np.pi),
+            "SLEW_RATE_POS": slew_pos,
+            "SLEW_RATE_NEG": slew_neg,
+            "POWER": c.vdd * (i_tail + i_out),
+            "TOTAL_AREA": batch_geometry_metrics(
+                {name: {"W": w[name], "L": l[name]} for name in OPAMP_DEVICES}, AREA_DEVICES)["TOTAL_AREA"],
+            "INPUT_CAP": input_cap,
+            "VOLTAGE_NOISE_1KHZ": noise,
+        }
+        return {name: np.nan_to_num(values, nan=0.0, posinf=0.0) for name, values in metrics.items()}
+
+    def score(self, params_list: Sequence[Dict[str, Dict[str, Any]]], targets: Sequence[Any]) -> np.ndarray:
+        """Predicted optimizer score of each parameter set"""
+        return score_metrics(self.evaluate(params_list), targets)
+
+    def rank(self, params_list: Sequence[Dict[str, Dict[str, Any]]], targets: Sequence[Any]) -> np.ndarray:
+        """Indices of the parameter sets, most promising first"""
+        return np.argsort(-self.score(params_list, targets), kind="stable")
+
+
+class PrescreenReport:
+    """Pairs of predicted and simulated metrics, summarised as correlations"""
+
+    def __init__(self):
+        self.pairs: Dict[str, List[Tuple[float, float]]] = {}
+
+    def record(self, predicted: Dict[str, float], simulated: Dict[str, float]) -> None:
+        for metric, value in predicted.items():
+            if metric in simulated and simulated[metric] is not None:
+                self.pairs.setdefault(metric, []).append((float(value), float(simulated[metric])))
+
+    def correlations(self) -> Dict[str, Dict[str, float]]:
+        """Pearson and Spearman correlation plus median ratio per metric"""
+        summary = {}
+        for metric, pairs in self.pairs.items():
+            predicted, simulated = np.array(pairs).T
+            entry = {"samples": len(pairs)}
+            if len(pairs) >= 3 and np.ptp(predicted) > 0 and np.ptp(simulated) > 0:
+                entry["pearson"] = float(pearsonr(predicted, simulated)[0])
+                entry["spearman"] = float(spearmanr(predicted, simulated)[0])
+            with np.errstate(divide='ignore', invalid='ignore'):
+                ratios = simulated / predicted
+            ratios = ratios[np.isfinite(ratios)]
+            if len(ratios):
+                entry["median_ratio"] = float(np.median(ratios))
+            summary[metric] = entry
+        return summary
+
+    def format(self) -> str:
+        lines = [f"{'metric':<22}{'n':>5}{'pearson':>10}{'spearman':>10}{'sim/pred':>10}"]
+        for metric, entry in sorted(self.correlations().items()):
+            lines.append(f"{metric:<22}{entry['samples']:>5}"
+                         f"{entry.get('pearson', float('nan')):>10.3f}"
+                         f"{entry.get('spearman', float('nan')):>10.3f}"
+                         f"{entry.get('median_ratio', float('nan')):>10.3g}")
+        return "\n".join(lines)
@@ -0,0 +1,494 @@
+"""
+Small job queue for spreading simulations over several processes or hosts.
+
+A SimulationBroker holds netlists submitted by clients and hands them to
+SimulationWorker processes, which simulate each job in its own scratch
+directory and send back the metrics without the ngspice stdout. Workers send
+heartbeats while simulating; jobs of a worker that disconnects or stops
+heartbeating are put back on the queue.
+
+Netlisting stays on the client (QueueSimulationRunner), so workers only need
+ngspice and the PDK models at the same absolute path as the client.
+
+    python SimulationQueue.py broker --address 0.0.0.0:5555
+    python SimulationQueue.py worker --address broker-host:5555 --processes 4
+
+Addresses are "host:port" for TCP or a filesystem path for a Unix socket.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import socket
+import argparse
+import tempfile
+import threading
+import socketserver
+import subprocess
+import multiprocessing
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Union, Tuple
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, CURRENT_DIR)
+from SimulationRunner import SimulationRunner
+from SimulationResult import SimulationResult, SimulationStatus, netlist_hash
+
+HEARTBEAT_INTERVAL = 2.0
+HEARTBEAT_TIMEOUT = 10.0
+
+
+def parse_address(address: str) -> Tuple[int, Union[str, Tuple[str, int]]]:
+    """Split an address into a socket family and the address for that family"""
+    host, sep, port = address.rpartition(':')
+    if sep and port.isdigit():
+        return socket.AF_INET, (host or '127.0.0.1', int(port))
+    return socket.AF_UNIX, address
+
+
+def connect(address: str) -> socket.socket:
+    """Open a stream socket to a broker"""
+    family, addr = parse_address(address)
+    if family == socket.AF_INET:
+        return socket.create_connection(addr)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(addr)
+    return sock
+
+
+class Connection:
+    """Newline-delimited JSON messages over a stream socket"""
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self._reader = sock.makefile('rb')
+        self._send_lock = threading.Lock()
+
+    def send(self, message: Dict[str, Any]) -> None:
+        data = (json.dumps(message) + '\n').encode()
+        with self._send_lock:
+            self.sock.sendall(data)
+
+    def receive(self) -> Optional[Dict[str, Any]]:
+        """Next message, or None once the peer has gone away"""
+        try:
+            line = self._reader.readline()
+        except OSError:
+            return None
+        return json.loads(line) if line else None
+
+    def close(self) -> None:
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class _BrokerHandler(socketserver.BaseRequestHandler):
+    """One thread per connection; the first message says whether it is a worker or a client"""
+
+    def handle(self):
+        broker: SimulationBroker = self.server.broker
+        conn = Connection(self.request)
+        hello = conn.receive()
+        if hello is None:
+            return
+        if hello["type"] == "hello":
+            broker._serve_worker(conn, hello["worker"])
+        elif hello["type"] == "submit":
+            broker._serve_client(conn, hello)
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _UnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+class SimulationBroker:
+    """Queue that hands netlist jobs to workers and routes results back to clients"""
+
+    def __init__(self, address: str = "127.0.0.1:0", heartbeat_interval: float = HEARTBEAT_INTERVAL,
+                 heartbeat_timeout: float = HEARTBEAT_TIMEOUT, max_attempts: int = 3):
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_attempts = max_attempts
+
+        self._cond = threading.Condition()
+        self._pending: deque = deque()              # job ids waiting for a worker
+        self._jobs: Dict[str, Dict[str, Any]] = {}   # job id -> job, client, attempts
+        self._workers: Dict[str, Dict[str, Any]] = {}  # worker id -> conn, last_seen, jobs
+        self._closed = False
+
+        family, addr = parse_address(address)
+        if family == socket.AF_INET:
+            self._server = _TCPServer(addr, _BrokerHandler)
+            host, port = self._server.server_address[:2]
+            self.address = f"{host}:{port}"
+        else:
+            if os.path.exists(addr):
+                os.unlink(addr)
+            self._server = _UnixServer(addr, _BrokerHandler)
+            self.address = addr
+        self._server.broker = self
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> 'SimulationBroker':
+        """Serve in background threads"""
+        for target in (self._server.serve_forever, self._watch_heartbeats):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def serve_forever(self) -> None:
+        self.start()
+        try:
+            while not self._closed:
+                time.sleep(self.heartbeat_interval)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.shutdown()
+
+    def shutdown(self) -> None:
+        with self._cond:
+            self._closed = True
+            workers = list(self._workers.values())
+            self._cond.notify_all()
+        for worker in workers:
+            worker["conn"].close()
+        self._server.shutdown()
+        self._server.server_close()
+        if isinstance(self._server, _UnixServer) and os.path.exists(self.address):
+            os.unlink(self.address)
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {
+                "pending": len(self._pending),
+                "running": sum(len(w["jobs"]) for w in self._workers.values()),
+                "workers": len(self._workers),
+            }
+
+    # ---- workers -------------------------------------------------------
+
+    def _serve_worker(self, conn: Connection, worker_id: str) -> None:
+        with self._cond:
+            self._workers[worker_id] = {"conn": conn, "last_seen": time.monotonic(), "jobs": set()}
+        try:
+            while True:
+                message = conn.receive()
+                if message is None:
+                    break
+                with self._cond:
+                    self._workers[worker_id]["last_seen"] = time.monotonic()
+
+                if message["type"] == "request":
+                    job = self._next_job(worker_id)
+                    conn.send(job if job else {"type": "shutdown" if self._closed else "idle"})
+                elif message["type"] == "result":
+                    self._complete(worker_id, message["job"], message["result"])
+        except OSError:
+            pass
+        finally:
+            self._drop_worker(worker_id)
+
+    def _next_job(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """Wait up to one heartbeat interval for a job and assign it to the worker"""
+        deadline = time.monotonic() + self.heartbeat_interval
+        with self._cond:
+            while not self._pending and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            if self._closed:
+                return None
+            job_id = self._pending.popleft()
+            self._workers[worker_id]["jobs"].add(job_id)
+            return {"type": "job", "job": job_id, **self._jobs[job_id]["job"]}
+
+    def _complete(self, worker_id: str, job_id: str, result: Dict[str, Any]) -> None:
+        with self._cond:
+            worker = self._workers.get(worker_id)
+            if worker:
+                worker["jobs"].discard(job_id)
+            entry = self._jobs.pop(job_id, None)
+        if entry:
+            self._reply(entry, result)
+
+    def _drop_worker(self, worker_id: str) -> None:
+        """Forget a worker and requeue whatever it was running"""
+        failed = []
+        with self._cond:
+            worker = self._workers.pop(worker_id, None)
+            if not worker:
+                return
+            for job_id in worker["jobs"]:
+                entry = self._jobs.get(job_id)
+                if entry is None:
+                    continue
+                entry["attempts"] += 1
+                if entry["attempts"] >= self.max_attempts:
+                    failed.append(self._jobs.pop(job_id))
+                else:
+                    self._pending.appendleft(job_id)
+            self._cond.notify_all()
+        worker["conn"].close()
+        for entry in failed:
+            self._reply(entry, SimulationResult.failure(
+                f"Worker lost {entry['attempts']} times while simulating").to_payload())
+
+    def _watch_heartbeats(self) -> None:
+        while not self._closed:
+            time.sleep(self.heartbeat_interval)
+            now = time.monotonic()
+            with self._cond:
+                stale = [w["conn"] for w in self._workers.values()
+                         if now - w["last_seen"] > self.heartbeat_timeout]
+            # Closing the socket ends the worker's handler, which requeues its jobs
+            for conn in stale:
+                conn.close()
+
+    # ---- clients -------------------------------------------------------
+
+    def _serve_client(self, conn: Connection, message: Dict[str, Any]) -> None:
+        submitted = []
+        try:
+            while message is not None:
+                if message["type"] == "submit":
+                    with self._cond:
+                        for job in message["jobs"]:
+                            job_id = uuid.uuid4().hex
+                            client_id = job.pop("id")
+                            self._jobs[job_id] = {"job": job, "client": conn,
+                                                  "client_id": client_id, "attempts": 0}
+                            self._pending.append(job_id)
+                            submitted.append(job_id)
+                        self._cond.notify_all()
+                message = conn.receive()
+        finally:
+            # Client went away: forget its jobs, running ones are ignored on completion
+            with self._cond:
+                for job_id in submitted:
+                    if self._jobs.pop(job_id, None) is not None and job_id in self._pending:
+                        self._pending.remove(job_id)
+
+    @staticmethod
+    def _reply(entry: Dict[str, Any], result: Dict[str, Any]) -> None:
+        try:
+            entry["client"].send({"type": "result", "id": entry["client_id"], "result": result})
+        except OSError:
+            pass
+
+
+class SimulationWorker:
+    """Pulls netlists from a broker and simulates each one in a fresh scratch directory"""
+
+    def __init__(self, address: str, runner: Optional[SimulationRunner] = None,
+                 scratch_root: Optional[str] = None, heartbeat_interval: float = HEARTBEAT_INTERVAL,
+                 worker_id: Optional[str] = None):
+        self.address = address
+        self.runner = runner or SimulationRunner()
+        self.scratch_root = scratch_root
+        self.heartbeat_interval = heartbeat_interval
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+    def run(self, max_jobs: Optional[int] = None) -> int:
+        """Process jobs until the broker goes away; returns the number of jobs run"""
+        conn = Connection(connect(self.address))
+        done = 0
+        try:
+            conn.send({"type": "hello", "worker": self.worker_id})
+            while max_jobs is None or done < max_jobs:
+                conn.send({"type": "request"})
+                message = conn.receive()
+                if message is None or message["type"] == "shutdown":
+                    break
+                if message["type"] != "job":
+                    continue
+                result = self._run_with_heartbeat(conn, message)
+                conn.send({"type": "result", "job": message["job"], "result": result})
+                done += 1
+        except OSError:
+            pass
+        finally:
+            conn.close()
+        return done
+
+    def _run_with_heartbeat(self, conn: Connection, job: Dict[str, Any]) -> Dict[str, Any]:
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(self.heartbeat_interval):
+                try:
+                    conn.send({"type": "heartbeat"})
+                except OSError:
+                    return
+
+        thread = threading.Thread(target=beat, daemon=True)
+        thread.start()
+        try:
+            return self.simulate(job)
+        finally:
+            stop.set()
+            thread.join()
+
+    def simulate(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """Write the netlist into a scratch directory, run ngspice there and return a result payload"""
+        timeout = job.get("timeout", 30)
+        with tempfile.TemporaryDirectory(prefix="sim_", dir=self.scratch_root) as scratch:
+            netlist_file = Path(scratch) / f"{job['name']}.spice"
+            netlist_file.write_text(job["netlist"], encoding='utf-8')
+            try:
+                result = self.runner.run_command(
+                    self.runner.simulate_command(netlist_file.name), timeout, scratch)
+            except subprocess.TimeoutExpired:
+                return SimulationResult.failure(f"Simulation timed out after {timeout} seconds",
+                                                SimulationStatus.TIMEOUT).to_payload()
+            except Exception as e:
+                return SimulationResult.failure(f"Exception: {str(e)}").to_payload()
+        result = self.runner.parse_metrics(result.stdout, job.get("metric_keywords") or [], job["name"], result.stderr)
+        return result.to_payload(include_output=True)
+
+
+class QueueSimulationRunner(SimulationRunner):
+    """SimulationRunner backend that netlists locally and simulates on broker workers"""
+
+    def __init__(self, address: str, netlist_workers: Optional[int] = None, **runner_options):
+        super().__init__(**runner_options)
+        self.address = address
+        self.netlist_workers = netlist_workers
+
+    def run_simulation(self, tb_file: Union[str, Path], timeout: int = 30,
+                       metric_keywords: Optional[List[str]] = None) -> SimulationResult:
+        result = self.run_simulations([tb_file], timeout, metric_keywords=metric_keywords)[0]
+        result.tb_file = None
+        return result
+
+    def run_simulations(self, tb_files: List[Union[str, Path]], timeout: int = 30,
+                        max_workers: Optional[int] = None,
+                        metric_keywords: Optional[List[str]] = None) -> List[SimulationResult]:
+        """Netlist in parallel, submit everything to the broker and wait for all results"""
+        tb_files = list(tb_files)
+        results: Dict[int, SimulationResult] = {}
+        hashes: Dict[int, str] = {}
+        jobs = []
+
+        with ThreadPoolExecutor(max_workers=max_workers or self.netlist_workers) as executor:
+            prepared = list(executor.map(lambda tb: self._prepare_job(tb, timeout, metric_keywords), tb_files))
+        for index, job in enumerate(prepared):
+            if isinstance(job, SimulationResult):
+                results[index] = job
+            else:
+                jobs.append({"id": index, **job})
+                hashes[index] = netlist_hash(job["netlist"])
+
+        if jobs:
+            conn = Connection(connect(self.address))
+            try:
+                conn.send({"type": "submit", "jobs": jobs})
+                while len(results) < len(tb_files):
+                    message = conn.receive()
+                    if message is None:
+                        break
+                    if message["type"] == "result":
+                        index = message["id"]
+                        results[index] = SimulationResult.from_payload(
+                            message["result"], self.logs, Path(tb_files[index]).stem)
+            finally:
+                conn.close()
+
+        for index, tb_file in enumerate(tb_files):
+            result = results.setdefault(index, SimulationResult.failure("Lost connection to simulation broker"))
+            result.tb_file = str(tb_file)
+            result.netlist_hash = hashes.get(index)
+        return [results[index] for index in range(len(tb_files))]
+
+    def _prepare_job(self, tb_file: Union[str, Path], timeout: int,
+                     metric_keywords: Optional[List[str]]) -> Union[Dict[str, Any], SimulationResult]:
+        try:
+            netlist_file = self.netlist(tb_file, timeout)
+            netlist = netlist_file.read_text(encoding='utf-8')
+        except subprocess.TimeoutExpired:
+            return SimulationResult.failure(f"Netlist generation timed out after {timeout} seconds",
+                                            SimulationStatus.TIMEOUT)
+        except Exception as e:
+            return SimulationResult.failure(f"Exception: {str(e)}")
+        return {"name": netlist_file.stem, "netlist": netlist, "timeout": timeout,
+                "metric_keywords": list(metric_keywords or [])}
+
+
+def run_worker(address: str, scratch_root: Optional[str] = None) -> None:
+    """Process entry point for a worker"""
+    SimulationWorker(address, scratch_root=scratch_root).run()
+
+
+class LocalSimulationCluster:
+    """Broker plus worker processes on this machine, for testing and single-host runs
+
+        with LocalSimulationCluster(n_workers=4) as cluster:
+            build_and_simulate_variants(..., simulator=cluster.runner())
+    """
+
+    def __init__(self, n_workers: Optional[int] = None, address: str = "127.0.0.1:0",
+                 scratch_root: Optional[str] = None, **broker_options):
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.broker = SimulationBroker(address, **broker_options)
+        self.scratch_root = scratch_root
+        self.processes: List[multiprocessing.Process] = []
+
+    def __enter__(self) -> 'LocalSimulationCluster':
+        self.broker.start()
+        context = multiprocessing.get_context("spawn")
+        for _ in range(self.n_workers):
+            process = context.Process(target=run_worker, args=(self.broker.address, self.scratch_root),
+                                      daemon=True)
+            process.start()
+            self.processes.append(process)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.broker.shutdown()
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+
+    def runner(self) -> QueueSimulationRunner:
+        return QueueSimulationRunner(self.broker.address)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Distributed simulation queue")
+    parser.add_argument("role", choices=["broker", "worker"])
+    parser.add_argument("--address", default="127.0.0.1:5555", help="host:port or Unix socket path")
+    parser.add_argument("--processes", type=int, default=1, help="worker processes to start")
+    parser.add_argument("--scratch", default=None, help="directory for per-job scratch dirs")
+    args = parser.parse_args(argv)
+
+    if args.role == "broker":
+        broker = SimulationBroker(args.address)
+        print(f"Simulation broker listening on {broker.address}")
+        broker.serve_forever()
+        return
+
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=run_worker, args=(args.address, args.scratch))
+                 for _ in range(args.processes)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
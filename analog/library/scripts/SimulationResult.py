@@ -0,0 +1,137 @@
+import gzip
+import hashlib
+from array import array
+from collections.abc import Mapping
+from enum import IntEnum
+from pathlib import Path
+from typing import Dict, Any, Iterable, Iterator, Optional, Union
+
+
+class SimulationStatus(IntEnum):
+    OK = 0
+    NO_METRICS = 1
+    TIMEOUT = 2
+    ERROR = 3
+    SKIPPED = 4
+
+
+def write_log(stdout: str, log_dir: Union[str, Path], name: str) -> Path:
+    """Spill simulator output to a gzip file named after the run and its content"""
+    log_dir = Path(log_dir)
+    log_dir.mkdir(parents=True, exist_ok=True)
+    digest = hashlib.sha1(stdout.encode(errors='replace')).hexdigest()[:10]
+    path = log_dir / f"{name}-{digest}.log.gz"
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        f.write(stdout)
+    return path
+
+
+def netlist_hash(netlist: str) -> str:
+    """Content hash of a netlist, ignoring "**" comment lines that carry schematic paths"""
+    digest = hashlib.sha1()
+    for line in netlist.splitlines():
+        if not line.startswith("**"):
+            digest.update(line.encode(errors='replace'))
+            digest.update(b"\n")
+    return digest.hexdigest()[:16]
+
+
+class SimulationResult(Mapping):
+    """Compact result of one simulation: metric values in a float array plus a status code
+
+    Reads like the dicts SimulationRunner used to return ("error" and "tb_file"
+    keys included), but the ngspice stdout is never held in memory. It is
+    written to a compressed log on error, or on every run when the runner
+    keeps logs, and read back lazily through `stdout`.
+    """
+
+    __slots__ = ("names", "values", "status", "message", "log_path", "tb_file", "runtime", "netlist_hash")
+
+    def __init__(self, names: Iterable[str] = (), values: Iterable[float] = (),
+                 status: SimulationStatus = SimulationStatus.OK, message: str = "",
+                 log_path: Optional[Path] = None, tb_file: Optional[str] = None,
+                 runtime: Optional[float] = None, netlist_hash: Optional[str] = None):
+        self.names = tuple(names)
+        self.values = array('d', values)
+        self.status = SimulationStatus(status)
+        self.message = message
+        self.log_path = log_path
+        self.tb_file = tb_file
+        self.runtime = runtime              # wall-clock seconds of netlisting plus simulation
+        self.netlist_hash = netlist_hash    # see netlist_hash()
+
+    @classmethod
+    def from_metrics(cls, metrics: Dict[str, float], **kwargs) -> 'SimulationResult':
+        return cls(metrics.keys(), metrics.values(), **kwargs)
+
+    @classmethod
+    def failure(cls, message: str, status: SimulationStatus = SimulationStatus.ERROR,
+                **kwargs) -> 'SimulationResult':
+        return cls(status=status, message=message, **kwargs)
+
+    @property
+    def ok(self) -> bool:
+        return self.status == SimulationStatus.OK
+
+    @property
+    def metrics(self) -> Dict[str, float]:
+        return dict(zip(self.names, self.values))
+
+    @property
+    def stdout(self) -> Optional[str]:
+        """Simulator output, loaded from the on-disk log if one was written"""
+        if self.log_path is None or not Path(self.log_path).exists():
+            return None
+        with gzip.open(self.log_path, 'rt', encoding='utf-8') as f:
+            return f.read()
+
+    # Mapping interface -------------------------------------------------
+
+    def _extra_keys(self):
+        if not self.ok:
+            yield "error"
+        if self.tb_file is not None:
+            yield "tb_file"
+
+    def __getitem__(self, key: str) -> Any:
+        if key == "error" and not self.ok:
+            return self.message
+        if key == "tb_file" and self.tb_file is not None:
+            return self.tb_file
+        try:
+            return self.values[self.names.index(key)]
+        except ValueError:
+            raise KeyError(key) from None
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self.names
+        yield from self._extra_keys()
+
+    def __len__(self) -> int:
+        return len(self.names) + sum(1 for _ in self._extra_keys())
+
+    def __repr__(self) -> str:
+        if self.ok:
+            return f"SimulationResult({self.metrics})"
+        return f"SimulationResult(status={self.status.name}, error={self.message!r})"
+
+    # Transport ---------------------------------------------------------
+
+    def to_payload(self, include_output: bool = False) -> Dict[str, Any]:
+        """JSON-serialisable form; failed runs can carry the tail of their output"""
+        payload = {"names": list(self.names), "values": list(self.values),
+                   "status": int(self.status), "message": self.message}
+        if include_output and not self.ok:
+            output = self.stdout
+            if output:
+                payload["output"] = output[-2000:]
+        return payload
+
+    @classmethod
+    def from_payload(cls, payload: Dict[str, Any], log_dir: Optional[Union[str, Path]] = None,
+                     name: str = "remote") -> 'SimulationResult':
+        log_path = None
+        if payload.get("output") and log_dir is not None:
+            log_path = write_log(payload["output"], log_dir, name)
+        return cls(payload["names"], payload["values"], payload["status"],
+                   payload.get("message", ""), log_path)
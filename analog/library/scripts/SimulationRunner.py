@@ -1,48 +1,112 @@
 import os
+import sys
+import signal
 import subprocess
 import re
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Union
+from typing import List, Optional, Union
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, CURRENT_DIR)
+from SimulationResult import SimulationResult, SimulationStatus, write_log, netlist_hash
+
+
+def kill_process_group(pid: int) -> None:
+    """Kill a process started with start_new_session=True and everything it spawned"""
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
 class SimulationRunner:
     """Handles simulation execution and result parsing"""
     
     # Global build directory - always relative to this file
     BUILD_DIR = (Path(__file__).parent / "../../build/schematic").resolve()
     
+    def __init__(self, log_dir: Optional[Union[str, Path]] = None, keep_logs: bool = False):
+        """
+        Args:
+            log_dir: Where compressed ngspice output is written (default: BUILD_DIR/logs)
+            keep_logs: Also keep the output of successful runs, not only failures
+        """
+        self.log_dir = Path(log_dir) if log_dir else None
+        self.keep_logs = keep_logs
+    
+    @property
+    def logs(self) -> Path:
+        return self.log_dir or Path(self.BUILD_DIR) / "logs"
+    
+    def netlist_command(self, tb_file: Path) -> List[str]:
+        """Command that netlists a testbench into BUILD_DIR/spice"""
+        return ['xschem', '--netlist', '-q', '-x', str(tb_file)]
+    
+    def simulate_command(self, netlist_file: Union[str, Path]) -> List[str]:
+        """Command that runs a netlist in batch mode"""
+        return ['ngspice', '-b', str(netlist_file)]
+    
+    def netlist_path(self, tb_file: Path) -> Path:
+        """Where xschem writes the netlist for a testbench"""
+        return Path(self.BUILD_DIR) / "spice" / f"{tb_file.stem}.spice"
+    
+    @staticmethod
+    def run_command(cmd: List[str], timeout: Optional[float], 
+                    cwd: Union[str, Path]) -> subprocess.CompletedProcess:
+        """Run a command in its own process group, killing the whole group on timeout"""
+        with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, 
+                              text=True, cwd=cwd, start_new_session=True) as process:
+            try:
+                stdout, stderr = process.communicate(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                kill_process_group(process.pid)
+                process.communicate()
+                raise
+        return subprocess.CompletedProcess(cmd, process.returncode, stdout, stderr)
+    
+    def netlist(self, tb_file: Union[str, Path], timeout: Optional[float] = 30) -> Path:
+        """Generate the netlist for a testbench and return its path"""
+        tb_file = Path(tb_file).resolve()
+        self.run_command(self.netlist_command(tb_file), timeout, self.BUILD_DIR)
+        return self.netlist_path(tb_file)
+    
+    def simulate_netlist(self, netlist_file: Union[str, Path], timeout: Optional[float] = 30, 
+                         metric_keywords: Optional[List[str]] = None) -> SimulationResult:
+        """Run ngspice on an existing netlist and return parsed metrics"""
+        result = self.run_command(self.simulate_command(netlist_file), timeout, self.BUILD_DIR)
+        return self.parse_metrics(result.stdout, metric_keywords or [], Path(netlist_file).stem, result.stderr)
+    
     def run_simulation(self, tb_file: Union[str, Path], timeout: int = 30, 
-                      metric_keywords: Optional[List[str]] = None) -> Dict[str, Any]:
+                      metric_keywords: Optional[List[str]] = None) -> SimulationResult:
         """Run a single simulation and return parsed metrics"""
-        original_dir = os.getcwd()
-        tb_file = Path(tb_file)
+        # Resolve before handing to the tools, which run inside BUILD_DIR.
+        # The working directory is passed per process instead of os.chdir so
+        # that run_simulations can safely use several threads.
+        tb_file = Path(tb_file).resolve()
         
         try:
-            os.chdir(self.BUILD_DIR)
-            
             # Generate netlist
-            subprocess.run(['xschem', '--netlist', '-q', '-x', tb_file], 
-                         capture_output=True, text=True)
+            try:
+                netlist_file = self.netlist(tb_file, timeout)
+            except subprocess.TimeoutExpired:
+                return SimulationResult.failure(f"Netlist generation timed out after {timeout} seconds",
+                                                SimulationStatus.TIMEOUT)
             
             # Run simulation
-            tb_basename = tb_file.stem
-            netlist_file = f"spice/{tb_basename}.spice"
-            
-            result = subprocess.run(['ngspice', '-b', netlist_file], 
-                                  capture_output=True, text=True, timeout=timeout)
-            
-            return self.parse_metrics(result.stdout, metric_keywords or [])
+            result = self.simulate_netlist(netlist_file, timeout, metric_keywords)
+            result.netlist_hash = netlist_hash(netlist_file.read_text(encoding='utf-8', errors='replace'))
+            return result
             
         except subprocess.TimeoutExpired:
-            return {"error": f"Simulation timed out after {timeout} seconds"}
+            return SimulationResult.failure(f"Simulation timed out after {timeout} seconds",
+                                            SimulationStatus.TIMEOUT)
         except Exception as e:
-            return {"error": f"Exception: {str(e)}"}
-        finally:
-            os.chdir(original_dir)
+            return SimulationResult.failure(f"Exception: {str(e)}")
     
     def run_simulations(self, tb_files: List[Union[str, Path]], timeout: int = 30, 
                        max_workers: Optional[int] = None, 
-                       metric_keywords: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+                       metric_keywords: Optional[List[str]] = None) -> List[SimulationResult]:
         """Run multiple simulations in parallel and return list of parsed metrics"""
         results = []
         
@@ -58,18 +122,22 @@ class SimulationRunner:
                 tb_file = future_to_file[future]
                 try:
                     result = future.result()
-                    result['tb_file'] = str(tb_file)  # Add filename to result
+                    result.tb_file = str(tb_file)  # Add filename to result
                     results.append(result)
                 except Exception as e:
-                    results.append({
-                        "error": f"Exception in parallel execution: {str(e)}",
-                        "tb_file": str(tb_file)
-                    })
+                    results.append(SimulationResult.failure(
+                        f"Exception in parallel execution: {str(e)}", tb_file=str(tb_file)
+                    ))
         
         return results
     
-    def parse_metrics(self, stdout: str, metric_keywords: Optional[List[str]] = None) -> Dict[str, Any]:
-        """Parse metrics from ngspice output using improved regex patterns"""
+    def parse_metrics(self, stdout: str, metric_keywords: Optional[List[str]] = None, 
+                      name: str = "simulation", stderr: Optional[str] = None) -> SimulationResult:
+        """Parse metrics from ngspice output using improved regex patterns
+
+        Metrics come from stdout only; stderr, where `ngspice -b` reports
+        convergence failures, is appended to the log.
+        """
         metrics = {}
         
         # Common metric patterns from SPICE echo statements
@@ -92,10 +160,12 @@ class SimulationRunner:
             filtered_metrics = {k: v for k, v in metrics.items() if k in metric_keywords}
             metrics = filtered_metrics
         
-        # Include stdout for debugging if no metrics found
+        # Spill the output to disk for debugging if no metrics found
+        output = f"{stdout}\n{stderr}" if stderr else stdout
         if not metrics:
-            return {"error": "No metrics found", "stdout": stdout}
+            return SimulationResult.failure("No metrics found", SimulationStatus.NO_METRICS,
+                                            log_path=write_log(output, self.logs, name))
         
-        # Include stdout for debugging (but don't treat as error since we found metrics)
-        metrics["stdout"] = stdout
-        return metrics
+        # Successful runs only keep their output when asked to
+        log_path = write_log(output, self.logs, name) if self.keep_logs else None
+        return SimulationResult.from_metrics(metrics, log_path=log_path)
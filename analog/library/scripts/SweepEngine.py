@@ -0,0 +1,236 @@
+import os
+import sys
+import json
+import shutil
+import itertools
+import numpy as np
+from pathlib import Path
+from typing import List, Dict, Optional, Union, Any, Iterator, Sequence
+from scipy.stats import qmc
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, CURRENT_DIR)
+from XSchemInterface import XSchemInterface, build_and_simulate_variants
+from XSchemVariantOptimizer import ParameterBound, apply_sky130_drc
+from SimulationRunner import SimulationRunner
+from TestScheduler import test_metrics
+from GeometryMetrics import GEOMETRY_METRICS, area_devices, geometry_metrics
+
+
+class SweepStore:
+    """Columnar sweep results on disk: numbered NPZ chunks plus a JSON manifest
+
+    Every chunk holds one array per column ("index", "p.<comp>.<param>",
+    "m.<metric>", "s.<test>"), so a single column can be read across the whole
+    sweep without loading the rest. Chunks are written before the manifest
+    lists them, and both are replaced atomically, so an interrupted sweep
+    resumes from the last completed chunk.
+    """
+
+    MANIFEST = "manifest.json"
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.manifest: Dict[str, Any] = {}
+        manifest_file = self.path / self.MANIFEST
+        if manifest_file.exists():
+            with open(manifest_file, 'r', encoding='utf-8') as f:
+                self.manifest = json.load(f)
+
+    def initialise(self, parameters: List[str], metrics: List[str], tests: List[str]) -> None:
+        """Create the store, or check that an existing one has the same columns"""
+        columns = {"parameters": parameters, "metrics": metrics, "tests": tests}
+        if self.manifest:
+            existing = {key: self.manifest[key] for key in columns}
+            if existing != columns:
+                raise ValueError(f"{self.path} holds a different sweep: {existing}")
+            return
+        self.manifest = {**columns, "rows": 0, "chunks": []}
+        self._write_manifest()
+
+    def _write_manifest(self) -> None:
+        self.path.mkdir(parents=True, exist_ok=True)
+        tmp = self.path / f"{self.MANIFEST}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp, self.path / self.MANIFEST)
+
+    @property
+    def rows(self) -> int:
+        return self.manifest.get("rows", 0)
+
+    def append(self, params: np.ndarray, metrics: np.ndarray, status: np.ndarray) -> Path:
+        """Write one chunk of rows and register it in the manifest"""
+        chunk = self.path / f"chunk_{len(self.manifest['chunks']):05d}.npz"
+        columns = {"index": np.arange(self.rows, self.rows + len(params), dtype=np.int64)}
+        columns.update({f"p.{name}": params[:, i] for i, name in enumerate(self.manifest["parameters"])})
+        columns.update({f"m.{name}": metrics[:, i] for i, name in enumerate(self.manifest["metrics"])})
+        columns.update({f"s.{name}": status[:, i] for i, name in enumerate(self.manifest["tests"])})
+
+        tmp = chunk.with_suffix(".tmp.npz")
+        np.savez_compressed(tmp, **columns)
+        os.replace(tmp, chunk)
+        self.manifest["chunks"].append({"file": chunk.name, "rows": len(params)})
+        self.manifest["rows"] = self.rows + len(params)
+        self._write_manifest()
+        return chunk
+
+    def iter_chunks(self, columns: Optional[Sequence[str]] = None) -> Iterator[Dict[str, np.ndarray]]:
+        """Chunks in order, restricted to the requested columns"""
+        for chunk in self.manifest.get("chunks", []):
+            with np.load(self.path / chunk["file"]) as data:
+                names = columns or data.files
+                yield {name: data[name] for name in names}
+
+    def column(self, name: str) -> np.ndarray:
+        """One column across every chunk; names are e.g. "m.DC_GAIN" or "p.M1.W" """
+        parts = [chunk[name] for chunk in self.iter_chunks([name])]
+        return np.concatenate(parts) if parts else np.empty(0)
+
+    def parameter_matrix(self) -> np.ndarray:
+        """Stored parameter rows, used to skip points that are already done"""
+        names = [f"p.{name}" for name in self.manifest.get("parameters", [])]
+        parts = [np.column_stack([chunk[name] for name in names]) for chunk in self.iter_chunks(names)]
+        return np.concatenate(parts) if parts else np.empty((0, len(names)))
+
+
+class SweepEngine:
+    """Design-of-experiments sweeps over ParameterBound spaces
+
+    Points come from a full grid, a Latin hypercube or a scrambled Sobol
+    sequence, are snapped to the SKY130 rules the optimizer uses and
+    deduplicated, then built and simulated in chunks through
+    build_and_simulate_variants with any simulation backend. Each finished
+    chunk is appended to a SweepStore and its variant folders are removed, so
+    memory and disk use stay bounded by the chunk size. Running again with the
+    same or more points skips everything already stored.
+    """
+
+    def __init__(self, circuit_type: str, tests: Dict[str, Dict[str, Any]], template_dir: str,
+                 bounds: List[ParameterBound], base_params: Dict[str, Dict[str, str]],
+                 output_dir: Union[str, Path], metrics: Optional[List[str]] = None,
+                 simulator: Optional[SimulationRunner] = None, max_workers: Optional[int] = None,
+                 chunk_size: int = 64):
+        """
+        Args:
+            circuit_type: Circuit type (e.g., "OpAmp")
+            tests: Test configurations {test_name: {config}}
+            template_dir: Template directory, relative to the working directory
+            bounds: Swept parameters and their ranges
+            base_params: Values of everything that is not swept
+            output_dir: SweepStore directory
+            metrics: Metrics to record (default: every metric the tests echo)
+            simulator: Simulation backend (default: local SimulationRunner)
+            max_workers: Concurrent build/simulate jobs per chunk
+            chunk_size: Points simulated and written per chunk
+        """
+        self.circuit_type = circuit_type
+        self.tests = tests
+        self.template_dir = template_dir
+        self.bounds = bounds
+        self.base_params = base_params
+        self.metrics = metrics or list(dict.fromkeys(m for config in tests.values() for m in test_metrics(config)))
+        self.simulator = simulator or SimulationRunner()
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
+        self.store = SweepStore(output_dir)
+
+        # Geometry-only tests are computed from the parameters, as in CircuitOptimizer
+        self.geometry_tests = {name: area_devices(config) for name, config in tests.items()
+                               if test_metrics(config) and set(test_metrics(config)) <= set(GEOMETRY_METRICS)}
+        self.simulated_tests = {name: config for name, config in tests.items() if name not in self.geometry_tests}
+        self._template_components = None
+
+    @property
+    def parameter_names(self) -> List[str]:
+        return [f"{bound.component}.{bound.parameter}" for bound in self.bounds]
+
+    # Sampling ----------------------------------------------------------
+
+    def _scale(self, unit: np.ndarray) -> np.ndarray:
+        lower = np.array([bound.min_value for bound in self.bounds])
+        upper = np.array([bound.max_value for bound in self.bounds])
+        return qmc.scale(unit, lower, upper)
+
+    def grid(self, levels: Union[int, Sequence[int]]) -> np.ndarray:
+        """Full factorial grid with `levels` values per parameter (or one count per parameter)"""
+        counts = [levels] * len(self.bounds) if isinstance(levels, int) else list(levels)
+        axes = [np.linspace(bound.min_value, bound.max_value, count) for bound, count in zip(self.bounds, counts)]
+        return np.array(list(itertools.product(*axes)))
+
+    def latin_hypercube(self, n: int, seed: Optional[int] = 0) -> np.ndarray:
+        return self._scale(qmc.LatinHypercube(d=len(self.bounds), seed=seed).random(n))
+
+    def sobol(self, n: int, seed: Optional[int] = 0, skip: int = 0) -> np.ndarray:
+        """Scrambled Sobol points; `skip` continues an earlier sequence with the same seed"""
+        sampler = qmc.Sobol(d=len(self.bounds), scramble=True, seed=seed)
+        if skip:
+            sampler.fast_forward(skip)
+        return self._scale(sampler.random(n))
+
+    def prepare(self, points: np.ndarray) -> np.ndarray:
+        """Snap points to the SKY130 rules and drop duplicates, keeping first-seen order"""
+        snapped = apply_sky130_drc(np.atleast_2d(points), self.bounds)
+        _, first = np.unique(snapped, axis=0, return_index=True)
+        return snapped[np.sort(first)]
+
+    # Execution ---------------------------------------------------------
+
+    def _params(self, x: np.ndarray) -> Dict[str, Dict[str, str]]:
+        params = {comp: dict(values) for comp, values in self.base_params.items()}
+        for value, bound in zip(x, self.bounds):
+            params.setdefault(bound.component, {})[bound.parameter] = f"{round(float(value), 4):g}"
+        return params
+
+    def _geometry(self, params: Dict[str, Dict[str, str]]) -> Dict[str, float]:
+        if self._template_components is None:
+            template = Path(self.template_dir) / f"{self.circuit_type}.sch"
+            self._template_components = XSchemInterface.load(template, cached=True).components  # read only
+        values = {}
+        for names in self.geometry_tests.values():
+            values.update(geometry_metrics(self._template_components, params, names or None))
+        return values
+
+    def _run_chunk(self, points: np.ndarray, first_index: int) -> None:
+        names = [f"sweep{first_index + k}" for k in range(len(points))]
+        params = {name: self._params(x) for name, x in zip(names, points)}
+        results = build_and_simulate_variants(
+            {name: {"short": name, "params": params[name]} for name in names},
+            self.simulated_tests, self.circuit_type, self.template_dir,
+            units_map={metric: "" for metric in self.metrics}, with_documentation=False,
+            simulator=self.simulator, max_workers=self.max_workers
+        )
+
+        tests = list(self.tests)
+        metrics = np.full((len(points), len(self.metrics)), np.nan)
+        status = np.zeros((len(points), len(tests)), dtype=np.int8)
+        for row, name in enumerate(names):
+            values = self._geometry(params[name]) if self.geometry_tests else {}
+            for column, test in enumerate(tests):
+                result = results[name].get(test)
+                if result is None:
+                    continue
+                status[row, column] = int(result.status)
+                values.update({metric: result[metric] for metric in self.metrics
+                               if metric in result and isinstance(result[metric], (int, float))})
+            metrics[row] = [values.get(metric, np.nan) for metric in self.metrics]
+            shutil.rmtree(f"{self.circuit_type}_{name}", ignore_errors=True)
+
+        self.store.append(points, metrics, status)
+
+    def run(self, points: np.ndarray, progress: bool = True) -> SweepStore:
+        """Simulate every point not already in the store, appending results chunk by chunk"""
+        self.store.initialise(self.parameter_names, self.metrics, list(self.tests))
+        points = self.prepare(points)
+
+        done = {row.tobytes() for row in self.store.parameter_matrix()}
+        todo = np.array([x for x in points if x.tobytes() not in done]).reshape(-1, len(self.bounds))
+        if progress:
+            print(f"Sweep: {len(points)} unique points, {len(points) - len(todo)} already stored, "
+                  f"{len(todo)} to run")
+
+        for start in range(0, len(todo), self.chunk_size):
+            self._run_chunk(todo[start:start + self.chunk_size], self.store.rows)
+            if progress:
+                print(f"  {min(start + self.chunk_size, len(todo))}/{len(todo)} points")
+        return self.store
@@ -0,0 +1,192 @@
+import os
+import re
+import sys
+import copy
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from typing import List, Dict, Optional, Union, Tuple, Iterator
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, CURRENT_DIR)
+from XSchemParser import XSchemParser
+from Grammar import *
+
+DEFAULT_XSCHEMRC = Path(CURRENT_DIR).parent.parent / "build" / "schematic" / "xschemrc"
+
+
+class ParseCache:
+    """LRU cache of parsed XSchem files keyed by path, mtime and size
+
+    Cached object lists are shared between every caller and must be treated
+    as read-only; XSchemInterface copies an object before changing it.
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, Tuple[int, int, Tuple[XSchemObject, ...]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._parser = XSchemParser()
+        self.hits = 0
+        self.misses = 0
+
+    def objects(self, path: Union[str, Path]) -> Tuple[XSchemObject, ...]:
+        """Parsed objects of a file, reparsed only when its mtime or size changed"""
+        key = os.path.abspath(path)
+        stat = os.stat(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+
+        # Parse outside the lock so threads loading different files do not serialise
+        objects = tuple(self._parser.parse_file(key))
+        with self._lock:
+            self._entries[key] = (stat.st_mtime_ns, stat.st_size, objects)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return objects
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Shared by every XSchemInterface.load and SymbolResolver in the process
+PARSE_CACHE = ParseCache()
+
+
+def writable_copy(obj: XSchemObject) -> XSchemObject:
+    """Copy of a shared object whose properties and point lists can be changed safely"""
+    clone = copy.copy(obj)
+    for name, value in vars(obj).items():
+        if isinstance(value, (dict, list)):
+            setattr(clone, name, copy.copy(value))
+    return clone
+
+
+def read_search_path(xschemrc: Union[str, Path], variables: Optional[Dict[str, str]] = None) -> List[Path]:
+    """XSCHEM_LIBRARY_PATH as an xschemrc builds it
+
+    Understands the subset of Tcl the project and PDK rc files use: set,
+    append, source, $env(NAME), $name/${name}, [file dirname [info script]]
+    and [file normalize ...].
+    """
+    variables = dict(variables or {})
+    _run_rc(Path(xschemrc), variables)
+    paths = []
+    for entry in variables.get("XSCHEM_LIBRARY_PATH", "").split(":"):
+        if entry and Path(entry).is_dir() and Path(entry).resolve() not in paths:
+            paths.append(Path(entry).resolve())
+    return paths
+
+
+def _substitute(text: str, script: Path, variables: Dict[str, str]) -> str:
+    text = text.replace("[file dirname [info script]]", str(script.parent))
+    text = re.sub(r"\$env\((\w+)\)", lambda m: os.environ.get(m.group(1), ""), text)
+    text = re.sub(r"\$\{(\w+)\}|\$(\w+)", lambda m: variables.get(m.group(1) or m.group(2), ""), text)
+    text = re.sub(r'\[file normalize\s+"?([^"\]]*)"?\]', lambda m: os.path.normpath(m.group(1)), text)
+    return text.strip().strip('"')
+
+
+def _run_rc(script: Path, variables: Dict[str, str]) -> None:
+    if not script.is_file():
+        return
+    for line in script.read_text(encoding='utf-8', errors='replace').splitlines():
+        words = line.strip().split(None, 2)
+        if len(words) < 2 or words[0].startswith("#"):
+            continue
+        if words[0] == "source":
+            _run_rc(Path(_substitute(words[1], script, variables)), variables)
+        elif words[0] in ("set", "append") and len(words) == 3:
+            value = _substitute(words[2], script, variables)
+            variables[words[1]] = variables.get(words[1], "") + value if words[0] == "append" else value
+
+
+class SymbolResolver:
+    """Finds and loads the symbols a schematic references, like xschem does
+
+    References are tried as given, then against each search path in order.
+    Resolutions are memoised and parsed files come from the shared
+    ParseCache, so walking the same hierarchy again costs only stat calls.
+    """
+
+    def __init__(self, search_paths: Optional[List[Union[str, Path]]] = None,
+                 xschemrc: Optional[Union[str, Path]] = None, cache: Optional[ParseCache] = None):
+        """
+        Args:
+            search_paths: Library directories searched in order
+            xschemrc: rc file to read XSCHEM_LIBRARY_PATH from (default: build/schematic/xschemrc
+                when no search_paths are given)
+            cache: Parsed-file cache (default: the process-wide PARSE_CACHE)
+        """
+        self.search_paths = [Path(p).resolve() for p in search_paths or []]
+        if xschemrc is not None or not search_paths:
+            self.search_paths += [p for p in read_search_path(xschemrc or DEFAULT_XSCHEMRC)
+                                  if p not in self.search_paths]
+        self.cache = cache or PARSE_CACHE
+        self._resolved: Dict[Tuple[str, str], Optional[Path]] = {}
+
+    def resolve(self, reference: str, relative_to: Optional[Union[str, Path]] = None) -> Optional[Path]:
+        """Absolute path of a symbol or schematic reference, or None if it is not found"""
+        base = str(relative_to or "")
+        key = (reference, base)
+        if key not in self._resolved:
+            candidates = [Path(reference)] if os.path.isabs(reference) else \
+                ([Path(base) / reference] if base else []) + [root / reference for root in self.search_paths]
+            self._resolved[key] = next((c.resolve() for c in candidates if c.is_file()), None)
+        return self._resolved[key]
+
+    def load(self, reference: str, relative_to: Optional[Union[str, Path]] = None) -> Tuple[XSchemObject, ...]:
+        """Shared, read-only parsed objects of a reference"""
+        path = self.resolve(reference, relative_to)
+        if path is None:
+            raise FileNotFoundError(f"Symbol {reference} not found in {[str(p) for p in self.search_paths]}")
+        return self.cache.objects(path)
+
+    def pins(self, reference: str) -> List[Dict[str, str]]:
+        """Pins of a symbol in declaration order"""
+        return [{"name": obj.properties["name"], "dir": obj.properties.get("dir", "inout")}
+                for obj in self.load(reference)
+                if isinstance(obj, Rectangle) and obj.layer == 5 and "name" in obj.properties]
+
+    def schematic_for(self, symbol: str) -> Optional[Path]:
+        """Schematic behind a subcircuit symbol (same name, .sch), if there is one"""
+        path = self.resolve(symbol)
+        if path is None or path.suffix != ".sym":
+            return None
+        schematic = path.with_suffix(".sch")
+        return schematic if schematic.is_file() else None
+
+    def walk(self, schematic: Union[str, Path]) -> Iterator[Tuple[Path, Component, Optional[Path]]]:
+        """(schematic, instance, resolved symbol) for every instance in the hierarchy
+
+        Each distinct schematic is visited once, however often it is instantiated.
+        """
+        pending, visited = [Path(schematic).resolve()], set()
+        while pending:
+            current = pending.pop()
+            if current in visited:
+                continue
+            visited.add(current)
+            for obj in self.cache.objects(current):
+                if not isinstance(obj, Component):
+                    continue
+                symbol = self.resolve(obj.symbolReference, current.parent)
+                yield current, obj, symbol
+                if symbol is not None and symbol.suffix == ".sym":
+                    child = symbol.with_suffix(".sch")
+                    if child.is_file() and child not in visited:
+                        pending.append(child)
+
+    def clear(self) -> None:
+        """Forget memoised resolutions, e.g. after files were added to the search paths"""
+        self._resolved.clear()
@@ -0,0 +1,144 @@
+import os
+import re
+import sys
+import json
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Dict, Optional, Union, Any, Mapping, Tuple
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, CURRENT_DIR)
+from SimulationRunner import SimulationRunner
+
+# Relative cost of each analysis, used until a test has run history
+ANALYSIS_COST = {".op": 1.0, ".dc": 2.0, ".ac": 3.0, ".noise": 6.0, ".tf": 1.0, ".tran": 10.0}
+ANALYSIS_PATTERN = re.compile(r"^\s*(\.\w+)", re.MULTILINE)
+ECHO_PATTERN = re.compile(r"echo\s+'([A-Z_]+):'")
+
+
+def test_metrics(test_config: Dict[str, Any]) -> List[str]:
+    """Metrics a test echoes, read from its SPICE control block"""
+    return ECHO_PATTERN.findall(test_config.get("spice", ""))
+
+
+def estimate_cost(test_config: Dict[str, Any]) -> float:
+    """Heuristic cost of a test from the analyses it runs"""
+    analyses = ANALYSIS_PATTERN.findall(test_config.get("spice", ""))
+    return sum(ANALYSIS_COST.get(analysis.lower(), 0.0) for analysis in analyses) or 1.0
+
+
+@dataclass
+class HardConstraint:
+    """A metric bound that makes a candidate hopeless when missed by more than `slack`
+
+    An exact target is never met to the last bit of a float, so it is only
+    violated beyond `exact_tolerance` (relative) even with no slack.
+    """
+    metric: str
+    limit: float
+    constraint_type: str = "min"
+    slack: float = 0.0
+    exact_tolerance: float = 0.1
+
+    @classmethod
+    def from_target(cls, target, slack: float = 0.0) -> 'HardConstraint':
+        return cls(target.metric, target.target_value, target.constraint_type, slack)
+
+    def violated(self, value: float) -> bool:
+        margin = abs(self.limit) * self.slack
+        if self.constraint_type == "min":
+            return value < self.limit - margin
+        if self.constraint_type == "max":
+            return value > self.limit + margin
+        return abs(value - self.limit) > abs(self.limit) * max(self.slack, self.exact_tolerance)
+
+
+class RuntimeHistory:
+    """Per-test runtime estimates, an exponentially weighted mean kept in a JSON file"""
+
+    def __init__(self, path: Optional[Union[str, Path]] = None, alpha: float = 0.3):
+        self.path = Path(path) if path else Path(SimulationRunner.BUILD_DIR) / "test_runtimes.json"
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        self.runtimes: Dict[str, float] = {}
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.runtimes = json.load(f)
+
+    def get(self, key: str) -> Optional[float]:
+        return self.runtimes.get(key)
+
+    def record(self, key: str, seconds: float) -> None:
+        with self._lock:
+            previous = self.runtimes.get(key)
+            self.runtimes[key] = seconds if previous is None else \
+                self.alpha * seconds + (1 - self.alpha) * previous
+
+    def save(self) -> None:
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(self.runtimes, f, indent=2, sort_keys=True)
+            os.replace(tmp, self.path)
+
+
+class TestScheduler:
+    """Orders a candidate's tests by expected cost and stops early on hopeless candidates
+
+    Tests that measure a hard-constrained metric are gates: they are submitted
+    first, cheapest first. The remaining tests are held back until every gate
+    has passed and are then submitted longest first, so the long decks start
+    early and short ones fill the workers around them. Once a gate misses a
+    hard constraint, the held-back tests are skipped.
+    """
+
+    def __init__(self, constraints: Optional[List[HardConstraint]] = None,
+                 history: Optional[RuntimeHistory] = None):
+        self.constraints = constraints or []
+        self.history = history or RuntimeHistory()
+
+    @staticmethod
+    def _key(circuit_type: str, test_name: str) -> str:
+        return f"{circuit_type}/{test_name}"
+
+    def costs(self, circuit_type: str, tests: Dict[str, Dict[str, Any]]) -> Dict[str, float]:
+        """Expected runtime of each test in seconds
+
+        Tests without history fall back to the analysis heuristic, scaled to
+        seconds by how the tests that do have history compare to it.
+        """
+        estimates = {name: estimate_cost(config) for name, config in tests.items()}
+        measured = {name: self.history.get(self._key(circuit_type, name)) for name in tests}
+        ratios = [measured[name] / estimates[name] for name in tests if measured[name] is not None]
+        seconds_per_unit = sum(ratios) / len(ratios) if ratios else 1.0
+        return {name: measured[name] if measured[name] is not None else estimates[name] * seconds_per_unit
+                for name in tests}
+
+    def plan(self, circuit_type: str, tests: Dict[str, Dict[str, Any]]) -> Tuple[List[str], List[str]]:
+        """Split tests into (gates cheapest first, remaining tests longest first)"""
+        hard_metrics = {constraint.metric for constraint in self.constraints}
+        costs = self.costs(circuit_type, tests)
+
+        gates = [name for name, config in tests.items() if hard_metrics & set(test_metrics(config))]
+        rest = [name for name in tests if name not in gates]
+        gates.sort(key=costs.get)
+        rest.sort(key=costs.get, reverse=True)
+        return gates, rest
+
+    def violations(self, result: Mapping[str, Any]) -> List[str]:
+        """Hard constraints a finished test misses"""
+        messages = []
+        for constraint in self.constraints:
+            value = result.get(constraint.metric)
+            if isinstance(value, (int, float)) and constraint.violated(value):
+                messages.append(f"{constraint.metric}={value:g} misses hard "
+                                f"{constraint.constraint_type} {constraint.limit:g}")
+        return messages
+
+    def record(self, circuit_type: str, test_name: str, seconds: float) -> None:
+        self.history.record(self._key(circuit_type, test_name), seconds)
+
+    def save(self) -> None:
+        self.history.save()
@@ -1,71 +1,147 @@
 import os
 import sys
 import re
+import time
 from pathlib import Path
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Iterable
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, CURRENT_DIR)
 from XSchemWriter import XSchemWriter
 from XSchemParser import XSchemParser
 from SimulationRunner import SimulationRunner
+from SimulationResult import SimulationResult, SimulationStatus
+from TestScheduler import TestScheduler
+from SymbolResolver import PARSE_CACHE, SymbolResolver, writable_copy
+from Connectivity import Connectivity
+from EvaluationStore import EvaluationStore
 from DocumentationGenerator import DocumentationGenerator
 from Grammar import *
 
 
 class XSchemInterface:
-    """Main interface for working with XSchem schematic files"""
+    """Main interface for working with XSchem schematic files
+    
+    With load(cached=True) the objects are shared with the parse cache and
+    other instances of the same file. The methods of this class copy an
+    object before changing it, but `components` holds the shared objects,
+    so such an instance must not edit them in place.
+    """
     
     def __init__(self, components: Optional[List[XSchemObject]] = None):
         self.components = components or []
         self._parser = XSchemParser()
         self._writer = XSchemWriter()
+        self._shared = set()
+        self._connectivity: Optional[Connectivity] = None
+        self.path: Optional[Path] = None
     
     @classmethod
-    def load(cls, file_path: Path) -> 'XSchemInterface':
-        """Load schematic from file"""
+    def load(cls, file_path: Path, cached: bool = False, include: Optional[Iterable] = None) -> 'XSchemInterface':
+        """Load schematic from file, optionally reusing the parse of an unchanged file
+        
+        cached=True skips the parse but shares the objects process-wide: only
+        change them through the methods of this class (find_*, update_*,
+        move_component), which copy on write.
+        
+        With include (object classes or command letters, e.g. [Component]) only
+        those objects are built; the rest are kept as Unparsed text, which
+        save() writes back exactly as it was read.
+        """
         instance = cls()
-        instance.components = instance._parser.parse_file(file_path)
+        instance.path = Path(file_path)
+        if include is not None:
+            instance.components = instance._parser.parse_file(file_path, include, lazy=True)
+        elif cached:
+            shared = PARSE_CACHE.objects(file_path)
+            instance.components = list(shared)
+            instance._shared = {id(obj) for obj in shared}
+        else:
+            instance.components = instance._parser.parse_file(file_path)
         return instance
     
+    def _writable(self, index: int) -> XSchemObject:
+        """Copy-on-write: replace a shared object by a private copy before it is handed out"""
+        obj = self.components[index]
+        if id(obj) in self._shared:
+            self._shared.discard(id(obj))
+            shared, obj = obj, writable_copy(obj)
+            self.components[index] = obj
+            if self._connectivity is not None:
+                self._connectivity.replace(shared, obj)
+        return obj
+    
+    def _append(self, obj: XSchemObject) -> None:
+        self.components.append(obj)
+        if self._connectivity is not None:
+            self._connectivity.add(obj)
+    
+    def _remove(self, obj: XSchemObject) -> None:
+        self.components.remove(obj)
+        if self._connectivity is not None:
+            self._connectivity.remove(obj)
+    
+    def connectivity(self, resolver: Optional[SymbolResolver] = None) -> Connectivity:
+        """Spatial net index of this schematic, kept current by add_component and move_component"""
+        if self._connectivity is None:
+            base_dir = self.path.parent if self.path is not None else None
+            self._connectivity = Connectivity(self.components, resolver, base_dir)
+        return self._connectivity
+    
     def save(self, file_path: Path) -> None:
         """Save schematic to file"""
         self._writer.write_file(self.components, file_path)
     
     def find_component_by_symbol(self, symbol_ref: str) -> Optional[Component]:
         """Find first component with matching symbol reference"""
-        for comp in self.components:
+        for i, comp in enumerate(self.components):
             if isinstance(comp, Component) and comp.symbolReference == symbol_ref:
-                return comp
+                return self._writable(i)
         return None
     
     def find_component_by_name(self, name: str) -> Optional[Component]:
         """Find component by name"""
-        for comp in self.components:
+        for i, comp in enumerate(self.components):
             if isinstance(comp, Component) and comp.properties.get("name") == name:
-                return comp
+                return self._writable(i)
         return None
     
     def find_components_by_pattern(self, pattern: str) -> List[Component]:
         """Find components whose names match the regex pattern"""
         compiled_pattern = re.compile(pattern)
-        return [comp for comp in self.components 
+        return [self._writable(i) for i, comp in enumerate(self.components) 
                 if isinstance(comp, Component) and 
                 comp.properties.get("name") and 
                 compiled_pattern.search(comp.properties["name"])]
     
-    def ensure_spice_setup(self) -> Component:
-        """Ensure required SPICE simulation components exist"""
+    def ensure_spice_setup(self, model_deck: Optional[Path] = None) -> Component:
+        """Ensure required SPICE simulation components exist
+        
+        With a model_deck (see ModelReducer) the testbench includes that reduced
+        deck instead of the full corner library from corner.sym.
+        """
         SPICE_CORNER_SYMBOL = "sky130_fd_pr/corner.sym"
         SPICE_CODE_SYMBOL = "devices/code_shown.sym"
-        # Check corner component
-        if not self.find_component_by_symbol(SPICE_CORNER_SYMBOL):
+        SPICE_MODELS_SYMBOL = "devices/code.sym"
+        corner = self.find_component_by_symbol(SPICE_CORNER_SYMBOL)
+        if model_deck is not None:
+            # Swap the corner library for the reduced deck
+            if corner:
+                self._remove(corner)
+            models = self.find_component_by_name("MODELS")
+            if not models:
+                models = self.add_component("MODELS", SPICE_MODELS_SYMBOL, 300.0, -100.0,
+                                            {"only_toplevel": "false", "place": "header"})
+            models.properties["value"] = f".include {Path(model_deck).resolve()}"
+        elif not corner:
+            # Check corner component
             corner = Component(
                 symbolReference=SPICE_CORNER_SYMBOL,
                 x=300.0, y=-100.0, rotation=0, flip=0,
                 properties={"name": "CORNER", "only_toplevel": "false", "corner": "tt"}
             )
-            self.components.append(corner)
+            self._append(corner)
         
         # Check SPICE code component
         spice_code = self.find_component_by_symbol(SPICE_CODE_SYMBOL)
@@ -75,7 +151,7 @@ class XSchemInterface:
                 x=240.0, y=120.0, rotation=0, flip=0,
                 properties={"name": "s1", "only_toplevel": "false", "value": ""}
             )
-            self.components.append(spice_code)
+            self._append(spice_code)
         
         return spice_code
     
@@ -97,13 +173,29 @@ class XSchemInterface:
             properties=comp_properties
         )
         
-        self.components.append(component)
+        self._append(component)
         return component
+    
+    def move_component(self, name: str, x: Optional[float] = None, y: Optional[float] = None,
+                       rotation: Optional[int] = None, flip: Optional[int] = None) -> bool:
+        """Move, rotate or flip a named component, keeping the net index current"""
+        component = self.find_component_by_name(name)
+        if component is None:
+            return False
+        changes = {key: value for key, value in
+                   {"x": x, "y": y, "rotation": rotation, "flip": flip}.items() if value is not None}
+        if self._connectivity is not None:
+            self._connectivity.move(component, **changes)
+        else:
+            for key, value in changes.items():
+                setattr(component, key, value)
+        return True
 
 
 def create_variant(circuit_type: str, variant_name: str, config: Dict[str, Any], 
-                   tests: Dict[str, Dict[str, Any]], template_dir: str) -> tuple[str, str]:
-    """Create complete circuit variant with testbenches"""
+                   tests: Dict[str, Dict[str, Any]], template_dir: str,
+                   model_deck: Optional[Path] = None) -> tuple[str, str]:
+    """Create complete circuit variant with testbenches, optionally on a reduced model deck"""
     folder = f"{circuit_type}_{variant_name}"
     short = config["short"]
     
@@ -111,21 +203,21 @@ def create_variant(circuit_type: str, variant_name: str, config: Dict[str, Any],
     
     # Build main schematic
     template = Path(f"{template_dir}/{circuit_type}.sch")
-    schematic = XSchemInterface.load(template)
+    schematic = XSchemInterface.load(template, cached=True)
     for comp_name, properties in config["params"].items():
         schematic.update_component_properties(comp_name, properties)
     schematic.save(Path(f"{folder}/{circuit_type}_{short}.sch"))
     
     # Copy symbol
     symbol_template = Path(f"{template_dir}/{circuit_type}.sym")
-    symbol = XSchemInterface.load(symbol_template)
+    symbol = XSchemInterface.load(symbol_template, cached=True)
     symbol.save(Path(f"{folder}/{circuit_type}_{short}.sym"))
     
     # Build testbenches
     template_tb = Path(f"{template_dir}/{circuit_type}_tb.sch")
     
     for test_name, test_config in tests.items():
-        testbench = XSchemInterface.load(template_tb)
+        testbench = XSchemInterface.load(template_tb, cached=True)
         
         # Update DUT reference
         old_ref = f"{circuit_type}s/template/{circuit_type}.sym"
@@ -134,10 +226,13 @@ def create_variant(circuit_type: str, variant_name: str, config: Dict[str, Any],
         if dut:
             dut.symbolReference = new_ref
         
+        if model_deck is not None:
+            testbench.ensure_spice_setup(model_deck)
+        
         # Configure test setup
         for key, value in test_config.items():
             if key == "spice":
-                spice_comp = testbench.ensure_spice_setup()
+                spice_comp = testbench.ensure_spice_setup(model_deck)
                 spice_comp.properties["value"] = value
             else:
                 comp_name = key.split('_')[-1].upper() if '_' in key else key.upper()
@@ -150,15 +245,33 @@ def create_variant(circuit_type: str, variant_name: str, config: Dict[str, Any],
     return folder, short
 
 
+def _timed_simulation(simulator: SimulationRunner, tb_file: str,
+                      metric_keywords: List[str]) -> tuple[SimulationResult, float]:
+    start = time.perf_counter()
+    result = simulator.run_simulation(tb_file, metric_keywords=metric_keywords)
+    result.runtime = time.perf_counter() - start
+    return result, result.runtime
+
+
 def build_and_simulate_variants(variants: Dict[str, Dict[str, Any]], 
                                tests: Dict[str, Dict[str, Any]], 
                                circuit_type: str,
                                template_dir: str,
                                units_map: Dict[str, str],
-                               with_documentation: bool = True) -> Dict[str, Dict[str, Any]]:
+                               with_documentation: bool = True,
+                               simulator: Optional[SimulationRunner] = None,
+                               max_workers: Optional[int] = None,
+                               model_deck: Optional[Path] = None,
+                               scheduler: Optional[TestScheduler] = None,
+                               store: Optional[EvaluationStore] = None) -> Dict[str, Dict[str, Any]]:
     """
     Complete workflow: build variants, simulate, and generate docs
     
+    Building, simulating and documenting run as overlapping stages on one
+    worker pool: a variant's tests start as soon as that variant is built and
+    its README is written as soon as its last test finishes. With a scheduler,
+    tests on hard-constrained metrics run first and gate the rest.
+    
     Args:
         variants: Variant specifications {name: {short: str, params: dict}}
         tests: Test configurations {test_name: {config}}
@@ -166,29 +279,94 @@ def build_and_simulate_variants(variants: Dict[str, Dict[str, Any]],
         template_dir: Template directory
         units_map: Metric units mapping for documentation
         with_documentation: Whether to generate documentation
+        simulator: Simulation backend, e.g. a QueueSimulationRunner (default: local SimulationRunner)
+        max_workers: Maximum concurrent pipeline jobs (default: CPU count)
+        model_deck: Reduced model deck to include instead of corner.sym (see ModelReducer)
+        scheduler: Orders each variant's tests by learned cost and skips the
+            expensive ones once a hard constraint is missed (default: declared order)
+        store: Evaluation database that records every finished variant
 
     Returns:
         Simulation results for all variants
     """
-    simulator = SimulationRunner()
-    results = {}
+    simulator = simulator or SimulationRunner()
     metric_keywords = list(units_map.keys())
+    results: Dict[str, Dict[str, Any]] = {name: {} for name in variants}
     
-    for name, info in variants.items():
-        folder, short = create_variant(circuit_type, name, info, tests, template_dir)
-
-        variant_results = {}
-        for test_name in tests:
-            tb_file = f"{folder}/tb/{circuit_type}_{short}_{test_name}_tb.sch"
-            variant_results[test_name] = simulator.run_simulation(tb_file, metric_keywords=metric_keywords)
+    with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+        # future -> (stage, variant name, test name)
+        pending = {
+            executor.submit(create_variant, circuit_type, name, info, tests, template_dir,
+                            model_deck): ("build", name, None)
+            for name, info in variants.items()
+        }
+        built = {}
+        # variant -> (tests held back, gates still running, hard constraint misses)
+        held = {}
         
-        # Generate documentation
-        if with_documentation:
-            DocumentationGenerator.create_readme(
-                folder, name, short, info["params"], variant_results, 
-                circuit_type, units_map
-            )
+        def submit_tests(name, test_names):
+            folder, short = built[name]
+            for test in test_names:
+                tb_file = f"{folder}/tb/{circuit_type}_{short}_{test}_tb.sch"
+                job = executor.submit(_timed_simulation, simulator, tb_file, metric_keywords)
+                pending[job] = ("simulate", name, test)
         
-        results[name] = variant_results
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, name, test_name = pending.pop(future)
+                
+                if stage == "build":
+                    built[name] = future.result()
+                    if scheduler is None:
+                        submit_tests(name, tests)
+                    else:
+                        gates, rest = scheduler.plan(circuit_type, tests)
+                        if gates:
+                            held[name] = (rest, len(gates), [])
+                        submit_tests(name, gates or rest)
+                
+                elif stage == "simulate":
+                    result, seconds = future.result()
+                    results[name][test_name] = result
+                    if scheduler is not None:
+                        if result.ok:
+                            scheduler.record(circuit_type, test_name, seconds)
+                        if name in held:
+                            rest, gates_left, misses = held[name]
+                            misses.extend(scheduler.violations(result))
+                            if gates_left > 1:
+                                held[name] = (rest, gates_left - 1, misses)
+                            elif misses:
+                                # Hopeless candidate: do not pay for the expensive tests
+                                del held[name]
+                                for test in rest:
+                                    results[name][test] = SimulationResult.failure(
+                                        "Skipped: " + "; ".join(misses), SimulationStatus.SKIPPED)
+                            else:
+                                del held[name]
+                                submit_tests(name, rest)
+                    
+                    if len(results[name]) == len(tests):
+                        # Keep the tests in their declared order
+                        results[name] = {test: results[name][test] for test in tests}
+                        if store is not None:
+                            store.record_variant(circuit_type, name, variants[name]["params"], results[name],
+                                                 variants[name].get("corner", "tt"))
+                        if with_documentation:
+                            folder, short = built[name]
+                            job = executor.submit(
+                                DocumentationGenerator.create_readme,
+                                folder, name, short, variants[name]["params"], results[name],
+                                circuit_type, units_map
+                            )
+                            pending[job] = ("document", name, None)
+                
+                else:
+                    future.result()
     
+    if scheduler is not None:
+        scheduler.save()
+    if store is not None:
+        store.flush()
     return results
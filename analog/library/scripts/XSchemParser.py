@@ -1,9 +1,14 @@
 from Grammar import *
-from typing import List, Dict, Union, Optional
+from typing import List, Dict, Union, Optional, Iterable, Iterator
 
 from pathlib import Path
 import re
 
+# Command letter of each object class, for selective parsing
+COMMANDS = {Version: 'v', Line: 'L', Rectangle: 'B', Arc: 'A', Polygon: 'P', Text: 'T', Wire: 'N',
+            Component: 'C', Spice: 'S', Verilog: 'V', VHDL: 'G', TEDAx: 'E', GlobalProperties: 'K'}
+HEADER_COMMANDS = frozenset('vKSVGE')
+
 class XSchemParser:
     def __init__(self):
         pass
@@ -28,47 +33,73 @@ class XSchemParser:
         
         return properties
     
-    def parse_content(self, content: str) -> List[XSchemObject]:
-        """Parse the entire content of an XSchem file"""
-        objects = []
-        i = 0
-        lines = content.split('\n')
-        
-        while i < len(lines):
-            line = lines[i].strip()
+    def iter_blocks(self, lines: Iterable[str]) -> Iterator[str]:
+        """Yield each object's source text, joining multi-line blocks with unmatched braces"""
+        block, brace_count = None, 0
+        for raw in lines:
+            if block is not None:
+                block += '\n' + raw.rstrip('\n')
+                brace_count += raw.count('{') - raw.count('}')
+                if brace_count <= 0:
+                    yield block
+                    block = None
+                continue
             
+            line = raw.strip()
             if not line:
-                i += 1
                 continue
             
             # Check if this line starts a multi-line block (has unmatched braces)
             if '{' in line and line.count('{') != line.count('}'):
-                # Collect the complete multi-line block
-                full_content = line
-                brace_count = line.count('{') - line.count('}')
-                i += 1
-                
-                while i < len(lines) and brace_count > 0:
-                    current_line = lines[i]
-                    full_content += '\n' + current_line
-                    brace_count += current_line.count('{') - current_line.count('}')
-                    i += 1
-                
-                # Parse the complete block
-                obj = self.parse_line(full_content)
-                if obj:
-                    objects.append(obj)
-                i -= 1  # Adjust since we'll increment at the end
+                block, brace_count = line, line.count('{') - line.count('}')
             else:
-                # Single line - parse normally
-                obj = self.parse_line(line)
-                if obj:
-                    objects.append(obj)
-            
-            i += 1
+                yield line
         
+        if block is not None:
+            yield block
+    
+    def iter_objects(self, lines: Iterable[str], include: Optional[Iterable[Union[str, type]]] = None,
+                     lazy: bool = False) -> Iterator[XSchemObject]:
+        """Yield objects as they are parsed
+        
+        Args:
+            lines: Source lines, e.g. an open file or content.split('\\n')
+            include: Object classes or command letters to build (default: all);
+                HEADER_COMMANDS selects the v/K/S/V/G/E blocks
+            lazy: Yield the other objects as Unparsed (written back verbatim,
+                built on demand by materialize) instead of skipping them
+        """
+        wanted = None if include is None else {
+            COMMANDS.get(item, item) if isinstance(item, type) else item for item in include}
+        for block in self.iter_blocks(lines):
+            cmd = block[0]
+            if wanted is None or cmd in wanted:
+                obj = self.parse_line(block)
+                if obj:
+                    yield obj
+            elif lazy:
+                yield Unparsed(command=cmd, raw=block)
+    
+    def parse_content(self, content: str, include: Optional[Iterable[Union[str, type]]] = None,
+                      lazy: bool = False) -> List[XSchemObject]:
+        """Parse the entire content of an XSchem file, optionally only some object classes"""
+        return list(self.iter_objects(content.split('\n'), include, lazy))
+    
+    def parse_header(self, content: str) -> List[XSchemObject]:
+        """Version, global properties and code blocks, stopping at the first drawn object"""
+        objects = []
+        for block in self.iter_blocks(content.split('\n')):
+            if block[0] not in HEADER_COMMANDS:
+                break
+            obj = self.parse_line(block)
+            if obj:
+                objects.append(obj)
         return objects
     
+    def materialize(self, obj: XSchemObject) -> Optional[XSchemObject]:
+        """Fully parsed object for an Unparsed placeholder (other objects are returned as is)"""
+        return self.parse_line(obj.raw) if isinstance(obj, Unparsed) else obj
+    
     def parse_line(self, line: str) -> Optional[XSchemObject]:
         """Parse a single line (which may contain newlines if it was a multi-line block)"""
         line = line.strip()
@@ -230,8 +261,15 @@ class XSchemParser:
         
         return None
     
-    def parse_file(self, file_path: str) -> List[XSchemObject]:
+    def parse_file(self, file_path: str, include: Optional[Iterable[Union[str, type]]] = None,
+                   lazy: bool = False) -> List[XSchemObject]:
         """Parse an XSchem file from disk"""
         with open(file_path, 'r', encoding='utf-8') as f:
             content = f.read()
-        return self.parse_content(content)
+        return self.parse_content(content, include, lazy)
+    
+    def iter_file(self, file_path: str, include: Optional[Iterable[Union[str, type]]] = None,
+                  lazy: bool = False) -> Iterator[XSchemObject]:
+        """Stream the objects of a file without holding its text or the full object list"""
+        with open(file_path, 'r', encoding='utf-8') as f:
+            yield from self.iter_objects(f, include, lazy)
@@ -14,6 +14,12 @@ CURRENT_DIR = Path(__file__).parent
 sys.path.insert(0, str(CURRENT_DIR))
 from XSchemInterface import XSchemInterface, build_and_simulate_variants
 from SimulationRunner import SimulationRunner
+from SimulationResult import SimulationResult
+from TestScheduler import TestScheduler, HardConstraint, test_metrics
+from GeometryMetrics import GEOMETRY_METRICS, area_devices, geometry_metrics
+from OpAmpPrescreen import OpAmpPrescreen, PrescreenReport, score_metrics
+from EvaluationStore import EvaluationStore
+from ConvergenceRecovery import RecoverySimulationRunner
 
 @dataclass
 class OptimizationTarget:
@@ -21,6 +27,7 @@ class OptimizationTarget:
     target_value: float
     weight: float = 1.0
     constraint_type: str = "min"
+    hard: bool = False
 
 @dataclass
 class ParameterBound:
@@ -29,17 +36,55 @@ class ParameterBound:
     min_value: float
     max_value: float
 
+def apply_sky130_drc(x: np.ndarray, bounds: List[ParameterBound]) -> np.ndarray:
+    """Apply SKY130 design rules for 1.8V devices to a vector or a population (one row each)"""
+    # Quantize to 5nm grid
+    x_corrected = np.round(np.asarray(x, dtype=float) / 0.005) * 0.005
+    
+    for i, bound in enumerate(bounds):
+        column = x_corrected[..., i]
+        # Apply SKY130 minimums
+        if 'L' in bound.parameter:  # Length: 0.15μm minimum
+            column = np.maximum(column, 0.15)
+        elif 'W' in bound.parameter:  # Width: 0.42μm minimum
+            column = np.maximum(column, 0.42)
+        x_corrected[..., i] = np.clip(column, bound.min_value, bound.max_value)
+    
+    return x_corrected
+
 class CircuitOptimizer:
     """Circuit optimizer with efficient adaptive step sizing"""
     
     def __init__(self, circuit_type: str, tests: Dict[str, Dict[str, Any]], 
-                 template_dir: Path):
+                 template_dir: Path, hard_slack: float = 0.0,
+                 prescreen: Optional[OpAmpPrescreen] = None, prescreen_margin: float = 0.5,
+                 store: Optional[EvaluationStore] = None,
+                 simulator: Optional[SimulationRunner] = None):
         self.circuit_type = circuit_type
         self.tests = tests
         self.template_dir = template_dir
         self.targets: List[OptimizationTarget] = []
         self.bounds: List[ParameterBound] = []
-        self.simulator = SimulationRunner()
+        # Tests that only report geometry are computed from the parameters instead of simulated
+        self.geometry_tests = {name: area_devices(config) for name, config in tests.items()
+                               if test_metrics(config) and set(test_metrics(config)) <= set(GEOMETRY_METRICS)}
+        self.simulated_tests = {name: config for name, config in tests.items() if name not in self.geometry_tests}
+        self._template_components = None
+        # Non-converging candidates are retried with simulator options before being scored
+        self.simulator = simulator or RecoverySimulationRunner()
+        self.failed_evaluations = 0
+        # Cheap tests on hard targets run first; misses beyond hard_slack skip the rest
+        self.hard_slack = hard_slack
+        self.scheduler = TestScheduler()
+        # Analytic model that rejects candidates predicted to score below
+        # prescreen_margin of the best simulated candidate's prediction
+        self.prescreen = prescreen
+        self.prescreen_margin = prescreen_margin
+        self.prescreen_report = PrescreenReport()
+        self.best_predicted = 0.0
+        self.last_results = None
+        # Every evaluation, geometry metrics included, is recorded here when given
+        self.store = store
         self.eval_count = 0
         self.previous_folder = None
         
@@ -50,25 +95,14 @@ class CircuitOptimizer:
     
     def _apply_sky130_drc(self, x: np.ndarray) -> np.ndarray:
         """Apply SKY130 design rules for 1.8V devices"""
-        x_corrected = x.copy()
-        
-        for i, bound in enumerate(self.bounds):
-            # Quantize to 5nm grid
-            x_corrected[i] = round(x[i] / 0.005) * 0.005
-            
-            # Apply SKY130 minimums
-            if 'L' in bound.parameter:  # Length: 0.15μm minimum
-                x_corrected[i] = max(x_corrected[i], 0.15)
-            elif 'W' in bound.parameter:  # Width: 0.42μm minimum  
-                x_corrected[i] = max(x_corrected[i], 0.42)
-                
-            x_corrected[i] = np.clip(x_corrected[i], bound.min_value, bound.max_value)
-        
-        return x_corrected
+        return apply_sky130_drc(x, self.bounds)
 
     def add_target(self, metric: str, target_value: float, weight: float = 1.0, 
-                   constraint_type: str = "min") -> None:
-        self.targets.append(OptimizationTarget(metric, target_value, weight, constraint_type))
+                   constraint_type: str = "min", hard: bool = False) -> None:
+        target = OptimizationTarget(metric, target_value, weight, constraint_type, hard)
+        self.targets.append(target)
+        if hard:
+            self.scheduler.constraints.append(HardConstraint.from_target(target, self.hard_slack))
     
     def add_bound(self, component: str, parameter: str, min_value: float, max_value: float) -> None:
         self.bounds.append(ParameterBound(component, parameter, min_value, max_value))
@@ -79,8 +113,14 @@ class CircuitOptimizer:
         self.units_map = units_map
         self.target_precision = target_precision
         
+        failed_before = self.failed_evaluations
         initial_score = self._evaluate_parameters(initial_params)
-        if initial_score <= 0:
+        self._record_prediction(initial_params, initial_score)
+        if self.failed_evaluations > failed_before:
+            # A transient xschem or simulator error should not end the search
+            print("Initial evaluation failed, optimizing from the initial parameters anyway")
+        elif initial_score <= 0:
+            print("Initial parameters score 0 (no metrics to optimize), returning them unchanged")
             return initial_params
         
         x0 = np.array([float(initial_params[b.component][b.parameter]) for b in self.bounds])
@@ -103,7 +143,15 @@ class CircuitOptimizer:
             for i, bound in enumerate(self.bounds):
                 print(f"  {bound.component}.{bound.parameter}: {x[i]:.6f}")
             
+            predicted = self._predicted_score(params)
+            if predicted is not None and predicted < self.prescreen_margin * self.best_predicted:
+                # Rejected without simulating; rank it by its calibrated prediction
+                score = predicted * self.best_score_seen / self.best_predicted
+                print(f"  Prescreen rejected (predicted {predicted:.6f}), estimated score: {score:.6f}\n")
+                return -score
+            
             score = self._evaluate_parameters(params)
+            self._record_prediction(params, score)
             print(f"  Score: {score:.6f}")
             
             # Track progress for adaptive behavior
@@ -196,6 +244,15 @@ class CircuitOptimizer:
                 print(f"{strategy['name']} failed: {e}")
                 continue
         
+        if self.prescreen is not None:
+            print("\nPrescreen predictions against simulation:")
+            print(self.prescreen_report.format())
+        if isinstance(self.simulator, RecoverySimulationRunner) and self.simulator.stats:
+            print("\nConvergence recovery:")
+            print(self.simulator.summary())
+        if self.failed_evaluations:
+            print(f"{self.failed_evaluations} evaluations failed and scored 0")
+        
         # Clean up final folder
         if self.previous_folder and Path(self.previous_folder).exists():
             shutil.rmtree(self.previous_folder)
@@ -208,6 +265,27 @@ class CircuitOptimizer:
         print(f"\nOptimization complete. Best score: {best_score:.6f}")
         return final_params
     
+    def _predicted_score(self, params: Dict[str, Dict[str, str]]) -> Optional[float]:
+        if self.prescreen is None:
+            return None
+        return float(score_metrics(self.prescreen.evaluate([params]), self.targets)[0])
+    
+    def _record_prediction(self, params: Dict[str, Dict[str, str]], score: float) -> None:
+        """Track prediction quality and the prediction of the best simulated candidate"""
+        if self.prescreen is None or self.last_results is None:
+            return
+        predicted = {metric: float(values[0]) for metric, values in self.prescreen.evaluate([params]).items()}
+        simulated = {metric: self._find_metric(self.last_results, metric) for metric in predicted}
+        self.prescreen_report.record(predicted, simulated)
+        if score >= self.best_score_seen:
+            self.best_predicted = float(score_metrics(
+                {metric: [value] for metric, value in predicted.items()}, self.targets)[0])
+    
+    def rank_population(self, population: np.ndarray, base_params: Dict[str, Dict[str, str]]) -> np.ndarray:
+        """Order candidate vectors by predicted score, best first, in one vectorized call"""
+        params_list = [self._vector_to_params(self._apply_sky130_drc(x), base_params) for x in population]
+        return self.prescreen.rank(params_list, self.targets)
+    
     def _calculate_adaptive_eps(self, bounds_array: List[tuple]) -> float:
         """Calculate adaptive epsilon based on parameter scales"""
         ranges = [b[1] - b[0] for b in bounds_array]
@@ -242,6 +320,7 @@ class CircuitOptimizer:
     
     def _evaluate_parameters(self, params: Dict[str, Dict[str, str]]) -> float:
         """Evaluate parameter set"""
+        self.last_results = None
         try:
             # Clean up previous iteration folder
             if self.previous_folder and Path(self.previous_folder).exists():
@@ -259,31 +338,57 @@ class CircuitOptimizer:
             
             results = build_and_simulate_variants(
                 variants=variant,
-                tests=self.tests,
+                tests=self.simulated_tests,
                 circuit_type=self.circuit_type,
                 template_dir=str(self.template_dir),
-                units_map=self.units_map
+                units_map=self.units_map,
+                simulator=self.simulator,
+                scheduler=self.scheduler
             )
             
+            self._add_geometry_results(results[variant_name], params)
+            if self.store is not None:
+                self.store.record_variant(self.circuit_type, variant_name, params, results[variant_name])
             score = self._calculate_score(results)
+            self.last_results = results
             
             # Store current folder for cleanup in next iteration
             self.previous_folder = folder
             
             return score
             
-        except Exception:
-            return 0.1
+        except Exception as e:
+            self.failed_evaluations += 1
+            print(f"  Evaluation failed: {e}")
+            return 0.0
+    
+    def _add_geometry_results(self, variant_results: Dict[str, Any], params: Dict[str, Dict[str, str]]) -> None:
+        """Fill in the geometry-only tests without simulating them"""
+        if not self.geometry_tests:
+            return
+        if self._template_components is None:
+            template = Path(self.template_dir) / f"{self.circuit_type}.sch"
+            self._template_components = XSchemInterface.load(template, cached=True).components  # read only
+        for test_name, names in self.geometry_tests.items():
+            metrics = geometry_metrics(self._template_components, params, names or None)
+            wanted = test_metrics(self.tests[test_name])
+            variant_results[test_name] = SimulationResult.from_metrics({m: metrics[m] for m in wanted})
     
     def _calculate_score(self, results: Dict[str, Dict[str, Any]]) -> float:
         """Calculate optimization score"""
         total_score = 0.0
         total_weight = 0.0
+        # Metrics of tests skipped after a hard constraint miss, or that still
+        # failed after convergence recovery, count as zero
+        incomplete = any("error" in test_result
+                         for variant_results in results.values() for test_result in variant_results.values())
         
         for target in self.targets:
             value = self._find_metric(results, target.metric)
             
-            if value is not None:
+            if value is None and incomplete:
+                total_weight += target.weight
+            elif value is not None:
                 if target.constraint_type == "min":
                     score = min(1.0, value / target.target_value) if target.target_value > 0 else 0.0
                 elif target.constraint_type == "max":
@@ -305,9 +410,9 @@ class CircuitOptimizer:
                 if metric in test_result and isinstance(test_result[metric], (int, float)):
                     return float(test_result[metric])
                 
-                # Parse from stdout
-                if "stdout" in test_result:
-                    stdout = test_result["stdout"]
+                # Parse from stdout, loaded from the run's log when one was kept
+                stdout = getattr(test_result, "stdout", None)
+                if stdout:
                     patterns = [
                         rf"{metric}:\s*([+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)",
                         rf"echo\s+'{metric}:'\s+\$&([^\s]+)",
@@ -329,13 +434,15 @@ class CircuitOptimizer:
 def optimize_circuit(circuit_type: str, initial_params: Dict[str, Dict[str, str]], 
                     tests: Dict[str, Dict[str, Any]], targets: List[Dict[str, Any]], 
                     bounds: List[Dict[str, Any]], template_dir: str = "template",
-                    max_iterations: int = 20, target_precision: float = 0.95) -> Dict[str, Dict[str, str]]:
+                    max_iterations: int = 20, target_precision: float = 0.95,
+                    prescreen: Optional[OpAmpPrescreen] = None,
+                    store: Optional[EvaluationStore] = None) -> Dict[str, Dict[str, str]]:
     """Optimize circuit parameters with adaptive step sizing and early stopping"""
     import inspect
     caller_file = Path(inspect.stack()[1].filename)
     template_path = caller_file.parent / template_dir
     
-    optimizer = CircuitOptimizer(circuit_type, tests, template_path)
+    optimizer = CircuitOptimizer(circuit_type, tests, template_path, prescreen=prescreen, store=store)
     
     unit_map = {}
     for target in targets:
@@ -347,4 +454,7 @@ def optimize_circuit(circuit_type: str, initial_params: Dict[str, Dict[str, str]
     for bound in bounds:
         optimizer.add_bound(**bound)
     
-    return optimizer.optimize(initial_params, unit_map, max_iterations, target_precision)
+    best = optimizer.optimize(initial_params, unit_map, max_iterations, target_precision)
+    if store is not None:
+        store.flush()
+    return best
@@ -100,6 +100,10 @@ class XSchemWriter:
             props = XSchemWriter.format_properties(obj.properties)
             return f"K {props}"
         
+        elif isinstance(obj, Unparsed):
+            # Written back exactly as it was read
+            return obj.raw
+        
         elif isinstance(obj, EmbeddedSymbol):
             # Recursively write the embedded symbol
             embedded_content = []
@@ -0,0 +1,12 @@
+"""
+Router tests for the ADC_DEMUX copy of DAC_Router, reusing the DAC_MUX
+reference model and tests (see DAC_MUX/test/router_tests.py)
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "DAC_MUX", "test"))
+
+from router_tests import test_every_address, test_random_handshakes, test_random_inputs  # noqa: E402,F401
+
+PARAMETER_SWEEP = {"VECTOR_SIZE": [2, 4, 8, 16, 32, 64]}
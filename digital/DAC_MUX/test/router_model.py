@@ -0,0 +1,214 @@
+"""
+Cycle-level reference model and scoreboard for DAC_Router
+
+The router is a four-state handshake (IDLE -> ROUTING -> ACKNOWLEDGE ->
+WAIT_CLEAR). Stimulus is generated per handshake as a set of segment lengths
+(idle gap, valid delay, routing cycles, clear delay), and both the per-cycle
+inputs and the expected outputs are expanded from those segments with
+np.repeat, so a whole run is precomputed before the simulation starts. The
+testbench only drives and records arrays; the Scoreboard compares them all at
+once after the run.
+
+Cycle t means: inputs driven after rising edge t, outputs sampled before
+rising edge t+1, state is the register value during the cycle.
+"""
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import FallingEdge, RisingEdge
+
+IDLE, ROUTING, ACKNOWLEDGE, WAIT_CLEAR = range(4)
+INPUTS = ("rst_n", "addr_ready", "dac_data_valid", "dac_ack_in", "addr")
+OUTPUTS = ("dac_enable", "ack_out", "routing_valid", "route", "state")
+NO_ROUTE = -1  # o_data_out is all zeros
+
+
+def total_options(vector_size: int) -> int:
+    return 2 * vector_size + vector_size * vector_size
+
+
+def addr_width(vector_size: int) -> int:
+    return max(1, (total_options(vector_size) - 1).bit_length())
+
+
+@dataclass
+class Trace:
+    """Per-cycle input and output arrays of one run"""
+    signals: Dict[str, np.ndarray]
+
+    def __len__(self) -> int:
+        return len(next(iter(self.signals.values())))
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.signals[name]
+
+
+class RouterModel:
+    """Expected behaviour of a DAC_Router instance"""
+
+    def __init__(self, vector_size: int = 4):
+        self.vector_size = vector_size
+        self.total_options = total_options(vector_size)
+        self.addr_width = addr_width(vector_size)
+
+    # Stimulus
+    def handshakes(self, rng: np.random.Generator, count: Optional[int] = None,
+                   max_delay: int = 3, out_of_range: float = 0.05) -> Dict[str, np.ndarray]:
+        """Random handshakes covering every address at least once, in random order"""
+        count = max(count or 0, self.total_options)
+        addresses = np.concatenate([rng.permutation(self.total_options),
+                                    rng.integers(0, self.total_options, count - self.total_options)])
+        invalid = rng.random(count) < out_of_range
+        if (1 << self.addr_width) > self.total_options:
+            addresses[invalid] = rng.integers(self.total_options, 1 << self.addr_width, invalid.sum())
+        return {
+            "addr": addresses,
+            "gap": rng.integers(1, max_delay + 1, count),        # IDLE with addr_ready low
+            "valid_delay": rng.integers(0, max_delay + 1, count),  # IDLE waiting on dac_data_valid
+            "routing": rng.integers(1, max_delay + 1, count),      # ROUTING cycles until dac_ack_in
+            "clear_delay": rng.integers(0, max_delay + 1, count),  # WAIT_CLEAR before addr_ready drops
+        }
+
+    def expand(self, handshakes: Dict[str, np.ndarray], reset_cycles: int = 2) -> Trace:
+        """Per-cycle inputs and expected outputs of a sequence of handshakes"""
+        addr = handshakes["addr"]
+        count = len(addr)
+        in_range = addr < self.total_options
+        # Segments per handshake, in order, as (state, ready, valid, ack, enable, ack_out, routing_valid, routed)
+        segments = np.array([
+            (IDLE, 0, 0, 0, 0, 0, 0, 0),
+            (IDLE, 1, 0, 0, 1, 0, 0, 0),
+            (IDLE, 1, 1, 0, 1, 0, 0, 0),
+            (ROUTING, 1, 1, 0, 1, 0, 1, 1),
+            (ROUTING, 1, 1, 1, 1, 0, 1, 1),
+            (ACKNOWLEDGE, 1, 0, 0, 0, 1, 1, 1),
+            (WAIT_CLEAR, 1, 0, 0, 0, 0, 0, 0),
+            (WAIT_CLEAR, 0, 0, 0, 0, 0, 0, 0),
+        ])
+        ones = np.ones(count, dtype=np.int64)
+        lengths = np.stack([handshakes["gap"], handshakes["valid_delay"], ones, handshakes["routing"] - 1,
+                            ones, ones, handshakes["clear_delay"], ones], axis=1).ravel()
+        kinds = np.repeat(np.tile(np.arange(len(segments)), count), lengths)
+        owner = np.repeat(np.repeat(np.arange(count), len(segments)), lengths)
+        columns = segments[kinds]
+
+        routed = columns[:, 7].astype(bool) & in_range[owner]
+        signals = {
+            "rst_n": np.ones(len(kinds), dtype=np.int64),
+            "addr_ready": columns[:, 1],
+            "dac_data_valid": columns[:, 2],
+            "dac_ack_in": columns[:, 3],
+            "addr": np.where(columns[:, 1] == 1, addr[owner], 0),
+            "state": columns[:, 0],
+            "dac_enable": columns[:, 4],
+            "ack_out": columns[:, 5],
+            "routing_valid": columns[:, 6],
+            "route": np.where(routed, addr[owner], NO_ROUTE),
+        }
+        if reset_cycles:
+            signals = {name: np.concatenate([np.full(reset_cycles, 0 if name != "route" else NO_ROUTE), values])
+                       for name, values in signals.items()}
+        return Trace(signals)
+
+    # Cycle-by-cycle model, for arbitrary stimulus
+    def simulate(self, inputs: Dict[str, np.ndarray]) -> Trace:
+        """Expected outputs for any per-cycle input arrays"""
+        cycles = len(inputs["addr"])
+        outputs = {name: np.zeros(cycles, dtype=np.int64) for name in OUTPUTS}
+        state, latched, addr_valid = IDLE, 0, False
+        rst_n, ready, valid, ack, addr = (np.asarray(inputs[name]).tolist() for name in INPUTS)
+        for t in range(cycles):
+            if not rst_n[t]:  # asynchronous: IDLE outputs for the whole cycle
+                state, latched, addr_valid = IDLE, 0, False
+                outputs["dac_enable"][t] = ready[t]
+                outputs["route"][t] = NO_ROUTE
+                continue
+            routed = addr_valid and latched < self.total_options and state in (ROUTING, ACKNOWLEDGE)
+            outputs["state"][t] = state
+            outputs["dac_enable"][t] = ready[t] if state == IDLE else state == ROUTING
+            outputs["ack_out"][t] = state == ACKNOWLEDGE
+            outputs["routing_valid"][t] = state in (ROUTING, ACKNOWLEDGE)
+            outputs["route"][t] = latched if routed else NO_ROUTE
+
+            if state == IDLE and ready[t]:
+                latched, addr_valid = addr[t], True
+            elif state == WAIT_CLEAR:
+                addr_valid = False
+            if state == IDLE and ready[t] and valid[t]:
+                state = ROUTING
+            elif state == ROUTING and ack[t]:
+                state = ACKNOWLEDGE
+            elif state == ACKNOWLEDGE:
+                state = WAIT_CLEAR
+            elif state == WAIT_CLEAR and not ready[t]:
+                state = IDLE
+        return Trace({**{name: np.asarray(inputs[name]) for name in INPUTS}, **outputs})
+
+
+class Scoreboard:
+    """Records DUT outputs into preallocated arrays and compares them to a trace in one pass"""
+
+    CHECKED = ("dac_enable", "ack_out", "routing_valid", "route")
+
+    def __init__(self, expected: Trace):
+        self.expected = expected
+        self.observed = {name: np.zeros(len(expected), dtype=np.int64) for name in self.CHECKED[:-1]}
+        self.data_out: List[int] = [0] * len(expected)
+
+    def record(self, t: int, dac_enable: int, ack_out: int, routing_valid: int, data_out: int) -> None:
+        self.observed["dac_enable"][t] = dac_enable
+        self.observed["ack_out"][t] = ack_out
+        self.observed["routing_valid"][t] = routing_valid
+        self.data_out[t] = data_out
+
+    def routes(self) -> np.ndarray:
+        """Index of the single active o_data_out line per cycle (-2 if several are active)"""
+        return np.array([value.bit_length() - 1 if value & (value - 1) == 0 else -2
+                         for value in self.data_out], dtype=np.int64)
+
+    def mismatches(self) -> Dict[str, np.ndarray]:
+        """Cycles where each output differs from the expectation"""
+        observed = dict(self.observed, route=self.routes())
+        return {name: np.flatnonzero(observed[name] != self.expected[name]) for name in self.CHECKED}
+
+    def report(self, context: int = 3) -> str:
+        lines = []
+        observed = dict(self.observed, route=self.routes())
+        for name, cycles in self.mismatches().items():
+            if cycles.size:
+                first = int(cycles[0])
+                window = slice(max(0, first - context), first + context + 1)
+                lines.append(f"{name}: {cycles.size} cycles differ, first at {first} (state "
+                             f"{int(self.expected['state'][first])}); expected {self.expected[name][window].tolist()}, "
+                             f"got {observed[name][window].tolist()} over cycles {window.start}..{window.stop - 1}")
+        return "\n".join(lines)
+
+    def check(self) -> None:
+        report = self.report()
+        assert not report, report
+
+
+async def run_trace(dut, trace: Trace, clock_period_ns: int = 10) -> Scoreboard:
+    """Drive the trace inputs into tb_mv_mul, record its outputs and check them"""
+    cocotb.start_soon(Clock(dut.clk, clock_period_ns, units="ns").start())
+    scoreboard = Scoreboard(trace)
+    handles = [getattr(dut, name) for name in INPUTS]
+    outputs = dut.dac_enable, dut.ack_out, dut.routing_valid, dut.data_out
+    rising, falling = RisingEdge(dut.clk), FallingEdge(dut.clk)
+    last = [None] * len(handles)
+
+    await rising
+    for t, values in enumerate(zip(*(trace[name].tolist() for name in INPUTS))):
+        for index, value in enumerate(values):
+            if value != last[index]:
+                handles[index].value = last[index] = value
+        await falling
+        scoreboard.record(t, *(int(output.value) for output in outputs))
+        await rising
+
+    dut._log.info(f"VECTOR_SIZE={dut.VECTOR_SIZE.value}: {len(trace)} cycles recorded")
+    scoreboard.check()
+    return scoreboard
@@ -0,0 +1,44 @@
+`default_nettype none
+`timescale 1ns / 1ps
+
+// cocotb wrapper for DAC_Router; VECTOR_SIZE is overridden per sweep point
+module tb_mv_mul #(
+    parameter VECTOR_SIZE = 4,
+    parameter TOTAL_OPTIONS = (VECTOR_SIZE * 2) + (VECTOR_SIZE * VECTOR_SIZE),
+    parameter ADDR_WIDTH = $clog2(TOTAL_OPTIONS)
+);
+  reg clk = 0;
+  reg rst_n = 0;
+  reg dac_data_valid = 0;
+  reg dac_ack_in = 0;
+  reg [ADDR_WIDTH-1:0] addr = 0;
+  reg addr_ready = 0;
+
+  wire dac_enable;
+  wire ack_out;
+  wire [TOTAL_OPTIONS-1:0] data_out;
+  wire routing_valid;
+
+  DAC_Router #(
+      .VECTOR_SIZE(VECTOR_SIZE)
+  ) dut (
+      .i_clk(clk),
+      .i_rst_n(rst_n),
+      .i_dac_data_valid(dac_data_valid),
+      .i_dac_ack_in(dac_ack_in),
+      .o_dac_enable(dac_enable),
+      .i_addr_out(addr),
+      .i_addr_ready(addr_ready),
+      .o_ack_out(ack_out),
+      .o_data_out(data_out),
+      .o_routing_valid(routing_valid)
+  );
+
+  // Waveforms only on request (-DWAVES): a full dump of a large sweep point runs to hundreds of MB
+`ifdef WAVES
+  initial begin
+    $dumpfile("tb_mv_mul.vcd");
+    $dumpvars(0, tb_mv_mul);
+  end
+`endif
+endmodule
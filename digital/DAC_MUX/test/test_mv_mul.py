@@ -0,0 +1,9 @@
+"""
+DAC_Router tests (see router_tests.py)
+
+RunRegression.py builds one simulation per PARAMETER_SWEEP entry; under the
+block Makefile the testbench default (VECTOR_SIZE=4) is used.
+"""
+from router_tests import test_every_address, test_random_handshakes, test_random_inputs  # noqa: F401
+
+PARAMETER_SWEEP = {"VECTOR_SIZE": [2, 4, 8, 16, 32, 64]}
@@ -5,6 +5,7 @@ RTL_FILES := $(shell find ../../../ -name "*.v" -o -name "*.sv")
 RTL_FILES_H := $(shell find ../../ -name "*.vh" -o -name "*.svh")
 TB_FILES := $(shell find ../../test -name "*_tb.v" -o -name "tb_*.v")
 COCOTB_TEST_FILES := $(shell find ../../test -name "test_*.py")
+# tb_mv_mul/test_mv_mul wait on the I2C_IF RTL (RTL_PENDING in test_mv_mul.py)
 TOPLEVEL_TB_MODULES := tb_i2c_module
 MODULE_TESTS := test_i2c_module
 PROJECT_TYPE = digital
@@ -0,0 +1,121 @@
+"""
+NumPy golden model of the I2C_IF register map and the matrix-vector product
+
+Register map (same ordering as the analog array's address decoder):
+    0 .. N-1            input vector x
+    N .. N+N*N-1        weight matrix W, row-major (W[i][j] at N + i*N + j)
+    N+N*N .. 2N+N*N-1   output vector y (read-only)
+
+Writes and reads auto-increment the register pointer and wrap at the end of
+the map, so a whole matrix or vector moves in one burst.
+"""
+import math
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+@dataclass
+class Transaction:
+    """One I2C transfer: a burst write of data, or a burst read of count registers"""
+    register: int
+    data: Optional[bytes] = None
+    count: int = 0
+
+    @property
+    def is_read(self) -> bool:
+        return self.data is None
+
+
+class RegisterMap:
+    """Expected contents of the I2C_IF registers"""
+
+    def __init__(self, vector_size: int = 4, data_width: int = 8):
+        """
+        Args:
+            vector_size: VECTOR_SIZE parameter of the design (N)
+            data_width: DATA_WIDTH parameter of the design
+        """
+        self.vector_size = vector_size
+        self.data_width = data_width
+        self.vector_base = 0
+        self.matrix_base = vector_size
+        self.output_base = vector_size + vector_size * vector_size
+        self.size = 2 * vector_size + vector_size * vector_size
+        self.addr_width = math.ceil(math.log2(self.size))
+        self.registers = np.zeros(self.size, dtype=np.int64)
+
+    # Register access
+    def addresses(self, register: int, count: int) -> np.ndarray:
+        return (register + np.arange(count)) % self.size
+
+    def write(self, register: int, data: Sequence[int]) -> None:
+        """Burst write; data landing on output registers is ignored"""
+        addresses = self.addresses(register, len(data))
+        values = np.asarray(list(data), dtype=np.int64) & ((1 << self.data_width) - 1)
+        writable = addresses < self.output_base
+        self.registers[addresses[writable]] = values[writable]
+
+    def read(self, register: int, count: int) -> np.ndarray:
+        """Burst read, with the output registers holding the current product"""
+        self.registers[self.output_base:] = self.outputs()
+        return self.registers[self.addresses(register, count)].copy()
+
+    def apply(self, transactions: Sequence[Transaction]) -> List[np.ndarray]:
+        """Expected data of every read in a batch, in order"""
+        expected = []
+        for transaction in transactions:
+            if transaction.is_read:
+                expected.append(self.read(transaction.register, transaction.count))
+            else:
+                self.write(transaction.register, transaction.data)
+        return expected
+
+    # Operands
+    @property
+    def vector(self) -> np.ndarray:
+        return self.registers[self.vector_base:self.matrix_base]
+
+    @property
+    def matrix(self) -> np.ndarray:
+        return self.registers[self.matrix_base:self.output_base].reshape(self.vector_size, self.vector_size)
+
+    def load(self, matrix: np.ndarray, vector: np.ndarray) -> List[Transaction]:
+        """Two burst writes that load both operands, applied to the model as well"""
+        transactions = [Transaction(self.matrix_base, bytes(np.asarray(matrix, dtype=np.uint8).ravel())),
+                        Transaction(self.vector_base, bytes(np.asarray(vector, dtype=np.uint8)))]
+        self.apply(transactions)
+        return transactions
+
+    # Product
+    def product(self) -> np.ndarray:
+        """Exact W @ x of the stored operands"""
+        return self.matrix @ self.vector
+
+    def outputs(self) -> np.ndarray:
+        """Product scaled back to data_width bits, as the ADC reports it at full scale"""
+        shift = self.data_width + math.ceil(math.log2(self.vector_size))
+        return np.minimum(self.product() >> shift, (1 << self.data_width) - 1)
+
+    # Stimulus
+    def random_transactions(self, count: int, rng: np.random.Generator,
+                            max_burst: Optional[int] = None, read_ratio: float = 0.3) -> List[Transaction]:
+        """Random mix of operand burst writes and reads anywhere in the map"""
+        max_burst = max_burst or self.vector_size * self.vector_size
+        is_read = rng.random(count) < read_ratio
+        lengths = rng.integers(1, max_burst + 1, count)
+        transactions = []
+        for read, length in zip(is_read, lengths):
+            if read:
+                transactions.append(Transaction(int(rng.integers(self.size)), count=int(length)))
+            else:
+                register = int(rng.integers(self.output_base))
+                data = rng.integers(0, 1 << self.data_width, int(length), dtype=np.uint8)
+                transactions.append(Transaction(register, bytes(data)))
+        return transactions
+
+    def random_operands(self, rng: np.random.Generator) -> Tuple[np.ndarray, np.ndarray]:
+        high = 1 << self.data_width
+        return (rng.integers(0, high, (self.vector_size, self.vector_size)),
+                rng.integers(0, high, self.vector_size))
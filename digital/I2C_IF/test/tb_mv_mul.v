@@ -0,0 +1,42 @@
+`default_nettype none
+`timescale 1ns / 1ps
+
+// cocotb wrapper for i2c_module: the master drives SCL and its open-drain SDA
+// output, and the DUT releases the line by driving uo_out[0] high
+module tb_mv_mul;
+  reg clk = 0;
+  reg rst_n = 0;
+  reg scl = 1;
+  reg sda_master = 1;
+  reg ack_in = 0;
+
+  wire [7:0] uo_out, uio_out, uio_oe;
+  wire [7:0] data_out;
+  wire [4:0] addr_out;
+  wire sda = sda_master & uo_out[0];
+
+  i2c_module #(
+      .DATA_WIDTH (8),
+      .VECTOR_SIZE(4)
+  ) dut (
+      .i_clk(clk),
+      .i_rst_n(rst_n),
+      .ena(1'b1),
+      .ui_in({6'b0, scl, sda}),
+      .uo_out(uo_out),
+      .uio_in(8'b0),
+      .uio_out(uio_out),
+      .uio_oe(uio_oe),
+      .o_data_out(data_out),
+      .i_ack_in(ack_in),
+      .o_addr_out(addr_out)
+  );
+
+  // Waveforms only on request (-DWAVES): a full dump of a large sweep point runs to hundreds of MB
+`ifdef WAVES
+  initial begin
+    $dumpfile("tb_mv_mul.vcd");
+    $dumpvars(0, tb_mv_mul);
+  end
+`endif
+endmodule
@@ -0,0 +1,89 @@
+"""
+Randomized register-map and matrix-vector tests for I2C_IF
+
+Every test issues its stimulus as a few large batches through the I2C master
+BFM and checks each read against the NumPy golden model. Set I2C_TRANSACTIONS
+and I2C_SEED to scale or reproduce the random test.
+
+The I2C_IF RTL is still a stub that does not compile, so RunRegression.py
+only runs this module with --pending until RTL_PENDING is cleared.
+"""
+import os
+import time
+
+import cocotb
+import numpy as np
+from cocotb.clock import Clock
+from cocotb.triggers import ClockCycles
+
+from i2c_bfm import I2CMaster
+from i2c_model import RegisterMap, Transaction
+
+RTL_PENDING = True
+VECTOR_SIZE = 4
+CLOCK_PERIOD_NS = 20        # 50 MHz system clock oversamples SCL 20 times
+BIT_PERIOD_NS = 400
+TRANSACTIONS = int(os.environ.get("I2C_TRANSACTIONS", 2000))
+BATCH = 250
+SEED = int(os.environ.get("I2C_SEED", 0))
+
+
+async def setup(dut) -> I2CMaster:
+    cocotb.start_soon(Clock(dut.clk, CLOCK_PERIOD_NS, units="ns").start())
+    dut.rst_n.value = 0
+    await ClockCycles(dut.clk, 10)
+    dut.rst_n.value = 1
+    await ClockCycles(dut.clk, 10)
+    return I2CMaster(dut.scl, dut.sda_master, dut.sda, bit_period_ns=BIT_PERIOD_NS)
+
+
+def check(model: RegisterMap, transactions, actual) -> None:
+    reads = [transaction for transaction in transactions if transaction.is_read]
+    for transaction, expected, data in zip(reads, model.apply(transactions), actual):
+        assert np.array_equal(np.frombuffer(data, dtype=np.uint8), expected), (
+            f"read of {transaction.count} at {transaction.register}: "
+            f"got {list(data)}, expected {expected.tolist()}")
+
+
+@cocotb.test()
+async def test_bulk_load(dut):
+    """Matrix and vector loaded in two bursts read back in one"""
+    master = await setup(dut)
+    model = RegisterMap(VECTOR_SIZE)
+    matrix, vector = model.random_operands(np.random.default_rng(SEED))
+
+    await master.run(model.load(matrix, vector))
+    data = await master.read(0, model.output_base)
+
+    readback = np.frombuffer(data, dtype=np.uint8)
+    assert np.array_equal(readback[model.matrix_base:].reshape(VECTOR_SIZE, VECTOR_SIZE), matrix)
+    assert np.array_equal(readback[:model.matrix_base], vector)
+
+
+@cocotb.test()
+async def test_random_transactions(dut):
+    """Thousands of random burst writes and reads against the golden model"""
+    master = await setup(dut)
+    model = RegisterMap(VECTOR_SIZE)
+    rng = np.random.default_rng(SEED)
+
+    start = time.perf_counter()
+    for offset in range(0, TRANSACTIONS, BATCH):
+        transactions = model.random_transactions(min(BATCH, TRANSACTIONS - offset), rng)
+        check(model, transactions, await master.run(transactions))
+    elapsed = time.perf_counter() - start
+    dut._log.info(f"{TRANSACTIONS} transactions in {elapsed:.1f} s ({TRANSACTIONS / elapsed:.0f}/s)")
+
+
+@cocotb.test()
+async def test_matrix_vector_product(dut):
+    """Output registers hold the scaled product of the loaded operands"""
+    master = await setup(dut)
+    model = RegisterMap(VECTOR_SIZE)
+    rng = np.random.default_rng(SEED + 1)
+
+    for _ in range(8):
+        matrix, vector = model.random_operands(rng)
+        transactions = model.load(matrix, vector) + [Transaction(model.output_base, count=VECTOR_SIZE)]
+        actual = await master.run(transactions)
+        assert np.array_equal(np.frombuffer(actual[0], dtype=np.uint8), model.outputs())
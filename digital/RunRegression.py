@@ -0,0 +1,322 @@
+"""
+Parallel cocotb regression for the digital blocks.
+
+Discovers every test_<name>.py / tb_<name>.v pair under digital/*/test,
+compiles each testbench once with Icarus into a build directory keyed by a
+hash of its sources, runs the cocotb test modules as separate processes
+(each in its own run directory) and merges their results.xml files into
+one JUnit report with per-test timing. A test module may declare
+PARAMETER_SWEEP = {"VECTOR_SIZE": [4, 8, ...]} to be run once per value,
+each against its own build of the testbench with that parameter overridden.
+Modules that declare RTL_PENDING = True describe a block whose RTL does not
+exist yet and are only run with --pending.
+
+    python RunRegression.py                  # every block
+    python RunRegression.py I2C_IF DAC_MUX   # some blocks
+    python RunRegression.py -j 8 -k router   # 8 processes, tests matching "router"
+"""
+import os
+import ast
+import re
+import sys
+import time
+import shutil
+import hashlib
+import threading
+import argparse
+import itertools
+import subprocess
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Optional, Tuple
+
+DIGITAL_DIR = Path(__file__).parent.resolve()
+BUILD_DIR = DIGITAL_DIR / "build" / "regression"
+RTL_EXTENSIONS = (".v", ".sv")
+HEADER_EXTENSIONS = (".vh", ".svh")
+TIMESCALE = "1ns/1ps"
+
+
+@dataclass
+class Job:
+    """One cocotb test module against its testbench top level"""
+    block: str
+    module: str                     # test_<name>, imported by cocotb
+    toplevel: str                   # tb_<name>
+    test_dir: Path
+    testbench: Path
+    sources: List[Path] = field(default_factory=list)
+    compile_args: List[str] = field(default_factory=list)
+    parameters: Dict[str, object] = field(default_factory=dict)
+
+    @property
+    def name(self) -> str:
+        return f"{self.block}.{self.module}{self.suffix}"
+
+    @property
+    def suffix(self) -> str:
+        return "".join(f"[{key}={value}]" for key, value in self.parameters.items())
+
+    def build_key(self) -> str:
+        """Hash of everything the compiled simulation depends on"""
+        digest = hashlib.sha1(" ".join([self.toplevel, TIMESCALE] + self.compile_args).encode())
+        for path in sorted(self.sources + headers(self.test_dir.parent / "src")):
+            digest.update(path.name.encode())
+            digest.update(path.read_bytes())
+        return digest.hexdigest()[:16]
+
+
+def headers(src_dir: Path) -> List[Path]:
+    return sorted(p for p in src_dir.rglob("*") if p.suffix in HEADER_EXTENSIONS)
+
+
+def discover(root: Path = DIGITAL_DIR, blocks: Optional[List[str]] = None,
+             pending: bool = False) -> Tuple[List[Job], List[str]]:
+    """Runnable test/testbench pairs, plus a note for every pair skipped as a placeholder or pending RTL"""
+    jobs, skipped = [], []
+    for block_dir in sorted(p for p in root.iterdir() if (p / "test").is_dir() and (p / "src").is_dir()):
+        if blocks and block_dir.name not in blocks:
+            continue
+        test_dir = block_dir / "test"
+        rtl = sorted(p for p in (block_dir / "src").rglob("*") if p.suffix in RTL_EXTENSIONS)
+        for test in sorted(test_dir.glob("test_*.py")):
+            name = test.stem[len("test_"):]
+            testbench = next((tb for tb in (test_dir / f"tb_{name}.v", test_dir / f"{name}_tb.v") if tb.exists()), None)
+            if testbench is None:
+                skipped.append(f"{block_dir.name}/{test.name}: no tb_{name}.v")
+                continue
+            if not test.read_text(encoding='utf-8').strip() or not testbench.read_text(encoding='utf-8').strip():
+                skipped.append(f"{block_dir.name}/{test.name}: empty placeholder")
+                continue
+            if module_literal(test, "RTL_PENDING", False) and not pending:
+                skipped.append(f"{block_dir.name}/{test.name}: RTL pending (run with --pending)")
+                continue
+            toplevel = top_module(testbench) or testbench.stem
+            for parameters in parameter_sweep(test):
+                overrides = [f"-P{toplevel}.{key}={value}" for key, value in parameters.items()]
+                jobs.append(Job(block_dir.name, test.stem, toplevel, test_dir, testbench, rtl + [testbench],
+                                [f"-I{block_dir / 'src'}"] + overrides, parameters))
+    return jobs, skipped
+
+
+def module_literal(test: Path, name: str, default: object = None) -> object:
+    """Value of a module-level literal assignment, read without importing cocotb"""
+    for node in ast.parse(test.read_text(encoding='utf-8')).body:
+        if isinstance(node, ast.Assign) and any(getattr(target, "id", None) == name for target in node.targets):
+            return ast.literal_eval(node.value)
+    return default
+
+
+def parameter_sweep(test: Path) -> List[Dict[str, object]]:
+    """Every combination of a module-level PARAMETER_SWEEP literal"""
+    sweep = module_literal(test, "PARAMETER_SWEEP")
+    if not sweep:
+        return [{}]
+    return [dict(zip(sweep, values)) for values in itertools.product(*sweep.values())]
+
+
+def top_module(testbench: Path) -> Optional[str]:
+    """Name of the (last) module declared in a testbench file"""
+    names = re.findall(r"^\s*module\s+(\w+)", testbench.read_text(encoding='utf-8', errors='replace'), re.MULTILINE)
+    return names[-1] if names else None
+
+
+class Cocotb:
+    """Paths cocotb's Makefiles would pass to Icarus, read once from cocotb-config"""
+
+    def __init__(self):
+        if shutil.which("cocotb-config") is None:
+            raise RuntimeError("cocotb-config not found: pip install -r */build/verification/requirements.txt")
+        for tool in ("iverilog", "vvp"):
+            if shutil.which(tool) is None:
+                raise RuntimeError(f"{tool} not found: install Icarus Verilog")
+        self.lib_dir = self._query("--lib-dir")
+        self.vpi = self._query("--lib-name", "vpi", "icarus")
+        self.libpython = self._query("--libpython")
+
+    @staticmethod
+    def _query(*args: str) -> str:
+        return subprocess.run(["cocotb-config", *args], capture_output=True, text=True, check=True).stdout.strip()
+
+
+class Regression:
+    """Compiles each testbench once per source hash and runs the test modules concurrently"""
+
+    def __init__(self, build_dir: Path = BUILD_DIR, max_workers: Optional[int] = None, timeout: float = 600):
+        """
+        Args:
+            build_dir: Holds sim_build/<block>-<toplevel>-<key> and runs/<block>/<module>
+            max_workers: Concurrent simulator processes (default: CPU count)
+            timeout: Seconds allowed per compile or test run
+        """
+        self.build_dir = build_dir
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.cocotb = Cocotb()
+        self._locks: Dict[Path, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def sim_build(self, job: Job) -> Path:
+        return self.build_dir / "sim_build" / f"{job.block}-{job.toplevel}-{job.build_key()}"
+
+    def compile(self, job: Job) -> Tuple[Path, bool, str]:
+        """Compiled simulation of a job, reused when its sources are unchanged"""
+        sim_build = self.sim_build(job)
+        with self._locks_guard:
+            lock = self._locks.setdefault(sim_build, threading.Lock())
+        with lock:
+            return self._compile(job, sim_build)
+
+    def _compile(self, job: Job, sim_build: Path) -> Tuple[Path, bool, str]:
+        vvp = sim_build / "sim.vvp"
+        if vvp.exists():
+            return vvp, True, ""
+        sim_build.mkdir(parents=True, exist_ok=True)
+        (sim_build / "cmds.f").write_text(f"+timescale+{TIMESCALE}\n")
+        tmp = sim_build / "sim.vvp.tmp"
+        result = subprocess.run(
+            ["iverilog", "-o", str(tmp), "-D", "COCOTB_SIM=1", "-s", job.toplevel, "-g2012",
+             "-f", str(sim_build / "cmds.f"), *job.compile_args, *map(str, job.sources)],
+            capture_output=True, text=True, timeout=self.timeout)
+        if result.returncode != 0:
+            tmp.unlink(missing_ok=True)
+            return vvp, False, result.stderr
+        os.replace(tmp, vvp)
+        return vvp, False, ""
+
+    def run(self, job: Job, vvp: Path) -> Tuple[Path, int, str]:
+        """Run one test module in its own directory; returns its results.xml and exit code"""
+        run_dir = self.build_dir / "runs" / job.block / f"{job.module}{job.suffix}"
+        shutil.rmtree(run_dir, ignore_errors=True)
+        run_dir.mkdir(parents=True)
+        results = run_dir / "results.xml"
+        env = dict(os.environ,
+                   MODULE=job.module, TOPLEVEL=job.toplevel, TOPLEVEL_LANG="verilog",
+                   COCOTB_TEST_MODULES=job.module, COCOTB_TOPLEVEL=job.toplevel,
+                   COCOTB_RESULTS_FILE=str(results), LIBPYTHON_LOC=self.cocotb.libpython,
+                   PYTHONPATH=os.pathsep.join(filter(None, [str(job.test_dir), os.environ.get("PYTHONPATH")])))
+        with open(run_dir / "sim.log", "w") as log:
+            process = subprocess.run(
+                ["vvp", "-M", self.cocotb.lib_dir, "-m", self.cocotb.vpi, str(vvp)],
+                cwd=run_dir, env=env, stdout=log, stderr=subprocess.STDOUT, timeout=self.timeout)
+        return results, process.returncode, str(run_dir / "sim.log")
+
+    def execute(self, job: Job) -> Dict[str, object]:
+        start = time.perf_counter()
+        outcome: Dict[str, object] = {"job": job, "reused": False, "error": ""}
+        try:
+            vvp, reused, error = self.compile(job)
+            outcome["reused"] = reused
+            if error:
+                outcome["error"] = f"compile failed:\n{error}"
+            else:
+                outcome["results"], outcome["returncode"], outcome["log"] = self.run(job, vvp)
+        except subprocess.TimeoutExpired:
+            outcome["error"] = f"timed out after {self.timeout} s"
+        outcome["wall"] = time.perf_counter() - start
+        return outcome
+
+    def run_all(self, jobs: List[Job]) -> List[Dict[str, object]]:
+        """Every job, compiling distinct testbenches once and running up to max_workers at a time"""
+        outcomes = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(self.execute, job) for job in jobs]
+            for future in as_completed(futures):
+                outcome = future.result()
+                outcomes.append(outcome)
+                status = "compile reused" if outcome["reused"] else "compiled"
+                print(f"  {outcome['job'].name:<40} {outcome['wall']:7.2f} s  ({status})", flush=True)
+        return sorted(outcomes, key=lambda outcome: outcome["job"].name)
+
+
+def merge_results(outcomes: List[Dict[str, object]], report: Path) -> Dict[str, int]:
+    """One JUnit report with a testsuite per job; jobs that crashed get an error testcase"""
+    root = ET.Element("testsuites", name="digital regression")
+    totals = {"tests": 0, "failures": 0, "errors": 0, "skipped": 0}
+    for outcome in outcomes:
+        job = outcome["job"]
+        suite = ET.SubElement(root, "testsuite", name=job.name, hostname=job.toplevel)
+        cases = []
+        results = outcome.get("results")
+        if results is not None and Path(results).exists():
+            cases = list(ET.parse(results).getroot().iter("testcase"))
+        if not cases:
+            message = outcome["error"] or f"no results (exit code {outcome.get('returncode')}, see {outcome.get('log')})"
+            case = ET.Element("testcase", name=job.module, classname=job.name, time=f"{outcome['wall']:.3f}")
+            ET.SubElement(case, "error", message=message.splitlines()[0]).text = message
+            cases = [case]
+        counts = {"tests": len(cases), "failures": 0, "errors": 0, "skipped": 0}
+        elapsed = 0.0
+        for case in cases:
+            case.set("classname", job.name)
+            elapsed += float(case.get("time", 0) or 0)
+            for kind, key in (("failure", "failures"), ("error", "errors"), ("skipped", "skipped")):
+                counts[key] += len(case.findall(kind))
+            suite.append(case)
+        suite.attrib.update({key: str(value) for key, value in counts.items()}, time=f"{elapsed:.3f}")
+        for key in totals:
+            totals[key] += counts[key]
+    root.attrib.update({key: str(value) for key, value in totals.items()})
+
+    report.parent.mkdir(parents=True, exist_ok=True)
+    tmp = report.with_suffix(".tmp")
+    ET.ElementTree(root).write(tmp, encoding="utf-8", xml_declaration=True)
+    os.replace(tmp, report)
+    return totals
+
+
+def print_summary(report: Path) -> None:
+    root = ET.parse(report).getroot()
+    print(f"\n{'test':<60} {'time (s)':>9}  result")
+    for suite in root.iter("testsuite"):
+        for case in suite.iter("testcase"):
+            failed = case.find("failure") is not None or case.find("error") is not None
+            result = "SKIP" if case.find("skipped") is not None else "FAIL" if failed else "PASS"
+            print(f"{suite.get('name') + '::' + case.get('name'):<60} {float(case.get('time', 0)):>9.3f}  {result}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("blocks", nargs="*", help="Blocks to verify (default: all)")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="Concurrent simulations (default: CPU count)")
+    parser.add_argument("-k", "--filter", default=None, help="Only test modules whose name contains this")
+    parser.add_argument("--report", type=Path, default=BUILD_DIR / "results.xml", help="Merged JUnit report")
+    parser.add_argument("--timeout", type=float, default=600, help="Seconds per compile or test run")
+    parser.add_argument("--clean", action="store_true", help="Discard cached simulation builds first")
+    parser.add_argument("--pending", action="store_true", help="Also run modules marked RTL_PENDING")
+    parser.add_argument("--waves", action="store_true", help="Compile with -DWAVES so testbenches dump a VCD")
+    args = parser.parse_args(argv)
+
+    jobs, skipped = discover(blocks=args.blocks, pending=args.pending)
+    if args.filter:
+        jobs = [job for job in jobs if args.filter in job.name]
+    if args.waves:
+        for job in jobs:
+            job.compile_args.append("-DWAVES")
+    for note in skipped:
+        print(f"skipped {note}")
+    if not jobs:
+        print("No runnable tests found")
+        return 0
+
+    if args.clean:
+        shutil.rmtree(BUILD_DIR / "sim_build", ignore_errors=True)
+    try:
+        regression = Regression(max_workers=args.jobs, timeout=args.timeout)
+    except RuntimeError as e:
+        print(e)
+        return 2
+
+    print(f"Running {len(jobs)} test modules on {regression.max_workers} workers")
+    start = time.perf_counter()
+    totals = merge_results(regression.run_all(jobs), args.report)
+    print_summary(args.report)
+    print(f"\n{totals['tests']} tests, {totals['failures']} failures, {totals['errors']} errors, "
+          f"{totals['skipped']} skipped in {time.perf_counter() - start:.1f} s -> {args.report}")
+    return 1 if totals["failures"] or totals["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())